@@ -0,0 +1,312 @@
+"""Headless batch generation of presentations.
+
+Generates one deck per input without the Streamlit UI. Inputs are either a
+directory of .md/.txt files or a JSONL manifest with one item per line:
+
+    {"id": "acme-weekly", "input": "acme.md", "guidance": "quarterly review",
+     "template": "brand.pptx", "output": "acme.pptx"}
+
+An item may carry its text inline under "text" instead of an "input" path,
+and may name a compiled template (see compile_template.py) under
+"template_id" instead of a "template" file.
+Relative paths are resolved against the manifest's directory.
+
+AI calls run on a bounded thread pool, and decks are rendered in a process
+pool. An item starts rendering as soon as its outline is parsed, so the
+two stages overlap. Finished items are appended to a progress file in the
+output directory, and a rerun skips them.
+
+    python batch_generate.py reports/ -o decks/ --provider openai --template brand.pptx
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+
+from streamlit_app import (OUTLINE_ENGINES, TEMPLATE_REGISTRY_DIR, ImageCache, OutlineCache, PresentationGenerator,
+                           TemplateCache, TemplateRegistry, slim_presentation, write_presentation)
+
+PROVIDERS = {
+    'openai': ('OpenAI', 'OPENAI_API_KEY'),
+    'anthropic': ('Anthropic', 'ANTHROPIC_API_KEY'),
+    'gemini': ('Google Gemini', 'GOOGLE_API_KEY'),
+}
+PROGRESS_FILE = '.batch_progress.jsonl'
+INPUT_EXTENSIONS = ('.md', '.markdown', '.txt')
+
+# Per-process template cache, registry and re-encoded image cache for render workers
+_worker_templates = None
+_worker_registry = None
+_worker_images = None
+
+
+def _init_render_worker(registry_dir: str = TEMPLATE_REGISTRY_DIR):
+    global _worker_templates, _worker_registry, _worker_images
+    _worker_templates = TemplateCache()
+    _worker_registry = TemplateRegistry(registry_dir)
+    _worker_images = ImageCache()
+    logging.getLogger('streamlit').setLevel(logging.ERROR)
+
+
+def render_deck(structure: Dict[str, Any], template_path: Optional[str], output_path: str,
+                template_id: Optional[str] = None, slim: bool = False, fit_text: bool = True) -> int:
+    """Render a structure to output_path in a worker process; returns the slide count."""
+    generator = PresentationGenerator()
+    generator.fit_text = fit_text
+    cached = None
+    if template_id:
+        cached = _worker_registry.load(template_id)
+    elif template_path:
+        with open(template_path, 'rb') as f:
+            cached = _worker_templates.get_or_load(f.read())
+    if cached:
+        generator.template_prs = cached.prs
+        generator.template_styles = cached.styles
+        generator.template_blank = cached.blank
+        generator.template_digest = cached.digest
+    prs = generator.create_presentation(structure, generator.template_prs)
+    if slim:
+        slim_presentation(prs, _worker_images)
+    write_presentation(prs, output_path)
+    return len(prs.slides)
+
+
+def load_items(source: str, default_guidance: str, default_template: Optional[str],
+               default_template_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Read batch items from a directory of text files or a JSONL manifest."""
+    items = []
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if name.lower().endswith(INPUT_EXTENSIONS):
+                items.append({
+                    'id': os.path.splitext(name)[0],
+                    'input': name,  # Resolved against base_dir below
+                })
+        base_dir = source
+    else:
+        base_dir = os.path.dirname(os.path.abspath(source))
+        with open(source, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                item = json.loads(line)
+                item.setdefault('id', str(line_no))
+                items.append(item)
+
+    for item in items:
+        item['id'] = str(item['id'])
+        item.setdefault('guidance', default_guidance)
+        if not item.get('template'):
+            item.setdefault('template_id', default_template_id)
+        item.setdefault('template', default_template)
+        for key in ('input', 'template'):
+            if item.get(key) and not os.path.isabs(item[key]):
+                item[key] = os.path.join(base_dir, item[key])
+        if not item.get('output'):
+            safe_id = re.sub(r'[^A-Za-z0-9_.-]+', '_', item['id'])
+            item['output'] = f"{safe_id}.pptx"
+    return items
+
+
+def load_progress(path: str) -> Dict[str, Dict[str, Any]]:
+    """Return the latest progress record per item id."""
+    records = {}
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # A torn last line from an interrupted run
+                records[record['id']] = record
+    return records
+
+
+def run_batch(items: List[Dict[str, Any]], provider: str, api_key: str, output_dir: str,
+              ai_workers: int = 4, render_workers: int = None, use_cache: bool = True,
+              resume: bool = True, registry_dir: str = TEMPLATE_REGISTRY_DIR,
+              outline_engine: str = 'ai', slim: bool = False, fit_text: bool = True,
+              hedge: Optional[tuple] = None) -> Dict[str, Any]:
+    """Outline and render every item, overlapping the AI and render stages.
+
+    hedge is an optional (provider, api_key) that slow AI requests are also sent to.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    progress_path = os.path.join(output_dir, PROGRESS_FILE)
+    previous = load_progress(progress_path) if resume else {}
+
+    todo = []
+    skipped = 0
+    for item in items:
+        output_path = os.path.join(output_dir, item['output'])
+        record = previous.get(item['id'])
+        if record and record.get('status') == 'done' and os.path.exists(output_path):
+            skipped += 1
+            continue
+        todo.append(item)
+
+    generator = PresentationGenerator()
+    generator.hedge = hedge
+    outline_cache = OutlineCache() if use_cache else None
+
+    def outline(item):
+        if item.get('text') is not None:
+            text = item['text']
+        else:
+            with open(item['input'], 'r', encoding='utf-8') as f:
+                text = f.read()
+        started = time.perf_counter()
+        # generate_structure keeps its parse report and timings on the generator; one per item
+        structure = generator.fork().generate_structure(
+            provider, api_key, text, item.get('guidance') or '', outline_cache=outline_cache,
+            outline_engine=outline_engine)
+        return structure, time.perf_counter() - started
+
+    summary = {'total': len(items), 'skipped': skipped, 'done': 0, 'failed': 0,
+               'slides': 0, 'outline_seconds': 0.0, 'render_seconds': 0.0, 'failures': []}
+    started = time.perf_counter()
+    render_workers = render_workers or os.cpu_count() or 1
+
+    with open(progress_path, 'a', encoding='utf-8') as progress, \
+            ThreadPoolExecutor(max_workers=ai_workers) as ai_pool, \
+            ProcessPoolExecutor(max_workers=render_workers,
+                                mp_context=multiprocessing.get_context('spawn'),
+                                initializer=_init_render_worker,
+                                initargs=(registry_dir,)) as render_pool:
+
+        def record(item, status, **fields):
+            entry = {'id': item['id'], 'status': status, 'output': item['output'],
+                     'time': time.time(), **fields}
+            progress.write(json.dumps(entry) + '\n')
+            progress.flush()
+
+        def fail(item, stage, error):
+            summary['failed'] += 1
+            summary['failures'].append(
+                {'id': item['id'], 'stage': stage, 'error': str(error)})
+            record(item, 'failed', stage=stage, error=str(error))
+            print(f"✗ {item['id']} ({stage}): {error}", file=sys.stderr)
+
+        # future -> (stage, item, stage start time)
+        pending = {ai_pool.submit(outline, item): ('outline', item, None)
+                   for item in todo}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, item, stage_started = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    fail(item, stage, e)
+                    continue
+
+                if stage == 'outline':
+                    structure, seconds = result
+                    summary['outline_seconds'] += seconds
+                    render_future = render_pool.submit(
+                        render_deck, structure, item.get('template'),
+                        os.path.join(output_dir, item['output']), item.get('template_id'), slim, fit_text)
+                    pending[render_future] = (
+                        'render', item, time.perf_counter())
+                else:
+                    render_seconds = time.perf_counter() - stage_started
+                    summary['render_seconds'] += render_seconds
+                    summary['done'] += 1
+                    summary['slides'] += result
+                    record(item, 'done', slides=result,
+                           render_seconds=round(render_seconds, 3))
+                    print(f"✓ {item['id']} → {item['output']} ({result} slides)",
+                          file=sys.stderr)
+
+    summary['wall_seconds'] = time.perf_counter() - started
+    return summary
+
+
+def print_summary(summary: Dict[str, Any]):
+    wall = summary['wall_seconds']
+    done = summary['done']
+    print(f"\nItems: {summary['total']}  done: {done}  failed: {summary['failed']}  "
+          f"skipped (already done): {summary['skipped']}")
+    print(f"Wall time: {wall:.1f}s  throughput: {done / wall * 60 if wall else 0:.1f} decks/min, "
+          f"{summary['slides'] / wall if wall else 0:.1f} slides/s")
+    if done:
+        print(f"Average outline time: {summary['outline_seconds'] / done:.2f}s  "
+              f"average render time (incl. queueing): {summary['render_seconds'] / done:.2f}s")
+    for failure in summary['failures']:
+        print(f"  FAILED {failure['id']} [{failure['stage']}]: {failure['error']}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Generate PowerPoint decks in bulk from text files.")
+    parser.add_argument(
+        'inputs', help="Directory of .md/.txt files or a JSONL manifest")
+    parser.add_argument('-o', '--output-dir', default='output',
+                        help="Where decks and the progress file are written")
+    parser.add_argument('--provider', choices=sorted(PROVIDERS), default='openai')
+    parser.add_argument(
+        '--api-key', help="API key (defaults to the provider's usual environment variable)")
+    parser.add_argument(
+        '--template', help="Default template for items that do not set one")
+    parser.add_argument(
+        '--template-id', help="Default compiled template ID (see compile_template.py)")
+    parser.add_argument('--template-registry', default=TEMPLATE_REGISTRY_DIR,
+                        help="Directory of compiled templates")
+    parser.add_argument('--hedge-provider', choices=sorted(PROVIDERS),
+                        help="Also send requests the main provider is slow to answer to this provider, "
+                             "using its usual environment variable for the key")
+    parser.add_argument('--guidance', default='',
+                        help="Default style guidance for items that do not set one")
+    parser.add_argument('--outline', choices=list(OUTLINE_ENGINES), default='ai',
+                        help="ai: always ask the AI; local: outline markdown without it; "
+                             "auto: local for structured markdown, AI otherwise")
+    parser.add_argument('--no-fit', action='store_true',
+                        help="Do not shrink or split slides whose bullets overflow their text box")
+    parser.add_argument('--slim', action='store_true',
+                        help="Drop unused template layouts, merge duplicate media and downsample oversized images")
+    parser.add_argument('--ai-workers', type=int, default=4,
+                        help="Maximum concurrent AI requests")
+    parser.add_argument('--render-workers', type=int, default=None,
+                        help="Render processes (default: CPU count)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Do not read or write the outline cache")
+    parser.add_argument('--restart', action='store_true',
+                        help="Ignore the progress file and regenerate every item")
+    args = parser.parse_args(argv)
+
+    logging.getLogger('streamlit').setLevel(logging.ERROR)
+    provider, key_env = PROVIDERS[args.provider]
+    api_key = args.api_key or os.environ.get(key_env)
+    if not api_key and args.outline != 'local':
+        parser.error(f"no API key: pass --api-key or set {key_env}")
+
+    hedge = None
+    if args.hedge_provider and args.hedge_provider != args.provider:
+        hedge_provider, hedge_env = PROVIDERS[args.hedge_provider]
+        if not os.environ.get(hedge_env):
+            parser.error(f"no API key for --hedge-provider: set {hedge_env}")
+        hedge = (hedge_provider, os.environ[hedge_env])
+
+    if args.template and args.template_id:
+        parser.error("pass either --template or --template-id, not both")
+    items = load_items(args.inputs, args.guidance,
+                       args.template, args.template_id)
+    summary = run_batch(items, provider, api_key, args.output_dir,
+                        ai_workers=args.ai_workers, render_workers=args.render_workers,
+                        use_cache=not args.no_cache, resume=not args.restart,
+                        registry_dir=args.template_registry, outline_engine=args.outline,
+                        slim=args.slim, fit_text=not args.no_fit, hedge=hedge)
+    print_summary(summary)
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,457 @@
+"""Offline benchmarks for the generation pipeline.
+
+Times template style extraction, deck creation and saving, text fitting,
+paragraph styling, AI response parsing and outlining, using synthetic decks and
+templates. The outline case runs against a deterministic mock provider, so
+no network access or API key is needed.
+
+Each case reports p50/p95 latency, throughput and peak traced memory.
+Results can be saved as a JSON baseline, and a later run can be checked
+against it:
+
+    python benchmark.py --save-baseline bench/baseline.json
+    python benchmark.py --compare bench/baseline.json --threshold 0.25
+
+--compare exits with status 1 when any case regresses beyond the threshold.
+
+--hedging replays outline requests against a mock provider that stalls
+every HEDGE_STALL_EVERY-th request, with and without a hedging secondary
+provider, and reports the tail latency of each.
+
+--startup also reports the import time of each module streamlit_app
+imports, and times cold starts (a fresh interpreter up to the app's first
+complete script run), failing when the median exceeds --cold-start-budget.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from PIL import Image
+from pptx import Presentation
+from pptx.util import Inches, Pt
+
+from provider_plugins import load_sdk
+from streamlit_app import (HEDGE_MIN_SAMPLES, PROVIDER_LIMITS, AsyncProviderLayer, Completion, DeckFile,
+                           LatencyTracker, PresentationGenerator, ProviderClientRegistry, TemplateCache)
+
+DECK_SIZES = (10, 100, 500)
+# name -> (filler slides, embedded pictures)
+TEMPLATE_SIZES = {'small': (0, 0), 'medium': (20, 2), 'large': (100, 10)}
+STYLED_PARAGRAPHS = 1000
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.25  # relative slowdown or memory growth counted as a regression
+SEED = 1234
+COLD_START_BUDGET = 3.0  # seconds from a fresh interpreter to the first rendered page
+STARTUP_REPORT_MODULES = 12
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+# Injected provider stalls for --hedging
+HEDGE_REQUESTS = 200
+HEDGE_LATENCY = 0.01  # seconds per normal mock request
+HEDGE_STALL_EVERY = 20
+HEDGE_STALL_SECONDS = 0.5
+_COLD_START_SCRIPT = """
+from streamlit.testing.v1 import AppTest
+AppTest.from_file({app!r}, default_timeout=120).run()
+"""
+
+WORDS = ('market growth revenue platform customer strategy roadmap risk team launch '
+         'quality cost pipeline insight model data region partner forecast margin').split()
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def synthetic_outline(slides: int, seed: int = SEED) -> Dict[str, Any]:
+    """A deterministic outline with the given number of content slides."""
+    rng = random.Random(seed + slides)
+    return {
+        'title': _sentence(rng, 4),
+        'slides': [{
+            'title': f"{_sentence(rng, 3)} {number}",
+            'content': [_sentence(rng, rng.randint(5, 12)) for _ in range(rng.randint(2, 5))],
+            'notes': _sentence(rng, 20),
+        } for number in range(1, slides + 1)],
+    }
+
+
+def synthetic_template(filler_slides: int, pictures: int, seed: int = SEED) -> bytes:
+    """A template package with styled placeholders, filler slides and embedded pictures."""
+    rng = random.Random(seed + filler_slides)
+    prs = Presentation()
+    for layout in prs.slide_layouts:
+        for placeholder in layout.placeholders:
+            if not placeholder.has_text_frame:
+                continue
+            run = placeholder.text_frame.paragraphs[0].add_run()
+            run.text = 'Sample'
+            run.font.name = 'Georgia'
+            run.font.size = Pt(24)
+            run.font.bold = True
+
+    content_layout = prs.slide_layouts[1]
+    for number in range(filler_slides):
+        slide = prs.slides.add_slide(content_layout)
+        slide.shapes.title.text = _sentence(rng, 4)
+        slide.placeholders[1].text_frame.text = '\n'.join(
+            _sentence(rng, 10) for _ in range(4))
+
+    for number in range(pictures):
+        image = Image.frombytes('RGB', (400, 300), rng.randbytes(400 * 300 * 3))
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        buffer.seek(0)
+        slide = prs.slides.add_slide(prs.slide_layouts[6])
+        slide.shapes.add_picture(buffer, Inches(1), Inches(1))
+
+    output = io.BytesIO()
+    prs.save(output)
+    return output.getvalue()
+
+
+class MockProviderLayer(AsyncProviderLayer):
+    """Provider layer answering every prompt with a deterministic outline.
+
+    The reply depends only on the prompt, so repeated runs do the same
+    work. latency adds a fixed delay per request to mimic a real provider,
+    and every stall_every-th request to a provider in stalled waits
+    stall_seconds instead, before its response or first chunk. Requests
+    are not rate limited.
+    """
+
+    def __init__(self, slides: int = 10, latency: float = 0.0, stall_every: int = 0,
+                 stall_seconds: float = 0.0, stalled=(), latency_stats: LatencyTracker = None):
+        super().__init__(registry=ProviderClientRegistry(), timeout=30, max_retries=0,
+                         limits={provider: {'concurrency': 8, 'requests_per_minute': 1e9}
+                                 for provider in PROVIDER_LIMITS},
+                         latency_stats=latency_stats)
+        self.slides = slides
+        self.latency = latency
+        self.stall_every = stall_every
+        self.stall_seconds = stall_seconds
+        self.stalled = set(stalled)
+        self.requests = {}  # provider -> requests so far
+        self.stalls = 0
+
+    async def delay(self, provider: str):
+        count = self.requests[provider] = self.requests.get(provider, 0) + 1
+        if provider in self.stalled and self.stall_every and count % self.stall_every == 0:
+            self.stalls += 1
+            await asyncio.sleep(self.stall_seconds)
+        elif self.latency:
+            await asyncio.sleep(self.latency)
+
+    def reply(self, prompt: str) -> str:
+        seed = int.from_bytes(hashlib.sha256(prompt.encode('utf-8')).digest()[:4], 'big')
+        return json.dumps(synthetic_outline(self.slides, seed))
+
+    async def _complete_once(self, provider: str, client, prompt: str) -> Completion:
+        await self.delay(provider)
+        return Completion(self.reply(prompt), False, 'stop')
+
+    async def _stream_once(self, provider: str, client, prompt: str):
+        await self.delay(provider)
+        text = self.reply(prompt)
+        for i in range(0, len(text), 64):
+            yield text[i:i + 64]
+
+
+class Case(NamedTuple):
+    name: str
+    run: Callable[[], Any]
+    items: int  # units of work per run, for throughput
+    unit: str
+
+
+class Result(NamedTuple):
+    p50: float
+    p95: float
+    throughput: float  # items per second at p50
+    unit: str
+    peak_bytes: int
+
+
+def _percentile(samples: List[float], percent: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def measure(case: Case, repeat: int) -> Result:
+    """Time repeat runs of a case after one warm-up, then trace its peak memory in one more."""
+    case.run()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        case.run()
+        samples.append(time.perf_counter() - started)
+
+    # Tracing slows allocation-heavy code down, so it is kept out of the timings
+    tracemalloc.start()
+    try:
+        case.run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    p50 = statistics.median(samples)
+    return Result(p50, _percentile(samples, 95), case.items / p50 if p50 else 0.0,
+                  case.unit, peak)
+
+
+def build_cases(deck_sizes=DECK_SIZES, template_sizes=TEMPLATE_SIZES) -> List[Case]:
+    cases = []
+    templates = {name: synthetic_template(*size) for name, size in template_sizes.items()}
+
+    def extract(data):
+        return PresentationGenerator().extract_template_styles(Presentation(io.BytesIO(data)))
+
+    for name, data in templates.items():
+        layouts = len(Presentation(io.BytesIO(data)).slide_layouts)
+        cases.append(Case(f"extract_template_styles[{name}]",
+                          lambda data=data: extract(data), layouts, 'layouts'))
+
+    # Deck creation on a loaded template, as the app does after an upload
+    cached = TemplateCache().get_or_load(templates['medium'])
+    generator = PresentationGenerator()
+    generator.template_prs = cached.prs
+    generator.template_styles = cached.styles
+    generator.template_blank = cached.blank
+    generator.template_digest = cached.digest
+    for slides in deck_sizes:
+        structure = synthetic_outline(slides)
+        cases.append(Case(f"create_presentation[{slides}]",
+                          lambda structure=structure: generator.create_presentation(
+                              structure, generator.template_prs),
+                          slides + 1, 'slides'))
+
+    # Text fitting; repeat runs hit the word and line memos, as re-renders do
+    for slides in deck_sizes:
+        structure = synthetic_outline(slides)
+        cases.append(Case(f"fit_structure[{slides}]",
+                          lambda structure=structure: generator.fit_structure(structure),
+                          slides, 'slides'))
+
+    for slides in deck_sizes:
+        deck = generator.create_presentation(synthetic_outline(slides), generator.template_prs)
+        cases.append(Case(f"save_presentation[{slides}]", lambda deck=deck: DeckFile(deck),
+                          slides + 1, 'slides'))
+
+    prs, _, content_layout = generator.open_presentation()
+    slide = prs.slides.add_slide(content_layout)
+    body = slide.placeholders[1]
+    paragraph = body.text_frame.paragraphs[0]
+    paragraph.text = 'Styled paragraph'
+    layout_name, placeholder_type = content_layout.name, str(body.placeholder_format.type)
+
+    def style_paragraphs():
+        for _ in range(STYLED_PARAGRAPHS):
+            generator.apply_paragraph_styling(
+                paragraph, generator.template_styles, 'content',
+                layout_name=layout_name, placeholder_type=placeholder_type)
+    cases.append(Case("apply_paragraph_styling", style_paragraphs,
+                      STYLED_PARAGRAPHS, 'paragraphs'))
+
+    for slides in deck_sizes:
+        response = "```json\n" + json.dumps(synthetic_outline(slides), indent=2) + "\n```"
+        cases.append(Case(f"parse_ai_response[{slides}]",
+                          lambda response=response: generator.parse_ai_response(response),
+                          slides, 'slides'))
+
+    mock = PresentationGenerator()
+    mock.provider_layer = MockProviderLayer(slides=deck_sizes[0])
+    text = '\n\n'.join(_sentence(random.Random(SEED), 40) for _ in range(20))
+    cases.append(Case("generate_structure[mock]",
+                      lambda: mock.generate_structure('OpenAI', 'mock-key', text),
+                      deck_sizes[0], 'slides'))
+    return cases
+
+
+def import_report(module: str = 'streamlit_app') -> List[tuple]:
+    """(name, seconds) for each module imported directly by module, slowest first.
+
+    Runs a fresh interpreter with -X importtime, so the times are cold and
+    include everything each import pulled in.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=APP_DIR, capture_output=True, text=True, check=True)
+    times = []
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | name", indented two spaces per level
+        match = re.match(r'import time:\s+\d+ \|\s+(\d+) \|   (\S+)$', line)
+        if match:
+            times.append((match.group(2), int(match.group(1)) / 1e6))
+    return sorted(times, key=lambda item: item[1], reverse=True)
+
+
+def cold_start_seconds() -> float:
+    """Wall time from starting a fresh interpreter to the app's first complete script run."""
+    started = time.perf_counter()
+    subprocess.run([sys.executable, '-c', _COLD_START_SCRIPT.format(
+        app=os.path.join(APP_DIR, 'streamlit_app.py'))],
+        cwd=APP_DIR, capture_output=True, check=True)
+    return time.perf_counter() - started
+
+
+def run_startup(repeat: int) -> Result:
+    """Print the import report, then time repeat cold starts."""
+    print("Import time of streamlit_app's direct imports (cumulative):")
+    for name, seconds in import_report()[:STARTUP_REPORT_MODULES]:
+        print(f"  {name:<36} {seconds * 1000:9.1f} ms")
+    samples = [cold_start_seconds() for _ in range(repeat)]
+    p50 = statistics.median(samples)
+    # Memory is not traced across processes
+    return Result(p50, _percentile(samples, 95), 1 / p50, 'starts', 0)
+
+
+def run_hedging(requests: int = HEDGE_REQUESTS) -> Dict[str, Result]:
+    """Time outline requests against a stalling mock provider, without and with a hedging secondary."""
+    text = '\n\n'.join(_sentence(random.Random(SEED), 40) for _ in range(20))
+    results = {}
+    for name, hedge in (('generate_structure[stalls]', None),
+                        ('generate_structure[stalls,hedged]', ('Anthropic', 'mock-key'))):
+        generator = PresentationGenerator()
+        # The deadline may drop to the mock's latency, instead of HEDGE_MIN_DEADLINE
+        generator.provider_layer = layer = MockProviderLayer(
+            latency=HEDGE_LATENCY, stall_every=HEDGE_STALL_EVERY, stall_seconds=HEDGE_STALL_SECONDS,
+            stalled=('OpenAI',), latency_stats=LatencyTracker(min_deadline=HEDGE_LATENCY))
+        generator.hedge = hedge
+        if hedge:
+            load_sdk(hedge[0])  # As the app does while the key is typed
+        for _ in range(HEDGE_MIN_SAMPLES):  # Warm up the latency statistics
+            generator.generate_structure('OpenAI', 'mock-key', text)
+        layer.requests.clear()
+        layer.stalls = 0
+        samples = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            generator.generate_structure('OpenAI', 'mock-key', text)
+            samples.append(time.perf_counter() - started)
+        p50 = statistics.median(samples)
+        results[name] = Result(p50, _percentile(samples, 95), 1 / p50, 'outlines', 0)
+        print(f"{name:<38} p99 {_percentile(samples, 99) * 1000:9.2f} ms  max "
+              f"{max(samples) * 1000:9.2f} ms  ({layer.stalls} stalls, "
+              f"{layer.requests.get('Anthropic', 0)} hedged requests)")
+    return results
+
+
+def run_benchmarks(repeat: int = DEFAULT_REPEAT, selected: Optional[str] = None,
+                   deck_sizes=DECK_SIZES) -> Dict[str, Result]:
+    results = {}
+    for case in build_cases(deck_sizes):
+        if selected and selected not in case.name:
+            continue
+        results[case.name] = measure(case, repeat)
+        print_result(case.name, results[case.name])
+    return results
+
+
+def print_result(name: str, result: Result):
+    print(f"{name:<38} p50 {result.p50 * 1000:9.2f} ms  p95 {result.p95 * 1000:9.2f} ms  "
+          f"{result.throughput:10.1f} {result.unit}/s  peak {result.peak_bytes / 1024 / 1024:7.2f} MiB",
+          flush=True)
+
+
+def save_baseline(path: str, results: Dict[str, Result], repeat: int):
+    data = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'results': {name: result._asdict() for name, result in results.items()},
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+
+
+def find_regressions(results: Dict[str, Result], baseline: Dict[str, Any],
+                     threshold: float = DEFAULT_THRESHOLD) -> List[str]:
+    """Describe every case whose p50 latency or peak memory grew by more than threshold."""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        for field, label in (('p50', 'p50 latency'), ('peak_bytes', 'peak memory')):
+            before, after = previous[field], getattr(result, field)
+            if before and after > before * (1 + threshold):
+                regressions.append(
+                    f"{name}: {label} {after / before - 1:+.0%} ({before:.4g} → {after:.4g})")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the generation pipeline offline.")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                        help="Timed runs per case")
+    parser.add_argument('--case', help="Only run cases whose name contains this")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DECK_SIZES),
+                        help="Deck sizes in slides")
+    parser.add_argument('--save-baseline', metavar='PATH',
+                        help="Write the results as a JSON baseline")
+    parser.add_argument('--compare', metavar='PATH',
+                        help="Flag regressions against a saved baseline")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative growth counted as a regression (0.25 = 25%%)")
+    parser.add_argument('--startup', action='store_true',
+                        help="Also report import times and check cold start against the budget")
+    parser.add_argument('--cold-start-budget', type=float, default=COLD_START_BUDGET,
+                        help="Seconds allowed from interpreter start to the first rendered page")
+    parser.add_argument('--hedging', action='store_true',
+                        help="Also compare outline tail latency against a stalling mock provider, "
+                             "with and without hedging")
+    args = parser.parse_args(argv)
+
+    logging.getLogger('streamlit').setLevel(logging.ERROR)
+    results = run_benchmarks(args.repeat, args.case, tuple(args.sizes))
+
+    if args.hedging:
+        print()
+        for name, result in run_hedging().items():
+            results[name] = result
+            print_result(name, result)
+
+    over_budget = False
+    if args.startup:
+        print()
+        results['cold_start[first_render]'] = run_startup(args.repeat)
+        print_result('cold_start[first_render]', results['cold_start[first_render]'])
+        over_budget = results['cold_start[first_render]'].p50 > args.cold_start_budget
+        if over_budget:
+            print(f"  OVER BUDGET: cold start exceeds {args.cold_start_budget:.2f}s")
+
+    if args.save_baseline:
+        save_baseline(args.save_baseline, results, args.repeat)
+        print(f"\nBaseline written to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.compare}:")
+            for regression in regressions:
+                print(f"  REGRESSION {regression}")
+            return 1
+        print(f"\nNo regressions against {args.compare} (threshold {args.threshold:.0%})")
+    return 1 if over_budget else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
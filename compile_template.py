@@ -0,0 +1,75 @@
+"""Compile PowerPoint templates into the local template registry.
+
+A compiled template is stored as <id>.tpl in the registry directory. It
+holds the slide-free package, the layout/placeholder index, the extracted
+styles and the style plan. The app and batch_generate.py can then select
+it by ID without parsing the template again.
+
+    python compile_template.py brand.pptx --id brand
+    python compile_template.py --list
+"""
+
+import argparse
+import logging
+import os
+import re
+import sys
+import time
+
+from streamlit_app import TEMPLATE_REGISTRY_DIR, TemplateRegistry
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Compile PowerPoint templates so they can be selected by ID.")
+    parser.add_argument('templates', nargs='*',
+                        help="Template files (.pptx/.potx) to compile")
+    parser.add_argument('--id', dest='template_id',
+                        help="Registry ID (default: the file name); only with a single template")
+    parser.add_argument('--name', help="Display name (default: the file name)")
+    parser.add_argument('--registry', default=TEMPLATE_REGISTRY_DIR,
+                        help="Registry directory")
+    parser.add_argument('--list', action='store_true',
+                        help="List compiled templates")
+    parser.add_argument('--remove', metavar='ID', action='append', default=[],
+                        help="Remove a compiled template")
+    args = parser.parse_args(argv)
+
+    if args.template_id and len(args.templates) != 1:
+        parser.error("--id needs exactly one template")
+    if not (args.templates or args.list or args.remove):
+        parser.error("nothing to do: pass templates, --list or --remove")
+
+    logging.getLogger('streamlit').setLevel(logging.ERROR)
+    registry = TemplateRegistry(args.registry)
+
+    for template_id in args.remove:
+        registry.remove(template_id)
+        print(f"Removed {template_id}")
+
+    failed = 0
+    for path in args.templates:
+        file_name = os.path.basename(path)
+        template_id = args.template_id or re.sub(
+            r'[^A-Za-z0-9_.-]+', '-', os.path.splitext(file_name)[0]).strip('-.')
+        started = time.perf_counter()
+        try:
+            with open(path, 'rb') as f:
+                manifest = registry.compile(
+                    template_id, f.read(), name=args.name or file_name)
+        except Exception as e:
+            failed += 1
+            print(f"✗ {path}: {e}", file=sys.stderr)
+            continue
+        print(f"✓ {path} → {template_id} ({len(manifest['layouts'])} layouts, "
+              f"{time.perf_counter() - started:.2f}s)")
+
+    if args.list:
+        for manifest in registry.list():
+            print(f"{manifest['id']}\t{manifest['name']}\t{len(manifest['layouts'])} layouts\t"
+                  f"{manifest['digest'][:12]}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,220 @@
+"""Shard-and-merge slide rendering.
+
+Large decks are rendered in slices by worker processes, each opening the
+same prepared blank template. The workers return the serialized slide and
+notes parts, and assemble_package() splices them into the blank package
+with fresh part names, relationship IDs and sldIdLst entries.
+
+This lives outside streamlit_app.py because Streamlit executes the app
+script as ``__main__``. Worker processes need an importable module to
+unpickle their entry point from.
+"""
+
+import io
+import os
+import re
+import tempfile
+import zipfile
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from lxml import etree
+
+SLIDE_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.presentationml.slide+xml'
+NOTES_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.presentationml.notesSlide+xml'
+SLIDE_RELTYPE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/slide'
+
+_PML_NS = 'http://schemas.openxmlformats.org/presentationml/2006/main'
+_R_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_RELS_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+_CT_NS = 'http://schemas.openxmlformats.org/package/2006/content-types'
+
+# Where blank templates are written for worker processes to load by digest
+SHARD_TEMPLATE_DIR = os.path.join(
+    tempfile.gettempdir(), 'text-to-powerpoint', 'blank-templates')
+# Published blank templates kept on disk; the least recently published are removed
+SHARD_TEMPLATE_KEEP = 16
+# Blank templates each worker process keeps parsed between tasks
+WORKER_TEMPLATE_CACHE_SIZE = 4
+
+
+class SlideParts(NamedTuple):
+    """The serialized parts of one rendered slide."""
+    slide_xml: bytes
+    slide_rels: bytes
+    notes_xml: Optional[bytes] = None
+    notes_rels: Optional[bytes] = None
+
+
+def extract_slide_parts(prs) -> List[SlideParts]:
+    """Serialize every slide of a python-pptx presentation, with its notes slide if any."""
+    parts = []
+    for slide in prs.slides:
+        notes_xml = notes_rels = None
+        if slide.has_notes_slide:
+            notes_part = slide.notes_slide.part
+            notes_xml, notes_rels = notes_part.blob, notes_part.rels.xml
+        parts.append(SlideParts(slide.part.blob, slide.part.rels.xml,
+                                notes_xml, notes_rels))
+    return parts
+
+
+def _retarget(rels_xml: bytes, folder: str, stem: str, number: int) -> bytes:
+    """Point relationships at ../<folder>/<stem>N.xml to the part's new number."""
+    pattern = re.compile(
+        rb'(Target="\.\./' + folder.encode() + rb'/' + stem.encode() + rb')\d+(\.xml")')
+    return pattern.sub(lambda m: m.group(1) + str(number).encode() + m.group(2), rels_xml)
+
+
+def assemble_package(base: bytes, slides: List[SlideParts]) -> bytes:
+    """Build a .pptx from a slide-free base package and rendered slide parts.
+
+    The base must already contain any notes master the notes slides refer
+    to. Slides are numbered in list order, which is also their deck order.
+    """
+    with zipfile.ZipFile(io.BytesIO(base)) as source:
+        entries = OrderedDict((info.filename, source.read(info))
+                              for info in source.infolist())
+
+    content_types = etree.fromstring(entries['[Content_Types].xml'])
+    pres_rels = etree.fromstring(entries['ppt/_rels/presentation.xml.rels'])
+    presentation = etree.fromstring(entries['ppt/presentation.xml'])
+
+    # Relationship IDs and slide IDs must not collide with the base package's
+    used_rids = {rel.get('Id') for rel in pres_rels}
+    next_rid = 1
+    sld_id_lst = presentation.find(f'{{{_PML_NS}}}sldIdLst')
+    if sld_id_lst is None:
+        sld_id_lst = etree.Element(f'{{{_PML_NS}}}sldIdLst')
+        # sldIdLst follows the master lists and precedes sldSz in CT_Presentation
+        anchor = presentation.find(f'{{{_PML_NS}}}sldSz')
+        if anchor is not None:
+            anchor.addprevious(sld_id_lst)
+        else:
+            presentation.append(sld_id_lst)
+    next_sld_id = max([int(el.get('id')) for el in sld_id_lst] + [255]) + 1
+
+    for number, parts in enumerate(slides, 1):
+        slide_name = f'ppt/slides/slide{number}.xml'
+        entries[slide_name] = parts.slide_xml
+        entries[f'ppt/slides/_rels/slide{number}.xml.rels'] = _retarget(
+            parts.slide_rels, 'notesSlides', 'notesSlide', number)
+        etree.SubElement(content_types, f'{{{_CT_NS}}}Override',
+                         PartName=f'/{slide_name}', ContentType=SLIDE_CONTENT_TYPE)
+
+        if parts.notes_xml is not None:
+            notes_name = f'ppt/notesSlides/notesSlide{number}.xml'
+            entries[notes_name] = parts.notes_xml
+            entries[f'ppt/notesSlides/_rels/notesSlide{number}.xml.rels'] = _retarget(
+                parts.notes_rels, 'slides', 'slide', number)
+            etree.SubElement(content_types, f'{{{_CT_NS}}}Override',
+                             PartName=f'/{notes_name}', ContentType=NOTES_CONTENT_TYPE)
+
+        while f'rId{next_rid}' in used_rids:
+            next_rid += 1
+        rid = f'rId{next_rid}'
+        used_rids.add(rid)
+        etree.SubElement(pres_rels, f'{{{_RELS_NS}}}Relationship',
+                         Id=rid, Type=SLIDE_RELTYPE, Target=f'slides/slide{number}.xml')
+        sld_id = etree.SubElement(sld_id_lst, f'{{{_PML_NS}}}sldId')
+        sld_id.set('id', str(next_sld_id))
+        sld_id.set(f'{{{_R_NS}}}id', rid)
+        next_sld_id += 1
+
+    def serialize(element):
+        return etree.tostring(element, xml_declaration=True, encoding='UTF-8', standalone=True)
+
+    entries['[Content_Types].xml'] = serialize(content_types)
+    entries['ppt/_rels/presentation.xml.rels'] = serialize(pres_rels)
+    entries['ppt/presentation.xml'] = serialize(presentation)
+
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as package:
+        for name, data in entries.items():
+            package.writestr(name, data)
+    return output.getvalue()
+
+
+def publish_blank_template(digest: str, blank: bytes) -> str:
+    """Write a blank template where worker processes can load it by digest.
+
+    Only the SHARD_TEMPLATE_KEEP most recently published templates are kept.
+    """
+    os.makedirs(SHARD_TEMPLATE_DIR, exist_ok=True)
+    path = os.path.join(SHARD_TEMPLATE_DIR, f'{digest}.pptx')
+    try:
+        # Mark it recently used, so pruning removes other templates first
+        os.utime(path)
+        return path
+    except FileNotFoundError:
+        pass
+    fd, tmp_path = tempfile.mkstemp(dir=SHARD_TEMPLATE_DIR, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(blank)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    _prune_blank_templates(keep=path)
+    return path
+
+
+def _prune_blank_templates(keep: str):
+    """Remove the least recently published blank templates beyond SHARD_TEMPLATE_KEEP."""
+    published = []
+    for entry in os.scandir(SHARD_TEMPLATE_DIR):
+        if entry.name.endswith('.pptx') and entry.path != keep:
+            try:
+                published.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                pass
+    published.sort()
+    for _, path in published[:max(0, len(published) - (SHARD_TEMPLATE_KEEP - 1))]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass  # Another process pruned it first
+
+
+_worker_blanks = OrderedDict()  # digest -> blank bytes, per worker process
+
+
+def render_items(generator, items: List[Tuple[str, Any]], blank: bytes = None) -> List[SlideParts]:
+    """Render ('title', title) / ('content', slide_data) items onto a fresh deck and serialize them."""
+    prs, title_layout, content_layout = generator.open_presentation(blank=blank)
+    for kind, data in items:
+        if kind == 'title':
+            generator.add_title_slide(prs, title_layout, data)
+        else:
+            generator.add_content_slide(prs, content_layout, data)
+    return extract_slide_parts(prs)
+
+
+def render_shard(digest: str, blank_path: str, template_styles: Dict[str, Any],
+                 items: List[Tuple[str, Any]]) -> List[SlideParts]:
+    """Render a slice of a deck in a worker process.
+
+    items are ('title', title) or ('content', slide_data) pairs, rendered in
+    order onto the blank template published under digest. template_styles
+    needs only the template's style plan and layout index.
+    """
+    # Imported here so the parent can import this module from streamlit_app
+    from streamlit_app import PresentationGenerator
+
+    blank = _worker_blanks.get(digest)
+    if blank is None:
+        with open(blank_path, 'rb') as f:
+            blank = f.read()
+        _worker_blanks[digest] = blank
+        while len(_worker_blanks) > WORKER_TEMPLATE_CACHE_SIZE:
+            _worker_blanks.popitem(last=False)
+    else:
+        _worker_blanks.move_to_end(digest)
+
+    generator = PresentationGenerator()
+    generator.template_styles = template_styles
+    return render_items(generator, items, blank)
@@ -0,0 +1,87 @@
+"""AI provider plugins, with each provider's SDK imported on first use.
+
+A generation talks to a single provider, but the OpenAI, Anthropic and
+Gemini SDKs (with their pydantic, httpx and gRPC dependencies) take
+seconds to import between them, which used to dominate cold start.
+Providers are registered here by name, and load_sdk() imports a
+provider's SDK the first time it is needed and records how long that took.
+
+This lives outside streamlit_app.py because Streamlit executes the app
+script as ``__main__`` on every rerun. A regular module keeps the loaded
+SDKs and their import times for the life of the process.
+"""
+
+import importlib
+import logging
+import threading
+import time
+from typing import Dict, List, NamedTuple, Tuple
+
+log = logging.getLogger('text_to_powerpoint.providers')
+
+
+class ProviderPlugin(NamedTuple):
+    """An AI provider and the SDK module that talks to it."""
+    name: str
+    module: str
+    # Names of SDK exceptions for dropped connections, which are worth retrying
+    connection_errors: Tuple[str, ...] = ()
+
+
+_plugins = {}  # provider name -> ProviderPlugin, in registration order
+_modules = {}  # provider name -> imported SDK module
+_import_seconds = {}  # SDK module name -> seconds its first import took
+_lock = threading.Lock()
+
+
+def register(plugin: ProviderPlugin):
+    _plugins[plugin.name] = plugin
+
+
+def provider_names() -> List[str]:
+    return list(_plugins)
+
+
+def load_sdk(provider: str):
+    """Return the provider's SDK module, importing it on first use."""
+    module = _modules.get(provider)
+    if module is not None:
+        return module
+    plugin = _plugins.get(provider)
+    if plugin is None:
+        raise ValueError(f"Unknown AI provider: {provider}")
+    with _lock:
+        module = _modules.get(provider)
+        if module is None:
+            started = time.perf_counter()
+            module = importlib.import_module(plugin.module)
+            seconds = time.perf_counter() - started
+            _import_seconds[plugin.module] = seconds
+            _modules[provider] = module
+            log.info("Imported %s for %s in %.2fs", plugin.module, provider, seconds)
+    return module
+
+
+def preload_sdk(provider: str):
+    """Import the provider's SDK on a background thread, ahead of its first request."""
+    if provider in _modules or provider not in _plugins:
+        return
+    threading.Thread(target=load_sdk, args=(provider,),
+                     name=f"import-{provider}", daemon=True).start()
+
+
+def loaded_connection_errors() -> tuple:
+    """Connection error classes of the SDKs imported so far; others cannot have been raised."""
+    return tuple(getattr(module, name)
+                 for provider, module in list(_modules.items())
+                 for name in _plugins[provider].connection_errors)
+
+
+def sdk_import_seconds() -> Dict[str, float]:
+    """Seconds each imported SDK took to import, by module name."""
+    return dict(_import_seconds)
+
+
+register(ProviderPlugin("OpenAI", "openai", ("APIConnectionError",)))
+register(ProviderPlugin("Anthropic", "anthropic", ("APIConnectionError",)))
+register(ProviderPlugin("Google Gemini", "google.ai.generativelanguage"))
@@ -1,76 +1,3012 @@
 import streamlit as st
-import openai
-import anthropic
-import google.generativeai as genai
 from pptx import Presentation
-from pptx.util import Inches, Pt
+from pptx.util import Emu, Inches, Pt
 from pptx.enum.text import PP_ALIGN
 from pptx.dml.color import RGBColor
+from PIL import Image as PILImage, ImageDraw, ImageFont
 import json
 import io
+import os
+import tempfile
 import zipfile
 import xml.etree.ElementTree as ET
 import re
-from typing import Dict, List, Any
+from typing import Dict, List, Any, NamedTuple, Optional
 import base64
+import hashlib
+import threading
+import time
+import asyncio
+import queue
+import random
+import email.utils
+from contextlib import contextmanager, nullcontext
+from collections import OrderedDict
+from difflib import SequenceMatcher
 from datetime import datetime
+import math
+import multiprocessing
+import logging
+import sys
+import tracemalloc
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache, wraps
+from parallel_render import (SlideParts, assemble_package, extract_slide_parts, publish_blank_template,
+                             render_items, render_shard)
+# Provider SDKs are imported when a provider is first used, not at start-up
+from provider_plugins import load_sdk, loaded_connection_errors, preload_sdk, provider_names, sdk_import_seconds
 
-# Page configuration
-st.set_page_config(
-    page_title="📊 Text to PowerPoint Generator",
-    page_icon="📊",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
-
-# Custom CSS for better styling
-st.markdown("""
-<style>
-    .main-header {
-        background: linear-gradient(135deg, #4f46e5 0%, #7c3aed 100%);
-        padding: 2rem;
-        border-radius: 10px;
-        color: white;
-        text-align: center;
-        margin-bottom: 2rem;
-    }
-    .feature-box {
-        background: #f8fafc;
-        padding: 1.5rem;
-        border-radius: 8px;
-        border-left: 4px solid #4f46e5;
-        margin: 1rem 0;
-    }
-    .warning-box {
-        background: #fef3c7;
-        padding: 1rem;
-        border-radius: 8px;
-        border-left: 4px solid #f59e0b;
-        margin: 1rem 0;
-    }
-    .success-box {
-        background: #f0fdf4;
-        padding: 1rem;
-        border-radius: 8px;
-        border-left: 4px solid #10b981;
-        margin: 1rem 0;
+# Fonts tried in order when a template font cannot be applied
+FALLBACK_FONTS = ['Calibri', 'Arial', 'Times New Roman', 'Helvetica']
+
+
+class FontStyle(NamedTuple):
+    """Font attributes resolved from a template, ready to apply to a run."""
+    name: Optional[str] = None
+    size: Optional[int] = None
+    bold: Optional[bool] = None
+    italic: Optional[bool] = None
+    color: Optional[RGBColor] = None
+
+    @classmethod
+    def from_font_info(cls, font_info: Dict[str, Any]) -> Optional['FontStyle']:
+        """Build a style from an extracted font_info dict, parsing its color once."""
+        if not font_info:
+            return None
+        color = None
+        color_str = font_info.get('color')
+        if color_str:
+            color_str = color_str.replace('RGBColor(0x', '').replace(')', '')
+            if len(color_str) == 6:
+                try:
+                    color = RGBColor.from_string(color_str)
+                except ValueError:
+                    pass
+        style = cls(
+            name=font_info.get('name') or None,
+            size=font_info.get('size') or None,
+            bold=font_info.get('bold'),
+            italic=font_info.get('italic'),
+            color=color
+        )
+        return style if any(v is not None for v in style) else None
+
+    def __reduce__(self):
+        # RGBColor and Pt cannot round-trip through pickle, so ship plain values
+        size = int(self.size) if self.size is not None else None
+        color = str(self.color) if self.color is not None else None
+        return (_unpickle_font_style, (self.name, size, self.bold, self.italic, color))
+
+    def apply(self, font):
+        """Apply these attributes to a python-pptx font."""
+        if self.name:
+            try:
+                font.name = self.name
+            except:
+                for fallback in FALLBACK_FONTS:
+                    try:
+                        font.name = fallback
+                        break
+                    except:
+                        continue
+        if self.size:
+            try:
+                font.size = self.size
+            except:
+                pass
+        if self.bold is not None:
+            try:
+                font.bold = self.bold
+            except:
+                pass
+        if self.italic is not None:
+            try:
+                font.italic = self.italic
+            except:
+                pass
+        if self.color is not None:
+            try:
+                font.color.rgb = self.color
+            except:
+                pass
+
+
+def _unpickle_font_style(name, size, bold, italic, color):
+    return FontStyle(name, Emu(size) if size is not None else None, bold, italic,
+                     RGBColor.from_string(color) if color else None)
+
+
+class StylePlan:
+    """Immutable lookup of the FontStyle to apply per (layout name, placeholder type).
+
+    Fallbacks are resolved at compile time, so styling a run is a single
+    dict lookup with no scanning of layouts or parsing of color strings.
+    """
+    __slots__ = ('_styles', 'fallback')
+
+    def __init__(self, styles: Dict[tuple, Optional[FontStyle]], fallback: Optional[FontStyle] = None):
+        object.__setattr__(self, '_styles', dict(styles))
+        object.__setattr__(self, 'fallback', fallback)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("StylePlan is immutable")
+
+    def __reduce__(self):
+        return (StylePlan, (self._styles, self.fallback))
+
+    def to_json(self) -> Dict[str, Any]:
+        """Plain JSON form, e.g. for compiled template artifacts."""
+        def style_args(style):
+            return list(style.__reduce__()[1]) if style else None
+        return {
+            'styles': [[layout, placeholder, style_args(style)]
+                       for (layout, placeholder), style in self._styles.items()],
+            'fallback': style_args(self.fallback),
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> 'StylePlan':
+        def style(args):
+            return _unpickle_font_style(*args) if args else None
+        return cls({(layout, placeholder): style(args) for layout, placeholder, args in data['styles']},
+                   style(data['fallback']))
+
+    @property
+    def fingerprint(self) -> str:
+        """Stable hash of the plan's contents, for keying rendered output."""
+        items = sorted((repr(key), repr(style)) for key, style in self._styles.items())
+        return hashlib.sha256(repr((items, repr(self.fallback))).encode()).hexdigest()
+
+    def resolve(self, layout_name: str = None, placeholder_type: str = None) -> Optional[FontStyle]:
+        """Return the style for a placeholder, or the template-wide fallback."""
+        if layout_name and placeholder_type:
+            return self._styles.get((layout_name, placeholder_type), self.fallback)
+        return self.fallback
+
+
+def compile_style_plan(styles: Dict[str, Any]) -> StylePlan:
+    """Precompile extracted template styles into a StylePlan."""
+    fallback = None
+    for layout in styles.get('layouts', []):
+        for placeholder in layout.get('placeholders', []):
+            font_info = placeholder.get('font_info')
+            if font_info and any(font_info.values()):
+                fallback = FontStyle.from_font_info(font_info)
+                break
+        if fallback:
+            break
+    compiled = {
+        key: FontStyle.from_font_info(font_info)
+        for key, font_info in styles.get('placeholder_styles', {}).items()
     }
-</style>
-""", unsafe_allow_html=True)
+    return StylePlan(compiled, fallback)
+
+
+# Slide archetypes an outline can ask for with a slide's "layout" field
+ARCHETYPES = ('title', 'bullets', 'two_column', 'section', 'quote')
+DEFAULT_ARCHETYPE = 'bullets'
+LAYOUT_ALIASES = {'bullet': 'bullets', 'content': 'bullets', 'two_columns': 'two_column',
+                  'comparison': 'two_column', 'section_header': 'section', 'divider': 'section'}
+# Layout names preferred for an archetype when several layouts fit it
+_ARCHETYPE_NAMES = {
+    'title': ('title slide',),
+    'bullets': ('title and content',),
+    'two_column': ('two', 'comparison'),
+    'section': ('section',),
+    'quote': ('quote',),
+}
+# Archetype used when a template has no layout for one
+_ARCHETYPE_FALLBACKS = {'two_column': 'bullets', 'quote': 'bullets', 'section': 'title'}
+_TITLE_TYPES = ('TITLE', 'CENTER_TITLE')
+_BODY_TYPES = ('BODY', 'OBJECT')
+
+
+class LayoutSlot(NamedTuple):
+    """Where an archetype's slides go: a layout and the placeholders to fill on it."""
+    layout: int  # Index into slide_layouts
+    name: Optional[str]  # Layout name, for style plan lookups
+    title: Optional[int]  # Title placeholder idx
+    bodies: tuple = ()  # (placeholder idx, placeholder type) pairs, left to right
+
+
+class LayoutIndex:
+    """Immutable map from slide archetype to the LayoutSlot that renders it.
+
+    Built once per template from its extracted layouts, with fallbacks
+    resolved up front, so placing a slide is a dict lookup and no
+    placeholders are scanned while rendering.
+    """
+    __slots__ = ('_slots',)
+
+    def __init__(self, slots: Dict[str, LayoutSlot]):
+        object.__setattr__(self, '_slots', dict(slots))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("LayoutIndex is immutable")
+
+    def __reduce__(self):
+        return (LayoutIndex, (self._slots,))
+
+    def resolve(self, archetype: str = None) -> LayoutSlot:
+        return self._slots.get(archetype) or self._slots[DEFAULT_ARCHETYPE]
+
+
+def _placeholder_kind(ph_type: str) -> str:
+    # Types are stored as e.g. "BODY (2)"
+    return str(ph_type).split(' ')[0]
+
+
+def compile_layout_index(styles: Dict[str, Any]) -> LayoutIndex:
+    """Precompile extracted template layouts into a LayoutIndex."""
+    candidates = {archetype: [] for archetype in ARCHETYPES}
+    fallbacks = []  # One slot per layout, filling what the old placeholder scan would
+    for layout in styles.get('layouts', []):
+        placeholders = layout.get('placeholders', [])
+        kinds = [_placeholder_kind(ph['type']) for ph in placeholders]
+        title = next((ph['idx'] for ph, kind in zip(placeholders, kinds) if kind in _TITLE_TYPES), None)
+        bodies = sorted((ph for ph, kind in zip(placeholders, kinds) if kind in _BODY_TYPES),
+                        key=lambda ph: (ph.get('left') or 0, ph.get('top') or 0))
+        subtitles = [ph for ph, kind in zip(placeholders, kinds) if kind == 'SUBTITLE']
+        name = layout.get('name') or None
+        lowered = (name or '').lower()
+
+        def slot(fill):
+            return LayoutSlot(layout['index'], name, title, tuple((ph['idx'], ph['type']) for ph in fill))
+
+        fallbacks.append(slot(bodies or [ph for ph in placeholders if ph['idx'] == 1][:1]))
+        if 'CENTER_TITLE' in kinds or (title is not None and subtitles):
+            candidates['title'].append(slot(subtitles or bodies))
+        if not bodies:
+            continue
+        if 'section' in lowered:
+            candidates['section'].append(slot(bodies))
+        elif 'quote' in lowered:
+            candidates['quote'].append(slot(bodies))
+        elif len(bodies) == 1:
+            candidates['bullets'].append(slot(bodies))
+        else:
+            candidates['two_column'].append(slot(bodies))
+
+    slots = {}
+    for archetype, found in candidates.items():
+        preferred = [s for s in found
+                     if any(word in (s.name or '').lower() for word in _ARCHETYPE_NAMES[archetype])]
+        if found:
+            slots[archetype] = (preferred or found)[0]
+    # Templates without recognizable layouts keep the first two, as before
+    if 'title' not in slots:
+        slots['title'] = fallbacks[0] if fallbacks else LayoutSlot(0, None, None)
+    if DEFAULT_ARCHETYPE not in slots:
+        slots[DEFAULT_ARCHETYPE] = fallbacks[min(1, len(fallbacks) - 1)] if fallbacks \
+            else LayoutSlot(1, None, None)
+    for archetype, fallback in _ARCHETYPE_FALLBACKS.items():
+        slots.setdefault(archetype, slots[fallback])
+    return LayoutIndex(slots)
+
+
+# Decks with at least this many slides are rendered in parallel shards
+PARALLEL_RENDER_MIN_SLIDES = 40
+# Smallest number of slides worth sending to a render worker
+MIN_SHARD_SLIDES = 10
+RENDER_WORKERS = os.cpu_count() or 1
+
+
+@st.cache_resource
+def get_render_pool() -> ProcessPoolExecutor:
+    """Return the slide render worker pool shared by all sessions in this process."""
+    # spawn: forking the multi-threaded Streamlit server is not safe
+    return ProcessPoolExecutor(max_workers=RENDER_WORKERS,
+                               mp_context=multiprocessing.get_context('spawn'))
+
+
+# Bump when slide rendering changes, so cached slide parts are not reused
+RENDER_VERSION = 2
+SLIDE_PART_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+def slide_fingerprint(kind: str, data: Any, plan_fingerprint: Optional[str], template_digest: str) -> str:
+    """Hash everything that determines a rendered slide's XML."""
+    payload = json.dumps([RENDER_VERSION, template_digest, plan_fingerprint, kind, data],
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class SlidePartCache:
+    """Process-wide LRU cache of rendered slide parts keyed by slide fingerprint."""
+
+    def __init__(self, max_bytes: int = SLIDE_PART_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # fingerprint -> SlideParts
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _size(parts: SlideParts) -> int:
+        return sum(len(blob) for blob in parts if blob)
+
+    def get(self, fingerprint: str) -> Optional[SlideParts]:
+        with self._lock:
+            parts = self._entries.get(fingerprint)
+            if parts is not None:
+                self._entries.move_to_end(fingerprint)
+            return parts
+
+    def put(self, fingerprint: str, parts: SlideParts):
+        size = self._size(parts)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(fingerprint, None)
+            if previous is not None:
+                self._total_bytes -= self._size(previous)
+            self._entries[fingerprint] = parts
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= self._size(evicted)
+
+
+@st.cache_resource
+def get_slide_part_cache() -> SlidePartCache:
+    """Return the rendered slide cache shared by all sessions in this process."""
+    return SlidePartCache()
+
+
+@lru_cache(maxsize=1)
+def default_blank_template() -> bytes:
+    """The blank package used when no template is uploaded."""
+    return build_blank_template(Presentation())
+
+
+@lru_cache(maxsize=1)
+def default_template_styles() -> Dict[str, Any]:
+    """The extracted styles of the default template; shared, so treat as read-only."""
+    return PresentationGenerator().extract_template_styles(Presentation())
+
+
+def default_layout_index() -> LayoutIndex:
+    """The layout index of the default template."""
+    return default_template_styles()['layout_index']
+
+
+# Upper bound on the estimated in-memory size of all cached templates
+TEMPLATE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+
+def build_blank_template(template) -> bytes:
+    """Serialize a template with all slides stripped, keeping layouts, masters and theme.
+
+    Accepts raw package bytes or a Presentation. Media only referenced by the
+    removed slides is not written, so the blank package is usually smaller.
+    """
+    if isinstance(template, (bytes, bytearray, memoryview)):
+        prs = Presentation(io.BytesIO(template))
+    else:
+        buffer = io.BytesIO()
+        template.save(buffer)
+        buffer.seek(0)
+        prs = Presentation(buffer)
+
+    sld_id_lst = prs.slides._sldIdLst
+    for sld_id in list(sld_id_lst):
+        prs.part.drop_rel(sld_id.rId)
+        sld_id_lst.remove(sld_id)
+
+    # Create the notes master up front, so every deck opened from this
+    # package (including render shards) shares the same one
+    prs.notes_master
+
+    output = io.BytesIO()
+    prs.save(output)
+    return output.getvalue()
+
+
+# Saved decks up to this size stay in memory; larger ones roll over to a temp file
+DECK_SPOOL_MAX_BYTES = 8 * 1024 * 1024
+# Parts whose format is already compressed; deflating them again only costs CPU
+STORED_CONTENT_TYPES = frozenset({
+    'image/png', 'image/jpeg', 'image/gif', 'image/webp',
+    'audio/mpeg', 'audio/mp4', 'video/mp4', 'video/mpeg', 'video/quicktime', 'video/x-ms-wmv',
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+})
+_CONTENT_TYPES_NS = 'http://schemas.openxmlformats.org/package/2006/content-types'
+_RELS_CONTENT_TYPE = 'application/vnd.openxmlformats-package.relationships+xml'
+
+
+def write_presentation(prs: Presentation, target) -> None:
+    """Write a presentation's package to a path or writable binary file.
+
+    Produces the same package as prs.save(), but media in STORED_CONTENT_TYPES
+    is stored rather than deflated again, and parts are serialized and
+    written one at a time, so at most one part's XML is held in memory.
+    """
+    package = prs.part.package
+    parts = list(package.iter_parts())
+
+    # Binary parts are typed by extension, XML parts by name
+    types = ET.Element('Types', xmlns=_CONTENT_TYPES_NS)
+    defaults = {'rels': _RELS_CONTENT_TYPE, 'xml': 'application/xml'}
+    overrides = []
+    for part in parts:
+        ext = part.partname.ext.lower()
+        if ext != 'xml' and defaults.setdefault(ext, part.content_type) == part.content_type:
+            continue
+        overrides.append((part.partname, part.content_type))
+    for ext, content_type in defaults.items():
+        ET.SubElement(types, 'Default', Extension=ext, ContentType=content_type)
+    for partname, content_type in overrides:
+        ET.SubElement(types, 'Override', PartName=partname, ContentType=content_type)
+
+    with zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED) as package_zip:
+        package_zip.writestr('[Content_Types].xml',
+                             ET.tostring(types, encoding='UTF-8', xml_declaration=True))
+        package_zip.writestr('_rels/.rels', package._rels.xml)
+        for part in parts:
+            compress_type = (zipfile.ZIP_STORED if part.content_type in STORED_CONTENT_TYPES
+                             else zipfile.ZIP_DEFLATED)
+            package_zip.writestr(part.partname.membername, part.blob, compress_type=compress_type)
+            if part.rels:
+                package_zip.writestr(part.partname.rels_uri.membername, part.rels.xml)
+
+
+class DeckFile:
+    """A saved deck, spooled in memory up to DECK_SPOOL_MAX_BYTES and on disk beyond that."""
+
+    def __init__(self, prs: Presentation):
+        self._file = tempfile.SpooledTemporaryFile(max_size=DECK_SPOOL_MAX_BYTES)
+        write_presentation(prs, self._file)
+        self.size = self._file.seek(0, io.SEEK_END)
+        self._lock = threading.Lock()  # Reads seek the shared file
+
+    def read(self) -> bytes:
+        with self._lock:
+            self._file.seek(0)
+            return self._file.read()
+
+
+def _supports_deferred_downloads() -> bool:
+    try:
+        from streamlit.runtime.media_file_manager import MediaFileManager
+    except ImportError:
+        return False
+    return hasattr(MediaFileManager, 'add_deferred')
+
+
+# Newer Streamlit versions accept a callable download_button data, read only on click
+DEFERRED_DOWNLOADS = _supports_deferred_downloads()
+
+
+def deck_download_data(deck: DeckFile):
+    """download_button data for a deck, so the session does not keep its own copy where possible"""
+    return deck.read if DEFERRED_DOWNLOADS else deck.read()
+
+
+# Oversized images are downsampled to this resolution at their largest displayed size
+IMAGE_TARGET_DPI = 150
+# Images at most this much larger than needed are left alone
+IMAGE_OVERSIZE_FACTOR = 1.25
+JPEG_QUALITY = 85
+IMAGE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+_RECOMPRESSED_FORMATS = ('JPEG', 'PNG')  # Re-encoded in their own format, so part names stay valid
+_MEDIA_TYPE_PREFIXES = ('image/', 'audio/', 'video/')
+_EMU_PER_INCH = 914400
+
+
+class ImageCache(SlidePartCache):
+    """Process-wide LRU cache of re-encoded images keyed by source hash and pixel size.
+
+    An empty value records that re-encoding would not make the image smaller.
+    """
+
+    _size = staticmethod(len)
+
+    def __init__(self, max_bytes: int = IMAGE_CACHE_MAX_BYTES):
+        super().__init__(max_bytes)
+
+
+@st.cache_resource
+def get_image_cache() -> ImageCache:
+    """Return the re-encoded image cache shared by all sessions in this process."""
+    return ImageCache()
+
+
+def _drop_unused_layouts(prs: Presentation) -> tuple:
+    """Remove layouts no slide uses and masters left without any; returns (layouts, masters) removed"""
+    used = {slide.slide_layout.part for slide in prs.slides}
+    masters = list(prs.slide_masters)
+    if not any(layout.part in used for master in masters for layout in master.slide_layouts):
+        return 0, 0  # Nothing to anchor to, e.g. an empty deck
+
+    layouts_removed = 0
+    unused_masters = []
+    for master in masters:
+        layouts = list(master.slide_layouts)
+        if not any(layout.part in used for layout in layouts):
+            unused_masters.append(master.part)
+            layouts_removed += len(layouts)
+            continue
+        for layout in layouts:
+            if layout.part not in used:
+                master.slide_layouts.remove(layout)
+                layouts_removed += 1
+
+    sld_master_id_lst = prs.slide_masters._sldMasterIdLst
+    for sld_master_id in list(sld_master_id_lst):
+        if prs.part.related_part(sld_master_id.rId) in unused_masters:
+            sld_master_id_lst.remove(sld_master_id)
+            prs.part.drop_rel(sld_master_id.rId)
+    return layouts_removed, len(unused_masters)
+
+
+def _displayed_extents(parts, slide_size: tuple) -> Dict[Any, Optional[tuple]]:
+    """Largest displayed (cx, cy) in EMU of each embedded image, or None when unknown.
+
+    Cropped, tiled and grouped pictures, and images referenced other than
+    by a blip, have no simple displayed size and are not resized.
+    """
+    extents = {}
+    for part in parts:
+        element = getattr(part, '_element', None)
+        if element is None:
+            continue
+        for rId, rel in part.rels.items():
+            if rel.is_external or not rel.target_part.content_type.startswith('image/'):
+                continue
+            target = rel.target_part
+            if target in extents and extents[target] is None:
+                continue
+            blips = element.xpath(f'.//a:blip[@r:embed="{rId}"]')
+            cx, cy = extents.get(target) or (0, 0)
+            for blip in blips:
+                fill = blip.getparent()
+                if (fill.xpath('a:tile') or fill.xpath('a:srcRect[@l or @t or @r or @b]')
+                        or blip.xpath('ancestor::p:grpSp')):
+                    break
+                ext = blip.xpath('ancestor::p:pic[1]/p:spPr/a:xfrm/a:ext')
+                # Background and shape fills are at most the slide's size
+                size = (ext[0].cx, ext[0].cy) if ext else slide_size
+                cx, cy = max(cx, size[0]), max(cy, size[1])
+            else:
+                if blips:
+                    extents[target] = (cx, cy)
+                    continue
+            extents[target] = None
+    return extents
+
+
+def recompress_image(blob: bytes, pixels: tuple) -> Optional[bytes]:
+    """Downsample a JPEG or PNG to cover pixels (width, height) and re-encode it.
+
+    Returns None when the image is not oversized, is in another format, or
+    would not get smaller.
+    """
+    with PILImage.open(io.BytesIO(blob)) as image:
+        if image.format not in _RECOMPRESSED_FORMATS:
+            return None
+        scale = max(pixels[0] / image.width, pixels[1] / image.height)
+        if scale * IMAGE_OVERSIZE_FACTOR > 1:
+            return None
+        image_format = image.format
+        icc_profile = image.info.get('icc_profile')
+        if image.mode == 'P':
+            image = image.convert('RGBA')  # Palette images only resize with nearest-neighbour
+        resized = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+                               PILImage.LANCZOS)
+    output = io.BytesIO()
+    options = {'dpi': (IMAGE_TARGET_DPI, IMAGE_TARGET_DPI), 'icc_profile': icc_profile, 'optimize': True}
+    if image_format == 'JPEG':
+        options['quality'] = JPEG_QUALITY
+    resized.save(output, image_format, **options)
+    data = output.getvalue()
+    return data if len(data) < len(blob) else None
+
+
+def slim_presentation(prs: Presentation, image_cache: ImageCache = None,
+                      dpi: int = IMAGE_TARGET_DPI) -> Dict[str, int]:
+    """Shrink a rendered deck's package before it is saved.
+
+    Removes layouts no slide uses and masters left without layouts (their
+    themes and media go with them, as write_presentation only writes parts
+    still referenced), points every reference to identical media at one
+    copy, and re-encodes images much larger than their displayed size at dpi.
+    Returns counts of what changed.
+    """
+    layouts, masters = _drop_unused_layouts(prs)
+    parts = list(prs.part.package.iter_parts())
+
+    # Identical media is kept once; the other copies are no longer referenced
+    digests = {}
+    canonical = {}
+    duplicates = set()
+    for part in parts:
+        for rel in part.rels.values():
+            if rel.is_external or not rel.target_part.content_type.startswith(_MEDIA_TYPE_PREFIXES):
+                continue
+            target = rel.target_part
+            if target not in digests:
+                digests[target] = hashlib.sha1(target.blob).hexdigest()
+            keep = canonical.setdefault(digests[target], target)
+            if keep is not target:
+                rel._target = keep
+                for cached in ('target_part', 'target_partname', 'target_ref'):
+                    rel.__dict__.pop(cached, None)
+                duplicates.add(target)
+    parts = [part for part in parts if part not in duplicates]
+
+    images = saved = 0
+    for image_part, extent in _displayed_extents(parts, (prs.slide_width, prs.slide_height)).items():
+        if extent is None:
+            continue
+        pixels = (math.ceil(extent[0] / _EMU_PER_INCH * dpi), math.ceil(extent[1] / _EMU_PER_INCH * dpi))
+        key = f"{digests[image_part]}:{pixels[0]}x{pixels[1]}"
+        data = image_cache.get(key) if image_cache is not None else None
+        if data is None:
+            try:
+                data = recompress_image(image_part.blob, pixels) or b''
+            except Exception:
+                data = b''  # Not an image Pillow can read; keep it as it is
+            if image_cache is not None:
+                image_cache.put(key, data)
+        if data:
+            saved += len(image_part.blob) - len(data)
+            image_part._blob = data
+            image_part.__dict__.pop('sha1', None)
+            images += 1
+    return {'layouts': layouts, 'masters': masters, 'duplicates': len(duplicates),
+            'images': images, 'image_bytes_saved': saved}
+
+
+def describe_slimming(slimmed: Dict[str, int]) -> str:
+    """One-line summary of a slim_presentation() result"""
+    changes = []
+    if slimmed['layouts'] or slimmed['masters']:
+        changes.append(f"removed {slimmed['layouts']} unused layout(s) and {slimmed['masters']} master(s)")
+    if slimmed['duplicates']:
+        changes.append(f"merged {slimmed['duplicates']} duplicate media file(s)")
+    if slimmed['images']:
+        changes.append(f"downsampled {slimmed['images']} image(s), saving "
+                       f"{slimmed['image_bytes_saved'] / 1e6:.1f} MB")
+    if not changes:
+        return "The output file had nothing to slim."
+    return f"Slimmed the output file: {', '.join(changes)}."
+
+
+# Slide previews are drawn this many pixels wide
+THUMBNAIL_WIDTH = 320
+THUMBNAIL_VERSION = 1  # Part of the cache key; bump when previews are drawn differently
+THUMBNAIL_CACHE_MAX_BYTES = 32 * 1024 * 1024
+THUMBNAIL_WORKERS = 4
+THUMBNAIL_COLUMNS = 4
+# Point sizes PowerPoint uses when a template does not set one
+DEFAULT_POINT_SIZES = {'title': 44, 'subtitle': 24, 'body': 28, 'textbox': 18}
+PREVIEW_LINE_SPACING = 1.2
+PREVIEW_MIN_FONT_SCALE = 0.5  # Overflowing text is shrunk to at most half its size
+_PREVIEW_FALLBACK_FONTS = (('DejaVuSans.ttf', 'DejaVuSans-Bold.ttf'),
+                           ('LiberationSans-Regular.ttf', 'LiberationSans-Bold.ttf'))
+_PREVIEW_OUTLINE = (160, 160, 160)
+# Where add_content_slide puts bullets when a layout has no body placeholder
+_TEXTBOX_BOX = (Inches(1), Inches(1.5), Inches(8), Inches(5))
+
+
+@st.cache_resource
+def get_thumbnail_cache() -> ImageCache:
+    """Return the slide preview cache (PNG bytes by slide fingerprint) shared by all sessions."""
+    return ImageCache(THUMBNAIL_CACHE_MAX_BYTES)
+
+
+@st.cache_resource
+def get_thumbnail_pool() -> ThreadPoolExecutor:
+    """Return the thread pool slide previews are drawn on."""
+    return ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix='thumbnail')
+
+
+@st.cache_resource(max_entries=256, show_spinner=False)
+def preview_font(name: Optional[str], pixels: int, bold: bool = False):
+    """A Pillow font for preview text, loaded once per (font, size, weight).
+
+    Tries the template's font by file name, then common free fonts, then
+    Pillow's built-in font.
+    """
+    candidates = []
+    if name:
+        stem = name.replace(' ', '')
+        candidates += [f"{stem}-Bold.ttf", f"{name} Bold.ttf"] if bold else []
+        candidates += [f"{stem}.ttf", f"{name}.ttf", f"{stem.lower()}.ttf"]
+    candidates += [fonts[1] if bold else fonts[0] for fonts in _PREVIEW_FALLBACK_FONTS]
+    for candidate in candidates:
+        try:
+            # Basic layout (no shaping) measures text several times faster
+            return ImageFont.truetype(candidate, pixels, layout_engine=ImageFont.Layout.BASIC)
+        except OSError:
+            continue
+    return ImageFont.load_default(pixels)
+
+
+def _preview_color(color) -> Optional[tuple]:
+    """An (r, g, b) tuple from an RGBColor or 'RRGGBB' string, or None"""
+    try:
+        return tuple(bytes.fromhex(str(color)[-6:])) if color else None
+    except ValueError:
+        return None
+
+
+def _wrap_text(draw, text: str, font, width: float) -> List[str]:
+    """Greedy word wrap; each word is measured once and line widths are summed"""
+    space = draw.textlength(' ', font=font)
+    lines = []
+    line_width = 0.0
+    for word in text.split():
+        word_width = draw.textlength(word, font=font)
+        if lines and line_width + space + word_width <= width:
+            lines[-1] = f"{lines[-1]} {word}"
+            line_width += space + word_width
+        else:
+            lines.append(word)
+            line_width = word_width
+    return lines or ['']
+
+
+def _draw_text_box(draw, box: tuple, paragraphs: List[str], style: FontStyle, pixels: int, fill: tuple,
+                   center: bool = False, middle: bool = False):
+    """Draw wrapped paragraphs in box (left, top, right, bottom).
+
+    Like PowerPoint's shrink-on-overflow autofit, the font is made smaller
+    until the text fits, down to PREVIEW_MIN_FONT_SCALE of its size; lines
+    that still do not fit are dropped.
+    """
+    left, top, right, bottom = box
+    min_pixels = max(6, round(pixels * PREVIEW_MIN_FONT_SCALE))
+    while True:
+        font = preview_font(style.name, pixels, bool(style.bold))
+        line_height = pixels * PREVIEW_LINE_SPACING
+        lines = [line for paragraph in paragraphs
+                 for line in _wrap_text(draw, paragraph, font, right - left)]
+        if len(lines) * line_height <= bottom - top or pixels <= min_pixels:
+            break
+        pixels = max(min_pixels, int(pixels * 0.9))
+    lines = lines[:max(1, int((bottom - top) // line_height))]
+    y = top + (bottom - top - len(lines) * line_height) / 2 if middle else top
+    for line in lines:
+        x = (left + right - draw.textlength(line, font=font)) / 2 if center else left
+        draw.text((x, y), line, font=font, fill=fill)
+        y += line_height
+
+
+def render_thumbnail(kind: str, data: Any, styles: Dict[str, Any], width: int = THUMBNAIL_WIDTH) -> bytes:
+    """Draw a deck item ('title' or 'content', as in _deck_items) as a PNG preview.
+
+    Uses the placeholder positions, fonts and background colors captured by
+    extract_template_styles, so no PowerPoint or LibreOffice is needed.
+    Shapes, pictures and theme effects are not drawn.
+    """
+    index = styles.get('layout_index') or compile_layout_index(styles)
+    plan = styles.get('style_plan') or compile_style_plan(styles)
+    slide_width = styles.get('slide_width') or 9144000
+    slide_height = styles.get('slide_height') or 6858000
+    scale = width / slide_width  # Pixels per EMU
+    archetype = 'title' if kind == 'title' else data.get('layout') or DEFAULT_ARCHETYPE
+    slot = index.resolve(archetype)
+    layouts = styles.get('layouts') or []
+    layout = layouts[slot.layout] if slot.layout < len(layouts) else {}
+    placeholders = {ph['idx']: ph for ph in layout.get('placeholders', [])}
+
+    background = _preview_color((layout.get('background') or styles.get('master_background') or {}).get('color'))
+    background = background or (255, 255, 255)
+    # Dark text on light backgrounds and light text on dark ones, unless the template sets a color
+    ink = (34, 34, 34) if sum(background) > 384 else (240, 240, 240)
+    image = PILImage.new('RGB', (width, max(1, round(slide_height * scale))), background)
+    draw = ImageDraw.Draw(image)
+
+    def placeholder_box(idx: Optional[int], default: tuple) -> tuple:
+        ph = placeholders.get(idx) or {}
+        geometry = [ph.get(key) for key in ('left', 'top', 'width', 'height')]
+        left, top, box_width, box_height = geometry if all(v is not None for v in geometry) else default
+        return (left * scale, top * scale, (left + box_width) * scale, (top + box_height) * scale)
+
+    def fill_box(box: tuple, paragraphs: List[str], placeholder_type: str, role: str, outline: bool = True,
+                 center: bool = False, middle: bool = False, points: float = None):
+        style = plan.resolve(slot.name, placeholder_type) or FontStyle()
+        size = Pt(points) if points else style.size or Pt(DEFAULT_POINT_SIZES[role])
+        if outline:
+            draw.rectangle(box, outline=_PREVIEW_OUTLINE)
+        _draw_text_box(draw, box, paragraphs, style, max(6, round(size * scale)),
+                       _preview_color(style.color) or ink, center, middle)
+
+    title_box = placeholder_box(slot.title, (Inches(0.5), Inches(0.3), slide_width - Inches(1), Inches(1.25)))
+    if kind == 'title':
+        fill_box(title_box, [data], 'TITLE', 'title', center=True, middle=True)
+        subtitle = slot.bodies[0][0] if slot.bodies else 1
+        if subtitle in placeholders:
+            fill_box(placeholder_box(subtitle, _TEXTBOX_BOX),
+                     [f"Generated on {datetime.now().strftime('%B %d, %Y')}"], 'SUBTITLE', 'subtitle',
+                     center=True)
+    else:
+        fill_box(title_box, [data['title']], 'TITLE', 'title', middle=True)
+        content = data['content']
+        columns = [content]
+        if archetype == 'two_column' and len(slot.bodies) > 1:
+            half = math.ceil(len(content) / 2)
+            columns = [content[:half], content[half:]]
+        bullets = [[f"\u2022 {point}" for point in points] for points in columns]
+        if slot.bodies:
+            for (idx, ph_type), points in zip(slot.bodies, bullets):
+                fill_box(placeholder_box(idx, _TEXTBOX_BOX), points, ph_type, 'body',
+                         points=data.get('font_size'))
+        else:
+            fill_box(placeholder_box(None, _TEXTBOX_BOX), bullets[0], 'BODY', 'textbox', outline=False,
+                     points=data.get('font_size'))
+
+    output = io.BytesIO()
+    image.save(output, 'PNG')
+    return output.getvalue()
+
+
+def render_thumbnail_grid(thumbnails: List[bytes]):
+    """Show slide previews in a grid, numbered from the title slide"""
+    columns = st.columns(THUMBNAIL_COLUMNS)
+    for number, thumbnail in enumerate(thumbnails, 1):
+        with columns[(number - 1) % THUMBNAIL_COLUMNS]:
+            st.image(thumbnail, caption=f"Slide {number}")
+
+
+# Bullets are fitted to their placeholders before rendering. An overflowing
+# slide gets a smaller font, down to FIT_MIN_FONT_SCALE of the template's,
+# and if that is not enough it is split into continuation slides.
+FIT_MIN_FONT_SCALE = 0.7
+FIT_FONT_STEP = Pt(2)
+FIT_LINE_SPACING = 1.2  # Line height as a multiple of the font size
+FIT_PARAGRAPH_SPACING = 0.35  # Space before each bullet, as a multiple of the font size
+# Default body insets (0.1" per side) plus the bullet indent, and the top and bottom insets
+FIT_WIDTH_PADDING = Inches(0.45)
+FIT_HEIGHT_PADDING = Inches(0.1)
+CONTINUATION_SUFFIX = " (cont.)"
+FONT_METRICS_MEMO_MAX = 50000  # Measured words and bullets remembered per font
+_METRICS_REFERENCE_PIXELS = 1000
+
+
+class FontMetrics:
+    """Glyph advance widths of one font in ems, with memos of measured text.
+
+    Widths scale linearly with font size, so one table per font serves
+    every size, and word widths and wrapped line counts are remembered
+    across sizes and calls: re-fitting a deck (for the slide cache,
+    previews and edits) mostly costs dict lookups.
+    """
+    __slots__ = ('advances', 'space', '_words', '_lines')
+
+    def __init__(self, font_name: Optional[str], bold: bool):
+        font = preview_font(font_name, _METRICS_REFERENCE_PIXELS, bold)
+        self.advances = tuple(font.getlength(chr(code)) / _METRICS_REFERENCE_PIXELS if code >= 32 else 0.0
+                              for code in range(256))
+        self.space = self.advances[32]
+        self._words = {}
+        self._lines = {}  # (text, box width in ems) -> line count
+
+    def text(self, text: str) -> float:
+        """Width of text in ems; characters beyond Latin-1 count as one em"""
+        if text.isascii():
+            return sum(map(self.advances.__getitem__, text.encode('ascii')))
+        return sum(self.advances[code] if code < 256 else 1.0 for code in map(ord, text))
+
+    def word(self, word: str) -> float:
+        width = self._words.get(word)
+        if width is None:
+            if len(self._words) >= FONT_METRICS_MEMO_MAX:
+                self._words.clear()
+            width = self._words[word] = self.text(word)
+        return width
+
+    def lines(self, text: str, em_width: float) -> int:
+        """Lines text wraps to in a box em_width ems wide"""
+        key = (text, em_width)
+        lines = self._lines.get(key)
+        if lines is None:
+            if len(self._lines) >= FONT_METRICS_MEMO_MAX:
+                self._lines.clear()
+            lines = self._lines[key] = count_lines(text, self, em_width)
+        return lines
+
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def font_metrics(font_name: Optional[str], bold: bool = False) -> FontMetrics:
+    """The metrics of a font, measured once per process"""
+    return FontMetrics(font_name, bold)
+
+
+def count_lines(text: str, metrics: FontMetrics, em_width: float) -> int:
+    """Lines text wraps to in a box em_width ems wide, breaking between words as PowerPoint does"""
+    space = metrics.space
+    word_widths = list(map(metrics.word, text.split()))
+    if sum(word_widths) + space * (len(word_widths) - 1) <= em_width:
+        return 1
+    lines, line = 1, 0.0
+    for word_width in word_widths:
+        if line and line + space + word_width > em_width:
+            lines += 1
+            line = 0.0
+        if word_width > em_width:
+            # Words wider than the box are broken across lines
+            lines += int(word_width // em_width)
+            word_width %= em_width
+        line += (space if line else 0.0) + word_width
+    return lines
+
+
+def _points(size: int) -> float:
+    # Rounded down, so the stored size is never larger than the one that fit
+    return math.floor(Emu(size).pt * 10) / 10
+
+
+class _FitSpec(NamedTuple):
+    boxes: tuple  # (width, height) in EMU of each body, left to right, less insets
+    metrics: FontMetrics
+    size: int  # Template font size in EMU
+
+
+class TextFitter:
+    """Fits slide bullets to a template's body placeholders.
+
+    Placeholder boxes and fonts are resolved once per archetype, and text
+    is measured with cached FontMetrics, so fitting a 500-slide deck takes
+    milliseconds.
+    """
+
+    def __init__(self, styles: Dict[str, Any]):
+        index = styles.get('layout_index') or compile_layout_index(styles)
+        plan = styles.get('style_plan') or compile_style_plan(styles)
+        layouts = styles.get('layouts') or []
+        fonts = {}  # (name, bold) -> FontMetrics
+        self._specs = {}
+        for archetype in ARCHETYPES:
+            slot = index.resolve(archetype)
+            layout = layouts[slot.layout] if slot.layout < len(layouts) else {}
+            placeholders = {ph['idx']: ph for ph in layout.get('placeholders', [])}
+            boxes = []
+            for idx, _ in slot.bodies:
+                ph = placeholders.get(idx) or {}
+                # Placeholders without recorded geometry are taken to be text box sized
+                boxes.append((ph['width'], ph['height']) if ph.get('width') and ph.get('height')
+                             else _TEXTBOX_BOX[2:])
+            role = 'body'
+            if not boxes:
+                # Bullets go in add_content_slide's fallback text box
+                boxes, role = [_TEXTBOX_BOX[2:]], 'textbox'
+            style = plan.resolve(slot.name, slot.bodies[0][1]) if slot.bodies else plan.resolve()
+            style = style or FontStyle()
+            font = (style.name, bool(style.bold))
+            if font not in fonts:
+                fonts[font] = font_metrics(*font)
+            self._specs[archetype] = _FitSpec(
+                tuple((max(1, w - FIT_WIDTH_PADDING), max(1, h - FIT_HEIGHT_PADDING)) for w, h in boxes),
+                fonts[font],
+                int(style.size or Pt(DEFAULT_POINT_SIZES[role])))
+
+    def fits(self, archetype: str, points: List[str], size: int, heights: dict = None) -> bool:
+        """Whether points fit the archetype's bodies at size (EMU), split in columns as rendered.
+
+        heights memoizes bullet heights across calls for the same slide.
+        """
+        spec = self._specs.get(archetype) or self._specs[DEFAULT_ARCHETYPE]
+        columns = [points]
+        if archetype == 'two_column' and len(spec.boxes) > 1:
+            half = math.ceil(len(points) / 2)
+            columns = [points[:half], points[half:]]
+        metrics = spec.metrics
+        line_height = size * FIT_LINE_SPACING
+        spacing = size * FIT_PARAGRAPH_SPACING
+        heights = {} if heights is None else heights
+        for (box_width, box_height), column in zip(spec.boxes, columns):
+            used = 0.0
+            for point in column:
+                key = (point, size, box_width)
+                height = heights.get(key)
+                if height is None:
+                    height = heights[key] = spacing + metrics.lines(point, box_width / size) * line_height
+                used += height
+                if used > box_height:
+                    return False
+        return True
+
+    def fit_slide(self, slide_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """The slide as one or more slides whose bullets fit.
+
+        A slide that overflows gets the largest smaller "font_size" (points)
+        that fits, down to FIT_MIN_FONT_SCALE of the template size. Otherwise
+        its bullets are split across continuation slides at its current size.
+        Fitted slides come back unchanged, so fitting twice is harmless.
+        """
+        archetype = slide_data.get('layout') or DEFAULT_ARCHETYPE
+        spec = self._specs.get(archetype) or self._specs[DEFAULT_ARCHETYPE]
+        points = slide_data.get('content') or []
+        size = int(Pt(slide_data['font_size'])) if slide_data.get('font_size') else spec.size
+        heights = {}
+        if self.fits(archetype, points, size, heights):
+            return [slide_data]
+
+        smallest = int(spec.size * FIT_MIN_FONT_SCALE)
+        smaller = size - FIT_FONT_STEP
+        while smaller >= smallest:
+            if self.fits(archetype, points, smaller, heights):
+                return [dict(slide_data, font_size=_points(smaller))]
+            smaller -= FIT_FONT_STEP
+
+        chunks = []
+        for point in points:
+            if chunks and self.fits(archetype, chunks[-1] + [point], size, heights):
+                chunks[-1].append(point)
+            else:
+                chunks.append([point])
+        slides = []
+        for i, chunk in enumerate(chunks):
+            slide = dict(slide_data, content=chunk)
+            if i:
+                slide['title'] = slide_data['title'] + CONTINUATION_SUFFIX
+                slide.pop('notes', None)  # Notes stay with the first slide
+            if not self.fits(archetype, chunk, size, heights):
+                # A single bullet too long for a slide gets the smallest font
+                slide['font_size'] = _points(min(size, smallest))
+            slides.append(slide)
+        return slides
+
+    def fit_structure(self, structure: Dict[str, Any]) -> Dict[str, Any]:
+        """A copy of the outline with every slide fitted"""
+        slides = [fitted for slide_data in structure['slides'] for fitted in self.fit_slide(slide_data)]
+        return dict(structure, slides=slides)
+
+
+class CachedTemplate:
+    """A parsed template package and its extracted styles, keyed by content hash."""
+
+    def __init__(self, digest: str, prs: Presentation, styles: Dict[str, Any], blank: bytes, size: int):
+        self.digest = digest
+        self.prs = prs
+        self.styles = styles
+        self.blank = blank  # Slide-free package, opened for each generation
+        self.size = size
+
+
+class TemplateCache:
+    """Process-wide LRU cache of parsed templates bounded by a memory budget.
+
+    Entries are keyed by the SHA-256 of the uploaded bytes, so an identical
+    template is parsed and walked once no matter how many sessions upload it.
+    Cached entries are shared and must be treated as read-only.
+    """
+
+    def __init__(self, max_bytes: int = TEMPLATE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # digest -> CachedTemplate
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}  # digest -> Lock, so a template is parsed once
+
+    @staticmethod
+    def estimate_size(data: bytes) -> int:
+        """Estimate the in-memory footprint of a package from its uncompressed part sizes."""
+        try:
+            with zipfile.ZipFile(io.BytesIO(data)) as package:
+                return sum(info.file_size for info in package.infolist())
+        except Exception:
+            return len(data)
+
+    def get_or_load(self, data: bytes) -> CachedTemplate:
+        """Return the cached template for these bytes, parsing it on first use."""
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                self._entries.move_to_end(digest)
+                return entry
+            key_lock = self._key_locks.setdefault(digest, threading.Lock())
+
+        with key_lock:
+            # Another session may have finished loading while we waited
+            with self._lock:
+                entry = self._entries.get(digest)
+                if entry is not None:
+                    self._entries.move_to_end(digest)
+                    return entry
+
+            try:
+                prs = Presentation(io.BytesIO(data))
+                styles = PresentationGenerator().extract_template_styles(prs)
+                blank = build_blank_template(data)
+                entry = CachedTemplate(
+                    digest, prs, styles, blank, self.estimate_size(data) + len(blank))
+                self._store(entry)
+            finally:
+                with self._lock:
+                    self._key_locks.pop(digest, None)
+        return entry
+
+    def _store(self, entry: CachedTemplate):
+        """Insert an entry and evict least recently used ones over budget."""
+        if entry.size > self.max_bytes:
+            return  # Too large to cache; the caller still gets the parsed entry
+        with self._lock:
+            self._entries[entry.digest] = entry
+            self._total_bytes += entry.size
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= evicted.size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+
+@st.cache_resource
+def get_template_cache() -> TemplateCache:
+    """Return the template cache shared by all sessions in this process."""
+    return TemplateCache()
+
+
+TEMPLATE_REGISTRY_DIR = os.path.join(
+    os.path.expanduser('~'), '.cache', 'text-to-powerpoint', 'templates')
+# Bump when the artifact layout changes; older artifacts must be recompiled
+TEMPLATE_ARTIFACT_VERSION = 1
+_TEMPLATE_ID_RE = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$')
+# Set TEMPLATE_LIBRARY_UPLOADS=1 to let app users save uploaded templates to the shared
+# registry (new IDs only); otherwise templates are added with compile_template.py
+TEMPLATE_LIBRARY_UPLOADS = os.environ.get('TEMPLATE_LIBRARY_UPLOADS') == '1'
+
+
+def styles_to_json(styles: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert extracted template styles to JSON-safe values (lengths become EMU ints)."""
+    data = {key: value for key, value in styles.items()
+            if key not in ('style_plan', 'layout_index', 'placeholder_styles')}
+    data['placeholder_styles'] = [[layout, placeholder, font_info]
+                                  for (layout, placeholder), font_info in styles.get('placeholder_styles', {}).items()]
+    # Theme colors may be python-pptx objects; their string form is enough for display
+    return json.loads(json.dumps(data, default=str))
+
+
+def styles_from_json(data: Dict[str, Any]) -> Dict[str, Any]:
+    styles = dict(data)
+    styles['placeholder_styles'] = {(layout, placeholder): font_info
+                                    for layout, placeholder, font_info in data.get('placeholder_styles', [])}
+    return styles
+
+
+class TemplateRegistry:
+    """Directory of compiled templates that can be selected by ID instead of uploaded.
+
+    Compiling a template writes <id>.tpl, a zip holding manifest.json (the
+    source hash, layout and placeholder index, extracted styles and style
+    plan) and blank.pptx (the slide-free package). Loading one reads two zip
+    members and a JSON document; no XML is parsed until a deck is rendered.
+    """
+
+    def __init__(self, directory: str = TEMPLATE_REGISTRY_DIR):
+        self.directory = directory
+        self._loaded = {}  # template id -> (artifact mtime, CachedTemplate)
+        self._lock = threading.Lock()
+
+    def _path(self, template_id: str) -> str:
+        if not _TEMPLATE_ID_RE.match(template_id or ''):
+            raise ValueError(
+                f"Invalid template ID {template_id!r}: use letters, digits, '.', '_' or '-'")
+        return os.path.join(self.directory, f"{template_id}.tpl")
+
+    def compile(self, template_id: str, data: bytes, name: str = None,
+                template_cache: TemplateCache = None, overwrite: bool = True) -> Dict[str, Any]:
+        """Parse a template once and write its artifact; returns the manifest.
+
+        With overwrite=False an existing ID raises FileExistsError instead of being replaced.
+        """
+        path = self._path(template_id)
+        if not overwrite and os.path.exists(path):
+            raise FileExistsError(f"Template {template_id!r} already exists")
+        cached = (template_cache or TemplateCache()).get_or_load(data)
+        styles = cached.styles
+        manifest = {
+            'format': TEMPLATE_ARTIFACT_VERSION,
+            'id': template_id,
+            'name': name or template_id,
+            'digest': cached.digest,
+            'compiled': time.time(),
+            'source_bytes': len(data),
+            'layouts': [{'index': layout['index'], 'name': layout['name'],
+                         'placeholders': [{'idx': ph['idx'], 'type': ph['type']}
+                                          for ph in layout['placeholders']]}
+                        for layout in styles.get('layouts', [])],
+            'styles': styles_to_json(styles),
+            'style_plan': styles['style_plan'].to_json(),
+        }
+
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f, zipfile.ZipFile(f, 'w') as artifact:
+                artifact.writestr('manifest.json', json.dumps(manifest),
+                                  compress_type=zipfile.ZIP_DEFLATED)
+                # The package is already deflated inside
+                artifact.writestr('blank.pptx', cached.blank,
+                                  compress_type=zipfile.ZIP_STORED)
+            if overwrite:
+                os.replace(tmp_path, path)
+            else:
+                # link() fails if another writer took the ID since the check above
+                try:
+                    os.link(tmp_path, path)
+                except FileExistsError:
+                    raise FileExistsError(f"Template {template_id!r} already exists") from None
+                os.remove(tmp_path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        return manifest
+
+    def load(self, template_id: str) -> CachedTemplate:
+        """Return the compiled template for an ID, reading the artifact only when it changed."""
+        path = self._path(template_id)
+        mtime = os.stat(path).st_mtime
+        with self._lock:
+            loaded = self._loaded.get(template_id)
+            if loaded and loaded[0] == mtime:
+                return loaded[1]
+
+        with zipfile.ZipFile(path) as artifact:
+            manifest = json.loads(artifact.read('manifest.json'))
+            if manifest.get('format') != TEMPLATE_ARTIFACT_VERSION:
+                raise ValueError(
+                    f"Template {template_id!r} was compiled by another version; compile it again")
+            blank = artifact.read('blank.pptx')
+        styles = styles_from_json(manifest['styles'])
+        styles['style_plan'] = StylePlan.from_json(manifest['style_plan'])
+        styles['layout_index'] = compile_layout_index(styles)
+        entry = CachedTemplate(manifest['digest'], None, styles, blank, len(blank))
+        with self._lock:
+            self._loaded[template_id] = (mtime, entry)
+        return entry
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Manifests of every compiled template, sorted by ID."""
+        manifests = []
+        try:
+            names = sorted(os.listdir(self.directory))
+        except OSError:
+            return manifests
+        for name in names:
+            if not name.endswith('.tpl'):
+                continue
+            try:
+                with zipfile.ZipFile(os.path.join(self.directory, name)) as artifact:
+                    manifests.append(json.loads(artifact.read('manifest.json')))
+            except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+                continue
+        return manifests
+
+    def remove(self, template_id: str):
+        try:
+            os.remove(self._path(template_id))
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self._loaded.pop(template_id, None)
+
+
+@st.cache_resource
+def get_template_registry() -> TemplateRegistry:
+    """Return the compiled template registry shared by all sessions in this process."""
+    return TemplateRegistry()
+
+
+# Model used for each provider and the shared generation settings
+PROVIDER_MODELS = {
+    "OpenAI": "gpt-4",
+    "Anthropic": "claude-3-sonnet-20240229",
+    "Google Gemini": "gemini-2.0-flash",
+}
+MAX_OUTPUT_TOKENS = 4000
+TEMPERATURE = 0.7
+# Provider clients unused for this many seconds are closed
+CLIENT_IDLE_TIMEOUT = 300
+# Per-key request limits for each provider; tune to your account's rate limits
+PROVIDER_LIMITS = {
+    "OpenAI": {"concurrency": 8, "requests_per_minute": 500},
+    "Anthropic": {"concurrency": 8, "requests_per_minute": 50},
+    "Google Gemini": {"concurrency": 8, "requests_per_minute": 60},
+}
+# Seconds allowed for a whole request, or between two chunks of a stream
+REQUEST_TIMEOUT = 120
+MAX_RETRIES = 4
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+# Hedged requests: with a secondary provider configured, a request that has no
+# answer (or, when streaming, no first token) by the primary's hedge deadline
+# is also sent to the secondary, and the first good answer is used. The
+# deadline is the primary's recent HEDGE_PERCENTILE latency, clamped.
+HEDGE_PERCENTILE = 95
+HEDGE_MIN_SAMPLES = 20  # latencies seen before the deadline adapts
+HEDGE_DEFAULT_DEADLINE = 30.0  # seconds, until then
+HEDGE_MIN_DEADLINE = 2.0
+HEDGE_MAX_DEADLINE = 60.0
+LATENCY_WINDOW = 200  # recent latencies kept per provider and kind
+# Follow-up requests for the rest of an outline cut off at MAX_OUTPUT_TOKENS
+MAX_CONTINUATIONS = 3
+
+
+class Completion(NamedTuple):
+    """A completion's text and whether the provider stopped it at the output token cap."""
+    text: str
+    truncated: bool = False
+    finish_reason: Optional[str] = None
+
+
+class AIProviderError(Exception):
+    """An AI provider request failed, after any retries."""
+
+    def __init__(self, message: str, status: int = None, retryable: bool = False):
+        super().__init__(f"AI API Error: {message}")
+        self.status = status
+        self.retryable = retryable
+
+
+class ProviderClientRegistry:
+    """Process-wide registry of async provider SDK clients keyed by (provider, API key hash).
+
+    OpenAI and Anthropic clients keep a pooled HTTP client with keep-alive,
+    and the Gemini client holds its own gRPC channel, so reusing an entry
+    reuses its open connections. Clients are created and used on the
+    AsyncProviderLayer event loop; leases keep a client from being closed
+    by idle eviction while a request is using it.
+    """
+
+    def __init__(self, idle_timeout: float = CLIENT_IDLE_TIMEOUT, base_urls: Dict[str, str] = None):
+        self.idle_timeout = idle_timeout
+        self.base_urls = dict(base_urls or {})  # provider -> endpoint override
+        self._entries = {}  # (provider, key hash) -> _ClientEntry
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def lease(self, provider: str, api_key: str):
+        """Yield the shared client for this provider and key, creating it on first use."""
+        key = (provider, hashlib.sha256(api_key.encode()).hexdigest())
+        with self._lock:
+            self._evict_idle()
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _ClientEntry(provider, self._create(provider, api_key))
+                self._entries[key] = entry
+            entry.in_use += 1
+        try:
+            yield entry.client
+        finally:
+            with self._lock:
+                entry.in_use -= 1
+                entry.last_used = time.monotonic()
+
+    def _create(self, provider: str, api_key: str):
+        base_url = self.base_urls.get(provider)
+        sdk = load_sdk(provider)
+        # Retries and timeouts are handled by AsyncProviderLayer
+        if provider == "OpenAI":
+            return sdk.AsyncOpenAI(api_key=api_key, base_url=base_url,
+                                   max_retries=0, timeout=REQUEST_TIMEOUT)
+        elif provider == "Anthropic":
+            return sdk.AsyncAnthropic(api_key=api_key, base_url=base_url,
+                                      max_retries=0, timeout=REQUEST_TIMEOUT)
+        elif provider == "Google Gemini":
+            # One service client per key; nothing is configured process-wide
+            client_options = {"api_key": api_key}
+            if base_url:
+                client_options["api_endpoint"] = base_url
+            return sdk.GenerativeServiceAsyncClient(client_options=client_options)
+        raise ValueError(f"Unknown AI provider: {provider}")
+
+    def _evict_idle(self):
+        """Close clients idle for longer than idle_timeout. Caller holds the lock."""
+        now = time.monotonic()
+        for key, entry in list(self._entries.items()):
+            if entry.in_use == 0 and now - entry.last_used > self.idle_timeout:
+                del self._entries[key]
+                entry.close()
+
+    def close(self):
+        with self._lock:
+            for entry in self._entries.values():
+                entry.close()
+            self._entries.clear()
+
+
+class _ClientEntry:
+    def __init__(self, provider: str, client):
+        self.provider = provider
+        self.client = client
+        self.in_use = 0
+        self.last_used = time.monotonic()
+        try:
+            self.loop = asyncio.get_running_loop()  # The provider loop the client was created on
+        except RuntimeError:
+            self.loop = None
+
+    def close(self):
+        try:
+            if self.provider == "Google Gemini":
+                result = self.client.transport.close()
+            else:
+                result = self.client.close()
+            if asyncio.iscoroutine(result):
+                # Async clients close on the provider loop that owns them,
+                # whichever thread the registry is closed from
+                if self.loop is not None and not self.loop.is_closed():
+                    asyncio.run_coroutine_threadsafe(result, self.loop)
+                else:
+                    result.close()
+        except Exception:
+            pass
+
+
+class TokenBucket:
+    """Token-bucket rate limiter for coroutines on a single event loop."""
+
+    def __init__(self, requests_per_minute: float, capacity: float = 1):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self.tokens = min(self.capacity, self.tokens +
+                              (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Hold every caller back, e.g. after a 429 with Retry-After."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+def _error_status(error: Exception) -> Optional[int]:
+    """HTTP status of an SDK error, if it carries one."""
+    for value in (getattr(error, 'status_code', None), getattr(error, 'code', None),
+                  getattr(getattr(error, 'response', None), 'status_code', None)):
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError) + loaded_connection_errors()):
+        return True
+    return _error_status(error) in RETRYABLE_STATUS_CODES
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds the provider asked us to wait, from Retry-After(-ms) headers."""
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        value = headers.get('retry-after')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            retry_at = email.utils.parsedate_to_datetime(value)
+            return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class _ProviderLimiter:
+    def __init__(self, concurrency: int, requests_per_minute: float):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.bucket = TokenBucket(requests_per_minute, capacity=concurrency)
+
+
+class LatencyTracker:
+    """Recent successful request latencies per provider, and the hedge deadlines derived from them.
+
+    Latencies are kept by kind: "completion" for whole non-streamed
+    responses and "first_token" for the first chunk of a stream. Both are
+    timed from the call, so they include waits for the provider's limits
+    and retries, as does the wait before a request is hedged. A
+    provider's hedge deadline is its HEDGE_PERCENTILE latency of that kind,
+    clamped to [min_deadline, max_deadline], or default_deadline until
+    min_samples latencies have been seen.
+    """
+
+    def __init__(self, window: int = LATENCY_WINDOW, min_samples: int = HEDGE_MIN_SAMPLES,
+                 default_deadline: float = HEDGE_DEFAULT_DEADLINE,
+                 min_deadline: float = HEDGE_MIN_DEADLINE, max_deadline: float = HEDGE_MAX_DEADLINE):
+        self.window = window
+        self.min_samples = min_samples
+        self.default_deadline = default_deadline
+        self.min_deadline = min_deadline
+        self.max_deadline = max_deadline
+        self._samples = {}  # (provider, kind) -> deque of seconds
+        self._lock = threading.Lock()
+
+    def record(self, provider: str, kind: str, seconds: float):
+        with self._lock:
+            samples = self._samples.get((provider, kind))
+            if samples is None:
+                samples = self._samples[(provider, kind)] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def percentile(self, provider: str, kind: str, percent: float) -> Optional[float]:
+        """Nearest-rank percentile of the recent latencies, or None before any were recorded."""
+        with self._lock:
+            ordered = sorted(self._samples.get((provider, kind), ()))
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(percent / 100 * len(ordered)) - 1))]
+
+    def deadline(self, provider: str, kind: str) -> float:
+        """Seconds to wait on provider before hedging a request of this kind."""
+        with self._lock:
+            count = len(self._samples.get((provider, kind), ()))
+        if not count or count < self.min_samples:
+            return self.default_deadline
+        return min(self.max_deadline,
+                   max(self.min_deadline, self.percentile(provider, kind, HEDGE_PERCENTILE)))
+
+    def summary(self) -> Dict[tuple, Dict[str, float]]:
+        """Count, p50, p95 and current deadline per (provider, kind)."""
+        with self._lock:
+            keys = sorted(self._samples)
+        return {(provider, kind): {'count': len(self._samples[(provider, kind)]),
+                                   'p50': self.percentile(provider, kind, 50),
+                                   'p95': self.percentile(provider, kind, 95),
+                                   'deadline': self.deadline(provider, kind)}
+                for provider, kind in keys}
+
+
+class AsyncProviderLayer:
+    """Asyncio provider calls with per-key concurrency limits, rate limiting and retries.
+
+    The layer runs its own event loop on a daemon thread, so sync callers
+    (Streamlit script runs, worker threads) share one set of clients,
+    semaphores and token buckets. Coroutines can be awaited on the layer's
+    loop, and run() / iter_stream() bridge to synchronous code. Successful
+    request latencies are recorded in latency_stats, which sets the
+    deadlines of hedged() requests.
+    """
+
+    def __init__(self, registry: ProviderClientRegistry = None, limits: Dict[str, Dict[str, float]] = None,
+                 timeout: float = REQUEST_TIMEOUT, max_retries: int = MAX_RETRIES,
+                 base_delay: float = RETRY_BASE_DELAY, max_delay: float = RETRY_MAX_DELAY,
+                 latency_stats: LatencyTracker = None):
+        self.registry = registry or ProviderClientRegistry()
+        self.limits = dict(limits or PROVIDER_LIMITS)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.latency_stats = latency_stats or LatencyTracker()
+        self._limiters = {}  # (provider, key hash) -> _ProviderLimiter; loop thread only
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever,
+                                        name="ai-provider-loop", daemon=True)
+        self._thread.start()
+
+    def run(self, coro):
+        """Run a coroutine on the provider loop and wait for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def close(self, timeout: float = 5.0):
+        """Close the registry's clients, then stop the provider loop and join its thread.
+
+        Requests still running after timeout seconds are cancelled.
+        """
+        if self._loop.is_closed():
+            return
+        self.registry.close()
+
+        async def drain():
+            # Includes the client closes just scheduled on this loop
+            pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            if pending:
+                await asyncio.wait(pending, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
 
-# Header
-st.markdown("""
-<div class="main-header">
-    <h1>📊 Text to PowerPoint Generator</h1>
-    <p>Transform your text into beautiful presentations using AI and custom templates</p>
-</div>
-""", unsafe_allow_html=True)
+        self.run(drain())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+        self._loop.close()
+
+    def _limiter(self, provider: str, api_key: str) -> _ProviderLimiter:
+        key = (provider, hashlib.sha256(api_key.encode()).hexdigest())
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            limits = self.limits.get(provider, {})
+            limiter = _ProviderLimiter(limits.get('concurrency', 4),
+                                       limits.get('requests_per_minute', 60))
+            self._limiters[key] = limiter
+        return limiter
+
+    def _retry_delay(self, attempt: int, error: Exception, limiter: _ProviderLimiter) -> float:
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            # A huge or bogus Retry-After must not hold every request to this key for that long
+            retry_after = min(retry_after, self.max_delay)
+            limiter.bucket.pause(retry_after)
+            return retry_after
+        # Full jitter exponential backoff
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _give_up(self, error: Exception, attempt: int) -> bool:
+        return attempt >= self.max_retries or not _is_retryable(error)
+
+    def _wrap(self, error: Exception) -> AIProviderError:
+        if isinstance(error, AIProviderError):
+            return error
+        message = str(error) or type(error).__name__
+        if isinstance(error, asyncio.TimeoutError):
+            message = f"request timed out after {self.timeout}s"
+        return AIProviderError(message, _error_status(error), _is_retryable(error))
+
+    async def complete(self, provider: str, api_key: str, prompt: str) -> str:
+        """Return the full completion text for a prompt, retrying transient failures."""
+        return (await self.completion(provider, api_key, prompt)).text
+
+    async def completion(self, provider: str, api_key: str, prompt: str) -> Completion:
+        """Like complete(), but also report the provider's finish reason."""
+        limiter = self._limiter(provider, api_key)
+        started = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            async with limiter.semaphore:
+                await limiter.bucket.acquire()
+                try:
+                    with self.registry.lease(provider, api_key) as client:
+                        completion = await asyncio.wait_for(
+                            self._complete_once(provider, client, prompt), self.timeout)
+                        self.latency_stats.record(provider, 'completion', time.perf_counter() - started)
+                        return completion
+                except Exception as e:
+                    if self._give_up(e, attempt):
+                        raise self._wrap(e) from e
+                    delay = self._retry_delay(attempt, e, limiter)
+            await asyncio.sleep(delay)
+
+    async def stream(self, provider: str, api_key: str, prompt: str):
+        """Yield completion text as it arrives, then a text-less Completion with the finish reason.
+
+        Failures before the first chunk are retried like complete(); once
+        text has been yielded, an error is raised to the caller.
+        """
+        limiter = self._limiter(provider, api_key)
+        started = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            received = False
+            async with limiter.semaphore:
+                await limiter.bucket.acquire()
+                try:
+                    with self.registry.lease(provider, api_key) as client:
+                        chunks = self._stream_once(provider, client, prompt)
+                        try:
+                            while True:
+                                try:
+                                    text = await asyncio.wait_for(chunks.__anext__(), self.timeout)
+                                except StopAsyncIteration:
+                                    return
+                                if not received:
+                                    self.latency_stats.record(
+                                        provider, 'first_token', time.perf_counter() - started)
+                                    received = True
+                                yield text
+                        finally:
+                            await chunks.aclose()
+                except Exception as e:
+                    if received or self._give_up(e, attempt):
+                        raise self._wrap(e) from e
+                    delay = self._retry_delay(attempt, e, limiter)
+            await asyncio.sleep(delay)
+
+    async def hedged(self, provider: str, api_key: str, secondary: Optional[str], secondary_key: Optional[str],
+                     request, kind: str = 'completion', on_hedged=None, discard=None):
+        """Await request(provider, api_key), re-sending it to the secondary provider if it is slow.
+
+        If the request is still pending at the primary's hedge deadline for
+        this kind, request(secondary, secondary_key) is started alongside it;
+        if it has already failed with a retryable AIProviderError, the
+        secondary is asked straight away. The first to succeed is returned as (result, provider, api_key) and
+        the other is cancelled. A request that raises, e.g. because its
+        response did not parse, loses the race; if both fail, the primary's
+        error is raised. on_hedged(provider) is called with the winner of a
+        hedged race, and discard(result) is awaited for a success that lost.
+        """
+        if not secondary or secondary == provider:
+            return await request(provider, api_key), provider, api_key
+        keys = {provider: api_key, secondary: secondary_key}
+        tasks = {asyncio.ensure_future(request(provider, api_key)): provider}
+        deadline = self.latency_stats.deadline(provider, kind)
+        done, _ = await asyncio.wait(tasks, timeout=deadline)
+        if not done:
+            logging.getLogger(__name__).info(
+                "No %s from %s after %.1fs; also sending to %s", kind, provider, deadline, secondary)
+            tasks[asyncio.ensure_future(request(secondary, secondary_key))] = secondary
+        elif getattr(next(iter(done)).exception(), 'retryable', False):
+            logging.getLogger(__name__).info(
+                "%s failed with a retryable error; sending to %s", provider, secondary)
+            tasks[asyncio.ensure_future(request(secondary, secondary_key))] = secondary
+        hedging = len(tasks) > 1
+        errors = {}
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                winner = None
+                for task in done:
+                    name = tasks.pop(task)
+                    if task.exception() is not None:
+                        errors[name] = task.exception()
+                    elif winner is None:
+                        winner = name, task.result()
+                    elif discard:
+                        await discard(task.result())
+                if winner:
+                    if hedging and on_hedged:
+                        on_hedged(winner[0])
+                    return winner[1], winner[0], keys[winner[0]]
+            raise errors.get(provider) or errors[secondary]
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def hedged_stream(self, provider: str, api_key: str, prompt: str, secondary: Optional[str],
+                            secondary_key: Optional[str], on_hedged=None):
+        """stream(), hedged on the first token: whichever provider starts answering first is used."""
+        async def start(name, key):
+            chunks = self.stream(name, key, prompt)
+            try:
+                return chunks, await chunks.__anext__()
+            except StopAsyncIteration:
+                return chunks, None
+            except BaseException:
+                await chunks.aclose()
+                raise
+
+        async def discard(started):
+            await started[0].aclose()
+
+        (chunks, text), _, _ = await self.hedged(provider, api_key, secondary, secondary_key, start,
+                                                 'first_token', on_hedged, discard)
+        try:
+            if text is None:
+                return
+            yield text
+            async for text in chunks:
+                yield text
+        finally:
+            await chunks.aclose()
+
+    def iter_stream(self, provider: str, api_key: str, prompt: str, hedge: tuple = None,
+                    on_hedged=None) -> 'ProviderStream':
+        """Synchronous iterator over stream(), or hedged_stream() with a (provider, api_key) hedge.
+
+        Closing the iterator cancels the request.
+        """
+        return ProviderStream(self._iter_stream(provider, api_key, prompt, hedge, on_hedged))
+
+    def _iter_stream(self, provider: str, api_key: str, prompt: str, hedge: tuple, on_hedged):
+        chunks = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                source = self.hedged_stream(provider, api_key, prompt, *hedge, on_hedged) if hedge \
+                    else self.stream(provider, api_key, prompt)
+                async for text in source:
+                    chunks.put(text)
+                chunks.put(done)
+            except Exception as e:
+                chunks.put(e)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self._loop)
+        try:
+            while True:
+                item = chunks.get()
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            future.cancel()
+
+    async def _complete_once(self, provider: str, client, prompt: str) -> Completion:
+        if provider == "OpenAI":
+            response = await client.chat.completions.create(
+                model=PROVIDER_MODELS[provider],
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=MAX_OUTPUT_TOKENS,
+                temperature=TEMPERATURE
+            )
+            choice = response.choices[0]
+            return Completion(choice.message.content, choice.finish_reason == 'length',
+                              choice.finish_reason)
+
+        elif provider == "Anthropic":
+            message = await client.messages.create(
+                model=PROVIDER_MODELS[provider],
+                max_tokens=MAX_OUTPUT_TOKENS,
+                messages=[{"role": "user", "content": prompt}]
+            )
+            return Completion(message.content[0].text, message.stop_reason == 'max_tokens',
+                              message.stop_reason)
+
+        elif provider == "Google Gemini":
+            response = await client.generate_content(request=_gemini_request(prompt))
+            if not response.candidates:
+                raise ValueError("Gemini returned no candidates")
+            candidate = response.candidates[0]
+            reason = candidate.finish_reason.name
+            return Completion(_gemini_text(candidate), reason == 'MAX_TOKENS', reason)
+
+        raise ValueError(f"Unknown AI provider: {provider}")
+
+    async def _stream_once(self, provider: str, client, prompt: str):
+        if provider == "OpenAI":
+            stream = await client.chat.completions.create(
+                model=PROVIDER_MODELS[provider],
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=MAX_OUTPUT_TOKENS,
+                temperature=TEMPERATURE,
+                stream=True
+            )
+            reason = None
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                if chunk.choices and chunk.choices[0].finish_reason:
+                    reason = chunk.choices[0].finish_reason
+            yield Completion('', reason == 'length', reason)
+
+        elif provider == "Anthropic":
+            async with client.messages.stream(
+                model=PROVIDER_MODELS[provider],
+                max_tokens=MAX_OUTPUT_TOKENS,
+                messages=[{"role": "user", "content": prompt}]
+            ) as stream:
+                async for text in stream.text_stream:
+                    yield text
+                message = await stream.get_final_message()
+            yield Completion('', message.stop_reason == 'max_tokens', message.stop_reason)
+
+        elif provider == "Google Gemini":
+            stream = await client.stream_generate_content(request=_gemini_request(prompt))
+            reason = None
+            async for chunk in stream:
+                if not chunk.candidates:
+                    continue  # e.g. usage metadata
+                candidate = chunk.candidates[0]
+                if candidate.finish_reason:
+                    reason = candidate.finish_reason.name
+                text = _gemini_text(candidate)
+                if text:
+                    yield text
+            yield Completion('', reason == 'MAX_TOKENS', reason)
+
+        else:
+            raise ValueError(f"Unknown AI provider: {provider}")
+
+
+def _gemini_request(prompt: str):
+    glm = load_sdk("Google Gemini")
+    return glm.GenerateContentRequest(
+        model=f"models/{PROVIDER_MODELS['Google Gemini']}",
+        contents=[glm.Content(role="user", parts=[glm.Part(text=prompt)])],
+        generation_config=glm.GenerationConfig(
+            temperature=TEMPERATURE, max_output_tokens=MAX_OUTPUT_TOKENS),
+    )
+
+
+def _gemini_text(candidate) -> str:
+    # Parts without text (e.g. safety metadata) contribute nothing
+    return ''.join(part.text for part in candidate.content.parts)
+
+
+class ProviderStream:
+    """Text of a streamed completion as it arrives, from AsyncProviderLayer.iter_stream().
+
+    Once iteration ends, finish_reason and truncated tell how the provider
+    stopped the response, if it said.
+    """
+
+    def __init__(self, items):
+        self._items = items
+        self.finish_reason = None
+        self.truncated = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        while True:
+            item = next(self._items)
+            if isinstance(item, Completion):
+                self.finish_reason, self.truncated = item.finish_reason, item.truncated
+                continue
+            return item
+
+    def close(self):
+        self._items.close()
+
+
+@st.cache_resource
+def get_client_registry() -> ProviderClientRegistry:
+    """Return the provider client registry shared by all sessions in this process."""
+    return ProviderClientRegistry()
+
+
+@st.cache_resource
+def get_latency_tracker() -> LatencyTracker:
+    """Return the provider latency statistics shared by all sessions in this process."""
+    return LatencyTracker()
+
+
+@st.cache_resource
+def get_provider_layer() -> AsyncProviderLayer:
+    """Return the provider layer shared by all sessions in this process."""
+    return AsyncProviderLayer(get_client_registry(), latency_stats=get_latency_tracker())
+
+
+# Curly double quotes models sometimes emit instead of JSON string delimiters
+SMART_QUOTES = '\u201c\u201d\u201e\u201f'
+MISSING_TITLE_REPAIR = 'missing presentation title'
+_CONTROL_ESCAPES = {'\n': '\\n', '\r': '\\r', '\t': '\\t'}
+
+
+class ParseReport:
+    """What had to be repaired, dropped or salvaged to get an outline from a response."""
+
+    def __init__(self):
+        self.repairs = []  # kinds of defects that were fixed, e.g. 'trailing commas'
+        self.dropped = []  # slides left out, with the reason
+        self.truncated = False  # the response ended before the outline closed
+        self.salvaged_slides = 0  # complete slides recovered from a truncated response
+        self.continuations = 0  # follow-up requests made for the rest of a cut-off outline
+
+    @property
+    def clean(self) -> bool:
+        return not (self.repairs or self.dropped or self.truncated)
+
+    def add_repair(self, repair: str):
+        if repair not in self.repairs:
+            self.repairs.append(repair)
+
+    def merge(self, other: 'ParseReport', label: str = None):
+        """Fold another report into this one, e.g. one per outlined chunk"""
+        prefix = f"{label}: " if label else ''
+        for repair in other.repairs:
+            self.add_repair(repair)
+        self.dropped.extend(prefix + reason for reason in other.dropped)
+        self.truncated = self.truncated or other.truncated
+        self.salvaged_slides += other.salvaged_slides
+        self.continuations += other.continuations
+
+    def summary(self) -> str:
+        parts = []
+        if self.continuations:
+            parts.append(f"the response was cut off; fetched the rest with "
+                         f"{self.continuations} continuation request(s)")
+        if self.truncated:
+            parts.append(
+                f"the response was cut off; kept the {self.salvaged_slides} complete slides")
+        if self.repairs:
+            parts.append("repaired " + ", ".join(self.repairs))
+        if self.dropped:
+            parts.append("dropped " + "; ".join(self.dropped))
+        return "; ".join(parts)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'repairs': self.repairs, 'dropped': self.dropped,
+                'truncated': self.truncated, 'salvaged_slides': self.salvaged_slides,
+                'continuations': self.continuations}
+
+
+def repair_json(text: str):
+    """Fix the JSON defects models commonly produce.
+
+    Curly quotes used as string delimiters become straight quotes, raw
+    newlines and tabs inside strings are escaped, and trailing commas
+    before "}" or "]" are removed. Returns the repaired text and the list
+    of repairs made.
+    """
+    out = []
+    repairs = []
+    in_string = smart = escape = False
+    for c in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif c == '\\':
+                escape = True
+            elif (c in SMART_QUOTES) if smart else (c == '"'):
+                in_string = False
+                c = '"'
+            elif smart and c == '"':
+                c = '\\"'
+            elif c in _CONTROL_ESCAPES:
+                c = _CONTROL_ESCAPES[c]
+                if 'control characters in strings' not in repairs:
+                    repairs.append('control characters in strings')
+            out.append(c)
+            continue
+
+        if c == '"':
+            in_string, smart = True, False
+        elif c in SMART_QUOTES:
+            in_string, smart = True, True
+            c = '"'
+            if 'smart quotes' not in repairs:
+                repairs.append('smart quotes')
+        elif c in '}]':
+            j = len(out) - 1
+            while j >= 0 and out[j].isspace():
+                j -= 1
+            if j >= 0 and out[j] == ',':
+                del out[j]
+                if 'trailing commas' not in repairs:
+                    repairs.append('trailing commas')
+        out.append(c)
+    return ''.join(out), repairs
+
+
+def normalize_slide(slide: Any) -> Optional[str]:
+    """Coerce a slide object to the outline schema in place; return why it is unusable, if it is."""
+    if not isinstance(slide, dict):
+        return "not an object"
+    title = slide.get('title')
+    if isinstance(title, (int, float)) and not isinstance(title, bool):
+        title = slide['title'] = str(title)
+    if not isinstance(title, str) or not title.strip():
+        return "no title"
+
+    content = slide.get('content', [])
+    if content is None:
+        content = []
+    elif not isinstance(content, list):
+        content = [content]
+    slide['content'] = [point if isinstance(point, str) else json.dumps(point, ensure_ascii=False)
+                        if isinstance(point, (dict, list)) else str(point)
+                        for point in content if point is not None]
+
+    notes = slide.get('notes')
+    if notes is not None and not isinstance(notes, str):
+        slide['notes'] = str(notes)
+
+    layout = slide.get('layout')
+    if layout is not None:
+        archetype = re.sub(r'[\s-]+', '_', str(layout).strip().lower())
+        archetype = LAYOUT_ALIASES.get(archetype, archetype)
+        if archetype in ARCHETYPES:
+            slide['layout'] = archetype
+        else:
+            # Unknown layouts render as bullets
+            del slide['layout']
+
+    font_size = slide.get('font_size')
+    if font_size is not None:
+        try:
+            slide['font_size'] = float(font_size)
+        except (TypeError, ValueError):
+            slide['font_size'] = 0
+        if not 0 < slide['font_size'] <= 400:
+            del slide['font_size']
+    return None
+
+
+def validate_outline(structure: Any, report: ParseReport) -> Dict[str, Any]:
+    """Check an outline against the schema, dropping slides that cannot be rendered."""
+    if not isinstance(structure, dict):
+        raise ValueError("Outline is not a JSON object")
+    if not isinstance(structure.get('slides'), list):
+        raise ValueError("Invalid presentation structure")
+    title = structure.get('title')
+    if not isinstance(title, str) or not title.strip():
+        structure['title'] = 'Generated Presentation'
+        report.add_repair(MISSING_TITLE_REPAIR)
+
+    slides = []
+    for number, slide in enumerate(structure['slides'], 1):
+        problem = normalize_slide(slide)
+        if problem:
+            report.dropped.append(f"slide {number} ({problem})")
+        else:
+            slides.append(slide)
+    if not slides:
+        raise ValueError("Invalid presentation structure")
+    structure['slides'] = slides
+    return structure
+
+
+class IncrementalSlideParser:
+    """Scan a streamed JSON outline and emit each slide object as soon as it is complete.
+
+    Only the structure needed to find the top-level "title" and the elements
+    of the top-level "slides" array is tracked, so each character is looked
+    at once no matter how the stream is chunked. Text before the outline
+    (such as a code fence or commentary, even with braces in it) and after
+    it is ignored. Common JSON defects are repaired as slides are loaded, and
+    finish() salvages the complete slides of a truncated response.
+    """
+
+    def __init__(self):
+        self.text = ''
+        self.title = None
+        self.slides = []
+        self.report = ParseReport()
+        self._pos = 0
+        self._stack = []  # currently open '{' / '[' containers
+        self._in_string = False
+        self._smart_string = False  # string opened with a curly quote
+        self._escape = False
+        self._string_start = None
+        self._expect_key = False  # next top-level string is a key
+        self._pending_key = None
+        self._key = None  # key whose value is being read at the top level
+        self._in_slides = False
+        self._saw_slides = False
+        self._slide_count = 0
+        self._slide_start = None
+        self._doc_start = None
+        self._doc_end = None
+        self._dropped = []
+
+    @property
+    def document(self) -> str:
+        """The top-level JSON object once it has closed, else all text seen so far."""
+        if self._doc_end is None:
+            return self.text
+        return self.text[self._doc_start:self._doc_end]
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consume more text and return the slides completed by it."""
+        self.text += chunk
+        text = self.text
+        completed = []
+        for i in range(self._pos, len(text)):
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif (c in SMART_QUOTES) if self._smart_string else (c == '"'):
+                    self._in_string = False
+                    self._on_string(text[self._string_start:i + 1])
+                continue
+
+            depth = len(self._stack)
+            if c == '"' or c in SMART_QUOTES:
+                if depth:
+                    self._in_string = True
+                    self._smart_string = c != '"'
+                    self._string_start = i
+            elif c == '{' or (c == '[' and depth):
+                if self._doc_end is not None:
+                    continue  # Ignore anything after the outline object
+                self._stack.append(c)
+                if depth == 0:
+                    self._doc_start = i
+                    self._expect_key = True
+                elif depth == 1 and c == '[' and self._key == 'slides':
+                    self._in_slides = self._saw_slides = True
+                elif depth == 2 and c == '{' and self._in_slides:
+                    self._slide_start = i
+            elif c in '}]' and depth:
+                self._stack.pop()
+                if depth == 1:
+                    if self._saw_slides:
+                        self._doc_end = i + 1
+                    else:
+                        # A braced aside before the outline, e.g. "{topic}"
+                        self.title = self._pending_key = self._key = None
+                elif depth == 3 and c == '}' and self._slide_start is not None:
+                    slide = self._load_slide(text[self._slide_start:i + 1])
+                    self._slide_start = None
+                    if slide is not None:
+                        self.slides.append(slide)
+                        completed.append(slide)
+                elif depth == 2 and c == ']':
+                    self._in_slides = False
+            elif depth == 1:
+                if c == ':':
+                    self._key = self._pending_key
+                    self._expect_key = False
+                elif c == ',':
+                    self._key = None
+                    self._expect_key = True
+        self._pos = len(text)
+        return completed
+
+    @property
+    def cut_off(self) -> bool:
+        """Whether the outline started but the response ended before it closed."""
+        return self._doc_start is not None and self._doc_end is None
+
+    def finish(self):
+        """Return the validated outline and a ParseReport once the response has ended.
+
+        A closed outline is parsed (and repaired) as a whole. If the response
+        was cut off, the title and every slide that completed are kept.
+        """
+        report = self.report
+        if self._doc_end is not None:
+            try:
+                return validate_outline(self._loads(self.document), report), report
+            except ValueError:
+                # Fall back to the slides that parsed on their own
+                report.add_repair('outline rebuilt from its complete slides')
+        elif self._doc_start is None:
+            raise ValueError("No JSON found in response")
+        else:
+            report.truncated = True
+            report.salvaged_slides = len(self.slides)
+
+        report.dropped.extend(self._dropped)
+        if not self.slides:
+            raise ValueError("Invalid presentation structure")
+        structure = {'title': self.title, 'slides': list(self.slides)}
+        return validate_outline(structure, report), report
+
+    def _loads(self, fragment: str):
+        try:
+            return json.loads(fragment)
+        except ValueError:
+            repaired, repairs = repair_json(fragment)
+            value = json.loads(repaired)
+            for repair in repairs:
+                self.report.add_repair(repair)
+            return value
+
+    def _on_string(self, literal: str):
+        if len(self._stack) != 1:
+            return
+        try:
+            value = self._loads(literal)
+        except ValueError:
+            return
+        if self._expect_key:
+            self._pending_key = value
+        elif self._key == 'title':
+            self.title = value
+
+    def _load_slide(self, fragment: str) -> Optional[Dict[str, Any]]:
+        self._slide_count += 1
+        try:
+            slide = self._loads(fragment)
+        except ValueError:
+            self._dropped.append(f"slide {self._slide_count} (invalid JSON)")
+            return None
+        problem = normalize_slide(slide)
+        if problem:
+            self._dropped.append(f"slide {self._slide_count} ({problem})")
+            return None
+        return slide
+
+
+# Bump whenever create_prompt/create_chunk_prompt change, so cached outlines are not reused
+PROMPT_VERSION = 2
+# Prompt guideline for the optional per-slide "layout" field; see ARCHETYPES
+LAYOUT_GUIDELINE = ('- "layout" is "bullets" for ordinary slides, "section" for a divider between major parts, '
+                    '"two_column" to compare two sides (the left column\'s points, then the right\'s), '
+                    'or "quote" for a key quotation (the quote, then who said it)')
+OUTLINE_CACHE_DIR = os.path.join(
+    os.path.expanduser('~'), '.cache', 'text-to-powerpoint', 'outlines')
+OUTLINE_CACHE_MAX_BYTES = 50 * 1024 * 1024
+OUTLINE_CACHE_TTL = 7 * 24 * 3600  # seconds
+
+
+class OutlineCache:
+    """On-disk cache of parsed outline structures.
+
+    Keys hash everything that shapes an outline: the normalized input text,
+    guidance, provider, model, outlining mode and PROMPT_VERSION. Entries
+    expire after ttl seconds, and the least recently used ones are deleted
+    once the directory grows past max_bytes. Writes are atomic, so several
+    processes can share a directory.
+    """
+
+    def __init__(self, directory: str = OUTLINE_CACHE_DIR, max_bytes: int = OUTLINE_CACHE_MAX_BYTES,
+                 ttl: float = OUTLINE_CACHE_TTL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+    @staticmethod
+    def make_key(input_text: str, guidance: str, provider: str, model: str, mode: str = 'single') -> str:
+        """Hash the inputs of an outline request into a cache key."""
+        # Whitespace-only edits should not miss the cache
+        lines = [line.strip() for line in input_text.strip().splitlines()]
+        normalized = re.sub(r'\n{3,}', '\n\n', '\n'.join(lines))
+        payload = json.dumps([PROMPT_VERSION, provider, model, mode,
+                              (guidance or '').strip(), normalized])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached structure for key, or None if missing or expired."""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get('created', 0) > self.ttl:
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)  # Mark as recently used for eviction
+        except OSError:
+            pass
+        return entry.get('structure')
+
+    def put(self, key: str, structure: Dict[str, Any]):
+        """Store a structure under key, then evict to stay within budget."""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'created': time.time(), 'structure': structure}, f)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            return  # Caching is best-effort
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        now = time.time()
+        try:
+            with os.scandir(self.directory) as it:
+                for item in it:
+                    if not item.name.endswith('.json'):
+                        continue
+                    stat = item.stat()
+                    entries.append((stat.st_mtime, stat.st_size, item.path))
+        except OSError:
+            return
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for mtime, size, path in entries:
+            # mtime only moves forward on use, so stale files are expired too
+            if total <= self.max_bytes and now - mtime <= self.ttl:
+                continue
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+@st.cache_resource
+def get_outline_cache() -> OutlineCache:
+    """Return the outline cache shared by all sessions in this process."""
+    return OutlineCache()
+
+
+# Inputs longer than this default to chunked (map-reduce) outlining
+LONG_DOCUMENT_CHARS = 12000
+CHUNK_TARGET_CHARS = 8000
+# Slide titles at least this similar are merged when combining chunk outlines
+TITLE_SIMILARITY_THRESHOLD = 0.85
+
+_HEADING_RE = re.compile(r'^\s{0,3}#{1,6}\s+\S', re.MULTILINE)
+
+
+def split_into_chunks(text: str, max_chars: int = CHUNK_TARGET_CHARS) -> List[str]:
+    """Split text on markdown headings, then paragraph boundaries, into chunks of at most max_chars."""
+    # Indented text (pasted from a quote or string literal) would hide its headings
+    text = '\n'.join(_dedent_markdown(text))
+    # Sections start at each heading; text before the first heading is its own section
+    starts = [m.start() for m in _HEADING_RE.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    sections = [text[a:b] for a, b in zip(starts, starts[1:] + [len(text)])]
+
+    # Break oversized sections into paragraphs, and oversized paragraphs on whitespace
+    pieces = []
+    for section in sections:
+        if len(section) <= max_chars:
+            pieces.append(section)
+            continue
+        for para in re.split(r'\n\s*\n', section):
+            while len(para) > max_chars:
+                cut = para.rfind(' ', 0, max_chars)
+                cut = cut if cut > 0 else max_chars
+                pieces.append(para[:cut])
+                para = para[cut:]
+            pieces.append(para + '\n\n')
+
+    # Greedily pack pieces back together up to the chunk size
+    chunks = []
+    current = ''
+    for piece in pieces:
+        if current and len(current) + len(piece) > max_chars:
+            chunks.append(current)
+            current = ''
+        current += piece
+    if current:
+        chunks.append(current)
+    return [chunk.strip() for chunk in chunks if chunk.strip()]
+
+
+def _normalize_title(title: str) -> str:
+    return re.sub(r'[^a-z0-9 ]', '', str(title).lower()).strip()
+
+
+def _is_near_duplicate(a: str, b: str) -> bool:
+    """Whether two normalized titles are close enough to be the same slide."""
+    if not a or not b:
+        return False
+    # "Phase 1" and "Phase 2" are distinct slides, however similar the text
+    if re.findall(r'\d+', a) != re.findall(r'\d+', b):
+        return False
+    return a == b or SequenceMatcher(None, a, b).ratio() >= TITLE_SIMILARITY_THRESHOLD
+
+
+def merge_structures(partials: List[Dict[str, Any]], title: str = None) -> Dict[str, Any]:
+    """Combine per-chunk outlines into one structure, merging near-duplicate slides."""
+    merged_slides = []
+    normalized_titles = []
+    for partial in partials:
+        for slide in partial.get('slides', []):
+            norm = _normalize_title(slide.get('title', ''))
+            match = None
+            for i, existing in enumerate(normalized_titles):
+                if _is_near_duplicate(norm, existing):
+                    match = i
+                    break
+            if match is None:
+                merged = {
+                    'title': slide.get('title', ''),
+                    'content': list(slide.get('content', [])),
+                    'notes': slide.get('notes', '')
+                }
+                if slide.get('layout'):
+                    merged['layout'] = slide['layout']
+                merged_slides.append(merged)
+                normalized_titles.append(norm)
+                continue
+            # Fold the duplicate into the earlier slide, which keeps its layout
+            target = merged_slides[match]
+            for point in slide.get('content', []):
+                if point not in target['content']:
+                    target['content'].append(point)
+            if slide.get('notes'):
+                target['notes'] = ' '.join(
+                    n for n in (target.get('notes'), slide['notes']) if n)
+
+    if not title:
+        title = next((p['title'] for p in partials if p.get('title')),
+                     'Generated Presentation')
+    return {'title': title, 'slides': merged_slides}
+
+
+# How outlines are made: by the AI, locally from markdown, or locally when the input is structured
+OUTLINE_ENGINES = {'auto': "Auto", 'ai': "AI", 'local': "Local (no AI)"}
+# Slides longer than this continue on another slide
+LOCAL_MAX_BULLETS = 6
+LOCAL_MAX_BULLET_CHARS = 140  # Bullets made from prose are cut at a word boundary
+LOCAL_MAX_TITLE_CHARS = 80
+# Auto mode outlines locally when there are this many headings and prose is at most this share
+STRUCTURED_MIN_HEADINGS = 2
+STRUCTURED_MAX_PROSE_SHARE = 0.5
+
+_MD_HEADING_RE = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+_MD_LIST_RE = re.compile(r'^(\s*)(?:[-*+]|\d+[.)])\s+(.*)$')
+_MD_FENCE_RE = re.compile(r'^\s*(```|~~~)')
+_MD_RULE_RE = re.compile(r'^\s*([-*_])(\s*\1){2,}\s*$')
+_MD_TABLE_SEPARATOR_RE = re.compile(r'^\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?$')
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9"“(])')
+
+
+def _dedent_markdown(text: str) -> List[str]:
+    """Split text into lines, removing indentation shared by every line after the first.
+
+    Text pasted from indented sources (or written in an indented string
+    literal) would otherwise read as one big code block.
+    """
+    lines = text.expandtabs(4).splitlines()
+    indents = [len(line) - len(line.lstrip()) for line in lines[1:] if line.strip()]
+    common = min(indents) if indents else 0
+    return lines[:1] + [line[common:] for line in lines[1:]]
+
+
+def _strip_inline_markdown(text: str) -> str:
+    text = re.sub(r'!?\[([^\]]*)\]\([^)]*\)', r'\1', text)  # Links and images keep their text
+    text = re.sub(r'(\*\*|__)(.+?)\1', r'\2', text)
+    text = re.sub(r'(?<![\w*])([*_])(?!\s)(.+?)(?<!\s)\1(?![\w*])', r'\2', text)
+    text = re.sub(r'`([^`]*)`', r'\1', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def _clip(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind(' ', 0, max_chars - 1)
+    return text[:cut if cut > 0 else max_chars - 1].rstrip(' ,;:-') + '…'
+
+
+def _first_sentence(paragraph: str) -> str:
+    return _SENTENCE_END_RE.split(paragraph, maxsplit=1)[0]
+
+
+def is_structured_markdown(text: str) -> bool:
+    """Whether text is markdown whose headings and lists already make an outline."""
+    headings = prose = total = 0
+    in_fence = False
+    for line in _dedent_markdown(text):
+        stripped = line.strip()
+        total += len(stripped)
+        if _MD_FENCE_RE.match(line):
+            in_fence = not in_fence
+        elif in_fence or not stripped:
+            continue
+        elif _MD_HEADING_RE.match(stripped):
+            headings += 1
+        elif not (_MD_LIST_RE.match(line) or stripped.startswith(('>', '|'))):
+            prose += len(stripped)
+    return headings >= STRUCTURED_MIN_HEADINGS and prose <= STRUCTURED_MAX_PROSE_SHARE * total
+
+
+def outline_markdown(text: str, max_bullets: int = LOCAL_MAX_BULLETS) -> Dict[str, Any]:
+    """Outline markdown locally into the structure the AI would return.
+
+    A lone top-level heading becomes the deck title and every other heading
+    starts a slide. List items become bullets; prose becomes speaker notes,
+    or, on slides without a list, bullets from each paragraph's first
+    sentence. Headings with no content of their own become section slides
+    and block quotes quote slides. Table rows become bullets, without the
+    header row. Slides with more than max_bullets bullets continue on
+    further slides.
+    """
+    lines = _dedent_markdown(text)
+    table_headers = {i - 1 for i, line in enumerate(lines)
+                     if i and line.strip().startswith('|') and _MD_TABLE_SEPARATOR_RE.match(line.strip())
+                     and lines[i - 1].strip().startswith('|')}
+    headings = [(len(m.group(1)), m.group(2)) for m in
+                (_MD_HEADING_RE.match(line.strip()) for line in lines) if m]
+    top = min((level for level, _ in headings), default=0)
+    deck_title = None
+    if headings and headings[0][0] == top and sum(level == top for level, _ in headings) == 1:
+        deck_title = _strip_inline_markdown(headings[0][1])
+
+    sections = []  # [title, bullets, paragraphs, quote lines]
+    current = None
+    paragraph = []
+    in_fence = False
+    skip_heading = deck_title is not None
+
+    def flush_paragraph():
+        nonlocal current
+        if paragraph:
+            current[2].append(_strip_inline_markdown(' '.join(paragraph)))
+            if not headings:
+                # Without headings every paragraph is a slide of its own
+                current = None
+        paragraph.clear()
+
+    def section():
+        nonlocal current
+        if current is None:
+            current = [None, [], [], []]
+            sections.append(current)
+        return current
+
+    for index, line in enumerate(lines):
+        stripped = line.strip()
+        if _MD_FENCE_RE.match(line):
+            in_fence = not in_fence
+            continue
+        if in_fence:
+            # Code is kept for the speaker, not put on slides
+            if stripped:
+                section()[2].append(stripped)
+            continue
+        heading = _MD_HEADING_RE.match(stripped)
+        if heading:
+            flush_paragraph()
+            if skip_heading:
+                skip_heading = False
+                continue
+            current = [_strip_inline_markdown(heading.group(2)), [], [], []]
+            sections.append(current)
+            continue
+        # Before list items: "* * *" is a rule, not a bullet
+        if _MD_RULE_RE.match(stripped):
+            flush_paragraph()
+            continue
+        if stripped.startswith('|'):
+            flush_paragraph()
+            if index not in table_headers and not _MD_TABLE_SEPARATOR_RE.match(stripped):
+                cells = [_strip_inline_markdown(cell)
+                         for cell in re.split(r'(?<!\\)\|', stripped.strip('|'))]
+                cells = [cell.replace('\\|', '|') for cell in cells if cell]
+                if cells:
+                    row = cells[0] + (': ' + ', '.join(cells[1:]) if len(cells) > 1 else '')
+                    section()[1].append(_clip(row, LOCAL_MAX_BULLET_CHARS))
+            continue
+        item = _MD_LIST_RE.match(line)
+        if item:
+            flush_paragraph()
+            section()[1].append(_strip_inline_markdown(item.group(2)))
+        elif stripped.startswith('>'):
+            flush_paragraph()
+            section()[3].append(stripped.lstrip('> ').strip())
+        elif not stripped:
+            flush_paragraph()
+        elif line.startswith(' ') and current and current[1] and not paragraph:
+            # An indented line continues the list item above it
+            current[1][-1] = _strip_inline_markdown(current[1][-1] + ' ' + stripped)
+        else:
+            section()
+            paragraph.append(stripped)
+    flush_paragraph()
+
+    slides = []
+    for title, bullets, paragraphs, quote in sections:
+        notes = ' '.join(paragraphs)
+        layout = None
+        if quote:
+            bullets = [_strip_inline_markdown(' '.join(quote))] + bullets
+            layout = 'quote'
+        elif not bullets and len(paragraphs) == 1:
+            bullets = _SENTENCE_END_RE.split(paragraphs[0])
+            if title is None and not headings and len(bullets) > 1:
+                # A paragraph without a heading is titled by its first sentence
+                title = _clip(bullets.pop(0), LOCAL_MAX_TITLE_CHARS)
+            bullets = [_clip(sentence, LOCAL_MAX_BULLET_CHARS) for sentence in bullets]
+        elif not bullets and paragraphs:
+            bullets = [_clip(_first_sentence(p), LOCAL_MAX_BULLET_CHARS) for p in paragraphs]
+        elif not bullets:
+            layout = 'section'
+        if title is None:
+            # Text before the first heading introduces the deck
+            title = "Overview" if headings else _clip(bullets[0], LOCAL_MAX_TITLE_CHARS)
+
+        for part, start in enumerate(range(0, max(len(bullets), 1), max_bullets)):
+            slide = {'title': title if part == 0 else f"{title} (cont.)",
+                     'content': bullets[start:start + max_bullets],
+                     'notes': notes if part == 0 else ''}
+            if layout:
+                slide['layout'] = layout
+            slides.append(slide)
+
+    if not slides:
+        raise ValueError("Nothing to outline: the text has no content besides its title")
+    if not deck_title:
+        deck_title = slides[0]['title'] if len(slides) == 1 else next(
+            (_strip_inline_markdown(level_title) for _, level_title in headings), "Generated Presentation")
+    return validate_outline({'title': _clip(deck_title, LOCAL_MAX_TITLE_CHARS), 'slides': slides},
+                            ParseReport())
+
+
+def outline_locally(engine: str, text: str) -> bool:
+    """Whether an outline engine setting means outlining this text without the AI."""
+    return engine == 'local' or (engine == 'auto' and is_structured_markdown(text))
+
+
+# Set METRICS_PORT to serve Prometheus text metrics at http://<host>:<port>/metrics
+METRICS_PORT = os.environ.get('METRICS_PORT')
+# Set METRICS_JSON_LOG to '1' (stderr) or a file path to log one JSON record per generation
+METRICS_JSON_LOG = os.environ.get('METRICS_JSON_LOG')
+# Set TRACE_ALLOCATIONS=1 to record allocated bytes per stage (tracemalloc slows everything down)
+if os.environ.get('TRACE_ALLOCATIONS') == '1' and not tracemalloc.is_tracing():
+    tracemalloc.start()
+RECENT_GENERATIONS = 100
+STAGE_SECONDS_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Typical share of a generation's wall time per stage, until real timings exist
+DEFAULT_STAGE_WEIGHTS = {'prompt': 0.01, 'provider': 0.6, 'parse': 0.02, 'template_open': 0.05,
+                         'render': 0.25, 'save': 0.07}
+
+metrics_log = logging.getLogger('text_to_powerpoint.metrics')
+
+
+def _labels(**labels) -> str:
+    """Prometheus label set, with values escaped as the text format requires."""
+    def escape(value) -> str:
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels.items()) + '}'
+
+
+class GenerationMetrics:
+    """Wall time, CPU time and allocation deltas per pipeline stage for one generation.
+
+    Stages are accumulated by name, so per-slide stages such as "render" and
+    "styling" sum over every call. "styling" runs inside "render". The
+    "provider" stage is timed by the thread waiting on AI requests, so its
+    CPU time is only that thread's; responses parsed on the provider loop
+    meanwhile count toward "parse" too. Stages timed on the provider loop
+    (prompt and parse) wrap synchronous code only, so no other coroutine
+    runs during them. CPU time is that of the thread running the stage. Allocation deltas are the
+    change in allocated blocks (process-wide) and, with TRACE_ALLOCATIONS=1,
+    in traced bytes.
+    """
+
+    def __init__(self, on_stage=None):
+        self.stages = OrderedDict()  # name -> {'wall', 'cpu', 'blocks', 'bytes', 'calls'}
+        self.ttft = None  # seconds until the provider's first token, when streaming
+        self.hedges = {}  # provider whose answer was used -> count, for hedged requests
+        self.started = time.perf_counter()
+        self.on_stage = on_stage  # called with the stage name after each stage
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        tracing = tracemalloc.is_tracing()
+        traced = tracemalloc.get_traced_memory()[0] if tracing else 0
+        blocks = sys.getallocatedblocks()
+        cpu = time.thread_time()
+        wall = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - wall, time.thread_time() - cpu,
+                     sys.getallocatedblocks() - blocks,
+                     tracemalloc.get_traced_memory()[0] - traced if tracing else None)
+
+    def merge(self, other: 'GenerationMetrics'):
+        """Add the stages recorded in other, e.g. those of the request a hedged race used."""
+        for name, totals in list(other.stages.items()):
+            self.add(name, totals['wall'], totals['cpu'], totals['blocks'], totals['bytes'])
+
+    def add(self, name: str, wall: float, cpu: float = 0.0, blocks: int = 0, allocated: int = None):
+        with self._lock:
+            totals = self.stages.setdefault(
+                name, {'wall': 0.0, 'cpu': 0.0, 'blocks': 0, 'bytes': None, 'calls': 0})
+            totals['wall'] += wall
+            totals['cpu'] += cpu
+            totals['blocks'] += blocks
+            if allocated is not None:
+                totals['bytes'] = (totals['bytes'] or 0) + allocated
+            totals['calls'] += 1
+        if self.on_stage:
+            self.on_stage(name)
+
+    def hedged(self, provider: str):
+        """Count a request that was also sent to the secondary provider, by the provider that won."""
+        with self._lock:
+            self.hedges[provider] = self.hedges.get(provider, 0) + 1
+
+    def timed_stream(self, chunks):
+        """Wrap a provider stream, recording time to first token and time spent waiting on it."""
+        started = time.perf_counter()
+        iterator = iter(chunks)
+        while True:
+            with self.stage('provider'):
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    return
+            if self.ttft is None:
+                self.ttft = time.perf_counter() - started
+            yield chunk
+
+    def to_record(self, **fields) -> Dict[str, Any]:
+        """A JSON-ready record of this generation, with extra fields such as provider and status."""
+        with self._lock:
+            stages = {name: {'wall_ms': round(totals['wall'] * 1000, 2),
+                             'cpu_ms': round(totals['cpu'] * 1000, 2),
+                             'alloc_blocks': totals['blocks'],
+                             'alloc_bytes': totals['bytes'],
+                             'calls': totals['calls']}
+                      for name, totals in self.stages.items()}
+        return {'time': datetime.now().isoformat(timespec='seconds'), **fields,
+                'total_ms': round((time.perf_counter() - self.started) * 1000, 2),
+                'ttft_ms': round(self.ttft * 1000, 2) if self.ttft is not None else None,
+                'hedges': dict(self.hedges), 'stages': stages}
+
+
+class MetricsRegistry:
+    """Process-wide aggregate of generation records, for logs, progress estimates and /metrics."""
+
+    def __init__(self, latency_stats: LatencyTracker = None):
+        self.recent = deque(maxlen=RECENT_GENERATIONS)
+        self.latency_stats = latency_stats  # Provider latencies to export, if any
+        self._generations = {}  # (provider, status) -> count
+        self._stages = {}  # stage -> {'wall', 'cpu', 'count', 'buckets'}
+        self._ttft = [0.0, 0]  # sum, count
+        self._hedges = {}  # provider whose answer was used -> count
+        self._lock = threading.Lock()
+
+    def record(self, record: Dict[str, Any]):
+        with self._lock:
+            self.recent.append(record)
+            key = (record.get('provider', ''), record.get('status', ''))
+            self._generations[key] = self._generations.get(key, 0) + 1
+            for name, stage in record['stages'].items():
+                totals = self._stages.setdefault(
+                    name, {'wall': 0.0, 'cpu': 0.0, 'count': 0, 'buckets': [0] * len(STAGE_SECONDS_BUCKETS)})
+                seconds = stage['wall_ms'] / 1000
+                totals['wall'] += seconds
+                totals['cpu'] += stage['cpu_ms'] / 1000
+                totals['count'] += 1
+                for i, bound in enumerate(STAGE_SECONDS_BUCKETS):
+                    if seconds <= bound:
+                        totals['buckets'][i] += 1
+            if record.get('ttft_ms') is not None:
+                self._ttft[0] += record['ttft_ms'] / 1000
+                self._ttft[1] += 1
+            for provider, count in (record.get('hedges') or {}).items():
+                self._hedges[provider] = self._hedges.get(provider, 0) + count
+        if metrics_log.handlers:
+            metrics_log.info(json.dumps(record, default=str))
+
+    def stage_weights(self) -> Dict[str, float]:
+        """Average seconds per stage so far, falling back to DEFAULT_STAGE_WEIGHTS."""
+        with self._lock:
+            averages = {name: totals['wall'] / totals['count']
+                        for name, totals in self._stages.items() if totals['count']}
+        if not averages:
+            return dict(DEFAULT_STAGE_WEIGHTS)
+        return {name: averages.get(name, 0.0) for name in set(DEFAULT_STAGE_WEIGHTS) | set(averages)}
+
+    def progress(self, completed_stages) -> int:
+        """Estimate percent done from the typical time share of the stages already finished."""
+        weights = self.stage_weights()
+        total = sum(weights.get(name, 0.0) for name in DEFAULT_STAGE_WEIGHTS)
+        done = sum(weights.get(name, 0.0) for name in completed_stages if name in DEFAULT_STAGE_WEIGHTS)
+        return min(95, int(100 * done / total)) if total else 0
+
+    def prometheus_text(self) -> str:
+        """Render the aggregates in the Prometheus text exposition format."""
+        lines = ['# HELP ttp_generations_total Completed generations by provider and status.',
+                 '# TYPE ttp_generations_total counter']
+        with self._lock:
+            for (provider, status), count in sorted(self._generations.items()):
+                lines.append(f'ttp_generations_total{_labels(provider=provider, status=status)} {count}')
+            lines += ['# HELP ttp_stage_seconds Wall time per pipeline stage per generation.',
+                      '# TYPE ttp_stage_seconds histogram']
+            for name, totals in sorted(self._stages.items()):
+                for bound, count in zip(STAGE_SECONDS_BUCKETS, totals['buckets']):
+                    lines.append(f'ttp_stage_seconds_bucket{_labels(stage=name, le=bound)} {count}')
+                lines.append(f'ttp_stage_seconds_bucket{_labels(stage=name, le="+Inf")} {totals["count"]}')
+                lines.append(f'ttp_stage_seconds_sum{_labels(stage=name)} {totals["wall"]:.6f}')
+                lines.append(f'ttp_stage_seconds_count{_labels(stage=name)} {totals["count"]}')
+            lines += ['# HELP ttp_stage_cpu_seconds_total CPU time per pipeline stage.',
+                      '# TYPE ttp_stage_cpu_seconds_total counter']
+            for name, totals in sorted(self._stages.items()):
+                lines.append(f'ttp_stage_cpu_seconds_total{_labels(stage=name)} {totals["cpu"]:.6f}')
+            lines += ['# HELP ttp_ttft_seconds Time to the first streamed token.',
+                      '# TYPE ttp_ttft_seconds summary',
+                      f'ttp_ttft_seconds_sum {self._ttft[0]:.6f}',
+                      f'ttp_ttft_seconds_count {self._ttft[1]}']
+            lines += ['# HELP ttp_hedged_requests_total Requests also sent to a secondary provider, '
+                      'by the provider whose answer was used.',
+                      '# TYPE ttp_hedged_requests_total counter']
+            for provider, count in sorted(self._hedges.items()):
+                lines.append(f'ttp_hedged_requests_total{_labels(winner=provider)} {count}')
+        if self.latency_stats:
+            summary = self.latency_stats.summary()
+            lines += ['# HELP ttp_provider_latency_seconds Recent successful provider latency, for whole '
+                      'responses (kind="completion") or the first streamed token (kind="first_token").',
+                      '# TYPE ttp_provider_latency_seconds summary']
+            for (provider, kind), stats in summary.items():
+                for quantile, key in (('0.5', 'p50'), ('0.95', 'p95')):
+                    labels = _labels(provider=provider, kind=kind, quantile=quantile)
+                    lines.append(f'ttp_provider_latency_seconds{labels} {stats[key]:.6f}')
+                lines.append(f'ttp_provider_latency_seconds_count{_labels(provider=provider, kind=kind)} '
+                             f'{stats["count"]}')
+            lines += ['# HELP ttp_hedge_deadline_seconds Seconds a request waits on a provider before being hedged.',
+                      '# TYPE ttp_hedge_deadline_seconds gauge']
+            for (provider, kind), stats in summary.items():
+                lines.append(f'ttp_hedge_deadline_seconds{_labels(provider=provider, kind=kind)} '
+                             f'{stats["deadline"]:.6f}')
+        lines += ['# HELP ttp_sdk_import_seconds Time the first import of each provider SDK took.',
+                  '# TYPE ttp_sdk_import_seconds gauge']
+        for module, seconds in sorted(sdk_import_seconds().items()):
+            lines.append(f'ttp_sdk_import_seconds{_labels(module=module)} {seconds:.6f}')
+        return '\n'.join(lines) + '\n'
+
+
+def start_metrics_server(registry: MetricsRegistry, port: int) -> ThreadingHTTPServer:
+    """Serve registry.prometheus_text() at /metrics on a daemon thread."""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.prometheus_text().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes would flood the app's log
+
+    server = ThreadingHTTPServer(('0.0.0.0', port), MetricsHandler)
+    threading.Thread(target=server.serve_forever,
+                     name="metrics-server", daemon=True).start()
+    return server
+
+
+def timed_stage(name: str):
+    """Decorate a PresentationGenerator method to count toward a metrics stage."""
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.metrics is None:
+                return method(self, *args, **kwargs)
+            with self.metrics.stage(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@st.cache_resource
+def get_metrics_registry() -> MetricsRegistry:
+    """Return the metrics registry shared by all sessions, starting the exporters configured by env."""
+    registry = MetricsRegistry(get_latency_tracker())
+    if METRICS_JSON_LOG:
+        handler = logging.StreamHandler(sys.stderr) if METRICS_JSON_LOG == '1' \
+            else logging.FileHandler(METRICS_JSON_LOG, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        metrics_log.addHandler(handler)
+        metrics_log.setLevel(logging.INFO)
+        metrics_log.propagate = False
+    if METRICS_PORT:
+        try:
+            start_metrics_server(registry, int(METRICS_PORT))
+        except (OSError, ValueError) as e:
+            logging.getLogger(__name__).warning(
+                "Metrics endpoint disabled: %s", e)
+    return registry
 
 
 class PresentationGenerator:
     def __init__(self):
         self.template_prs = None
         self.template_styles = {}
+        self.template_blank = None  # Prepared slide-free template bytes
+        self.template_digest = None  # SHA-256 of the uploaded template
+        self.provider_layer = None  # Defaults to the process-wide provider layer
+        self.last_render_stats = None  # Slides rendered vs reused by the last incremental build
+        self.last_parse_report = None  # ParseReport of the last parsed AI response
+        self.metrics = None  # GenerationMetrics to record stage timings into, if any
+        self.fit_text = True  # Fit bullets to their placeholders, see TextFitter
+        self.hedge = None  # (provider, api_key) to also send slow AI requests to, see AsyncProviderLayer.hedged
+
+    def stage(self, name: str):
+        """Context manager timing a block into the current metrics stage, if metrics are on"""
+        return self.metrics.stage(name) if self.metrics else nullcontext()
+
+    def fork(self) -> 'PresentationGenerator':
+        """A fresh generator with the same template and provider layer, for use on another thread"""
+        generator = PresentationGenerator()
+        generator.template_prs = self.template_prs
+        generator.template_styles = self.template_styles
+        generator.template_blank = self.template_blank
+        generator.template_digest = self.template_digest
+        generator.provider_layer = self.get_provider_layer()
+        generator.fit_text = self.fit_text
+        generator.hedge = self.hedge
+        return generator
 
     def extract_template_styles(self, template_prs: Presentation) -> Dict[str, Any]:
         """Extract styles from the template, mapping layout and placeholder types to style info."""
@@ -189,55 +3125,107 @@ class PresentationGenerator:
                 {'index': 0, 'name': 'Title Slide', 'placeholders': []},
                 {'index': 1, 'name': 'Content Slide', 'placeholders': []}
             ]
+        styles['style_plan'] = compile_style_plan(styles)
+        styles['layout_index'] = compile_layout_index(styles)
         return styles
 
-    def call_ai_api(self, provider: str, api_key: str, prompt: str) -> str:
-        """Call the appropriate AI API"""
-        try:
-            if provider == "OpenAI":
-                client = openai.OpenAI(api_key=api_key)
-                response = client.chat.completions.create(
-                    model="gpt-4",
-                    messages=[{"role": "user", "content": prompt}],
-                    max_tokens=4000,
-                    temperature=0.7
-                )
-                return response.choices[0].message.content
-
-            elif provider == "Anthropic":
-                client = anthropic.Anthropic(api_key=api_key)
-                message = client.messages.create(
-                    model="claude-3-sonnet-20240229",
-                    max_tokens=4000,
-                    messages=[{"role": "user", "content": prompt}]
-                )
-                return message.content[0].text
-
-            elif provider == "Google Gemini":
-                genai.configure(api_key=api_key)
-                model = genai.GenerativeModel('gemini-2.0-flash')
-                response = model.generate_content(
-                    prompt,
-                    generation_config=genai.types.GenerationConfig(
-                        temperature=0.7,
-                        max_output_tokens=4000,
-                    )
-                )
-                return response.text
+    def get_provider_layer(self) -> AsyncProviderLayer:
+        return self.provider_layer or get_provider_layer()
+
+    def record_hedge(self, provider: str):
+        """Count a hedged request in the current metrics, by the provider whose answer was used"""
+        if self.metrics:
+            self.metrics.hedged(provider)
+
+    def call_ai_api(self, provider: str, api_key: str, prompt: str) -> str:
+        """Call the appropriate AI API, hedged with self.hedge if it is set"""
+        layer = self.get_provider_layer()
+        with self.stage('provider'):
+            text, _, _ = layer.run(layer.hedged(
+                provider, api_key, *(self.hedge or (None, None)),
+                lambda name, key: layer.complete(name, key, prompt), on_hedged=self.record_hedge))
+        return text
+
+    def stream_ai_api(self, provider: str, api_key: str, prompt: str):
+        """Call the appropriate AI API in streaming mode, yielding text as it arrives"""
+        return self.get_provider_layer().iter_stream(provider, api_key, prompt, self.hedge, self.record_hedge)
+
+    def create_prompt(self, input_text: str, guidance: str = "") -> str:
+        """Create the prompt for AI processing"""
+        return f"""Please analyze the following text and convert it into a structured PowerPoint presentation outline.
+
+IMPORTANT: Respond with ONLY a valid JSON object in this exact format:
+{{
+  "title": "Presentation Title",
+  "slides": [
+    {{
+      "title": "Slide Title",
+      "layout": "bullets",
+      "content": ["bullet point 1", "bullet point 2", "bullet point 3"],
+      "notes": "Speaker notes for this slide (optional)"
+    }}
+  ]
+}}
+
+Guidelines:
+- Create 5-12 slides based on content length and complexity
+- Each slide should have 2-5 concise bullet points
+{LAYOUT_GUIDELINE}
+- Make titles engaging and descriptive
+- Include speaker notes when helpful
+- Focus on key insights, not just copying text
+{f"- Style/tone guidance: {guidance}" if guidance else ""}
+
+Text to convert:
+{input_text}
+
+Remember: Respond with ONLY the JSON object, no additional text or formatting."""
+
+    def create_chunk_prompt(self, chunk: str, part: int, total: int, guidance: str = "") -> str:
+        """Create the prompt for outlining one part of a long document"""
+        return f"""You are outlining part {part} of {total} of a longer document for a PowerPoint presentation.
+
+IMPORTANT: Respond with ONLY a valid JSON object in this exact format:
+{{
+  "title": "Presentation Title",
+  "slides": [
+    {{
+      "title": "Slide Title",
+      "layout": "bullets",
+      "content": ["bullet point 1", "bullet point 2", "bullet point 3"],
+      "notes": "Speaker notes for this slide (optional)"
+    }}
+  ]
+}}
+
+Guidelines:
+- Create 1-5 slides covering ONLY this part of the document
+- Do not add introduction, agenda or conclusion slides unless this part contains them
+- Each slide should have 2-5 concise bullet points
+{LAYOUT_GUIDELINE}
+- Make titles engaging and descriptive
+- Include speaker notes when helpful
+{f"- Style/tone guidance: {guidance}" if guidance else ""}
 
-        except Exception as e:
-            raise Exception(f"AI API Error: {str(e)}")
+Text of part {part}:
+{chunk}
 
-    def create_prompt(self, input_text: str, guidance: str = "") -> str:
-        """Create the prompt for AI processing"""
-        return f"""Please analyze the following text and convert it into a structured PowerPoint presentation outline.
+Remember: Respond with ONLY the JSON object, no additional text or formatting."""
 
-IMPORTANT: Respond with ONLY a valid JSON object in this exact format:
+    def create_continuation_prompt(self, input_text: str, structure: Dict[str, Any], guidance: str = "") -> str:
+        """Create the prompt asking for the slides after those already received"""
+        received = json.dumps(structure['slides'], ensure_ascii=False)
+        return f"""You were converting the text below into a PowerPoint presentation outline, but your response was cut off after {len(structure['slides'])} slides.
+
+The slides already received are:
+{received}
+
+IMPORTANT: Respond with ONLY a valid JSON object containing the REMAINING slides, in this exact format:
 {{
-  "title": "Presentation Title",
   "slides": [
     {{
       "title": "Slide Title",
+      "layout": "bullets",
       "content": ["bullet point 1", "bullet point 2", "bullet point 3"],
       "notes": "Speaker notes for this slide (optional)"
     }}
@@ -245,11 +3233,11 @@ IMPORTANT: Respond with ONLY a valid JSON object in this exact format:
 }}
 
 Guidelines:
-- Create 5-12 slides based on content length and complexity
+- Continue from where the slides above stop; do not repeat them
+- Return an empty "slides" list if the outline was already complete
 - Each slide should have 2-5 concise bullet points
-- Make titles engaging and descriptive
-- Include speaker notes when helpful
-- Focus on key insights, not just copying text
+{LAYOUT_GUIDELINE}
+- Keep speaker notes brief
 {f"- Style/tone guidance: {guidance}" if guidance else ""}
 
 Text to convert:
@@ -257,48 +3245,437 @@ Text to convert:
 
 Remember: Respond with ONLY the JSON object, no additional text or formatting."""
 
+    async def outline_async(self, layer: AsyncProviderLayer, provider: str, api_key: str, prompt: str,
+                            source_text: str, guidance: str = ""):
+        """Request and parse an outline, fetching the rest if the response is cut off.
+
+        With self.hedge set, a slow request is also sent to the secondary
+        provider; the first response that parses is used, and continuations
+        go to the provider that sent it.
+        """
+        (structure, report, truncated, timings), provider, api_key = await layer.hedged(
+            provider, api_key, *(self.hedge or (None, None)),
+            lambda name, key: self.request_outline_async(layer, name, key, prompt),
+            on_hedged=self.record_hedge)
+        if self.metrics:
+            self.metrics.merge(timings)
+        await self.continue_outline_async(layer, provider, api_key, source_text, guidance,
+                                          structure, report, truncated)
+        return structure, report
+
+    async def request_outline_async(self, layer: AsyncProviderLayer, provider: str, api_key: str, prompt: str):
+        """One outline request and its parse, as (structure, report, whether it was cut off, timings).
+
+        The parse is timed into its own GenerationMetrics, which the caller
+        merges only for the request it uses, so a hedged race counts once.
+        """
+        completion = await layer.completion(provider, api_key, prompt)
+        timings = GenerationMetrics()
+        with timings.stage('parse'):
+            structure, report = self.parse_ai_response_with_report(
+                completion.text)
+        return structure, report, completion.truncated or report.truncated, timings
+
+    async def continue_outline_async(self, layer: AsyncProviderLayer, provider: str, api_key: str,
+                                     source_text: str, guidance: str, structure: Dict[str, Any],
+                                     report: ParseReport, truncated: bool):
+        """Append the missing tail of a truncated outline to structure, in place.
+
+        Each continuation request carries the slides received so far and
+        asks only for the rest. Near-duplicates of received slides are
+        skipped. Stops after MAX_CONTINUATIONS requests, when a request adds
+        nothing, or once a response ends on its own.
+        """
+        for _ in range(MAX_CONTINUATIONS):
+            if not truncated:
+                break
+            with self.stage('prompt'):
+                prompt = self.create_continuation_prompt(
+                    source_text, structure, guidance)
+            completion = await layer.completion(provider, api_key, prompt)
+            report.continuations += 1
+            try:
+                with self.stage('parse'):
+                    more, more_report = self.parse_ai_response_with_report(
+                        completion.text)
+            except Exception:
+                # An empty or unusable continuation; keep what we have
+                truncated = completion.truncated
+                break
+            # Continuations carry only slides, so their missing title is expected
+            more_report.repairs = [repair for repair in more_report.repairs
+                                   if repair != MISSING_TITLE_REPAIR]
+            report.merge(more_report, f"continuation {report.continuations}")
+            # Titles are compared as merge_structures does, ignoring case and punctuation
+            titles = [_normalize_title(slide['title']) for slide in structure['slides']]
+            added = []
+            for slide in more['slides']:
+                title = _normalize_title(slide['title'])
+                if not any(_is_near_duplicate(title, seen) for seen in titles):
+                    added.append(slide)
+                    titles.append(title)
+            structure['slides'].extend(added)
+            truncated = completion.truncated or more_report.truncated
+            if not added:
+                break
+        report.truncated = truncated
+        report.salvaged_slides = len(structure['slides']) if truncated else 0
+
+    def generate_outline(self, provider: str, api_key: str, input_text: str, guidance: str = "") -> Dict[str, Any]:
+        """Outline text in one request (plus continuations if it is cut off)"""
+        layer = self.get_provider_layer()
+        with self.stage('prompt'):
+            prompt = self.create_prompt(input_text, guidance)
+        with self.stage('provider'):
+            structure, self.last_parse_report = layer.run(self.outline_async(
+                layer, provider, api_key, prompt, input_text, guidance))
+        return structure
+
+    def continue_outline(self, provider: str, api_key: str, input_text: str, guidance: str,
+                         structure: Dict[str, Any]) -> Dict[str, Any]:
+        """Fetch the rest of an outline whose response was cut off, per last_parse_report"""
+        layer = self.get_provider_layer()
+        with self.stage('provider'):
+            layer.run(self.continue_outline_async(layer, provider, api_key, input_text, guidance,
+                                                  structure, self.last_parse_report, True))
+        return structure
+
+    def generate_structure_chunked(self, provider: str, api_key: str, input_text: str,
+                                   guidance: str = "") -> Dict[str, Any]:
+        """Outline a long document by outlining its chunks concurrently and merging the results"""
+        chunks = split_into_chunks(input_text)
+        total = len(chunks)
+        layer = self.get_provider_layer()
+
+        async def outline_chunk(part, chunk):
+            with self.stage('prompt'):
+                prompt = self.create_chunk_prompt(chunk, part, total, guidance)
+            return await self.outline_async(layer, provider, api_key, prompt, chunk, guidance)
+
+        async def outline_all():
+            # Concurrency and rate limits are enforced per provider by the layer
+            return await asyncio.gather(*(outline_chunk(part, chunk)
+                                          for part, chunk in enumerate(chunks, 1)))
+
+        # Timed once for all chunks, which are awaited concurrently
+        with self.stage('provider'):
+            results = layer.run(outline_all())
+        partials = [structure for structure, _ in results]
+        self.last_parse_report = ParseReport()
+        for part, (_, report) in enumerate(results, 1):
+            self.last_parse_report.merge(report, f"part {part}")
+
+        # Prefer the document's own top-level heading as the deck title
+        heading = re.match(r'\s*#\s+(.+)', input_text)
+        return merge_structures(partials, heading.group(1).strip() if heading else None)
+
+    def generate_structure(self, provider: str, api_key: str, input_text: str, guidance: str = "",
+                           long_document: bool = None, outline_cache: OutlineCache = None,
+                           outline_engine: str = 'ai', on_progress=None, outline_single=None) -> Dict[str, Any]:
+        """Outline text without any UI: cache lookup, AI call(s), parsing and cache store.
+
+        on_progress(event) is called with 'local', 'cached', 'chunked' or
+        'outlined' as the outline is produced. outline_single(provider,
+        api_key, input_text, guidance) replaces generate_outline for
+        documents outlined in one request, e.g. to stream the response.
+        """
+        def progress(event):
+            if on_progress:
+                on_progress(event)
+
+        if outline_locally(outline_engine, input_text):
+            progress('local')
+            self.last_parse_report = ParseReport()
+            with self.stage('parse'):
+                return outline_markdown(input_text)
+        if long_document is None:
+            long_document = len(input_text) > LONG_DOCUMENT_CHARS
+        outline_key = OutlineCache.make_key(
+            input_text, guidance, provider, PROVIDER_MODELS[provider],
+            'chunked' if long_document else 'single')
+        if outline_cache:
+            structure = outline_cache.get(outline_key)
+            if structure is not None:
+                progress('cached')
+                self.last_parse_report = ParseReport()  # Nothing was parsed
+                return structure
+
+        if long_document:
+            structure = self.generate_structure_chunked(
+                provider, api_key, input_text, guidance)
+            progress('chunked')
+        else:
+            structure = (outline_single or self.generate_outline)(
+                provider, api_key, input_text, guidance)
+            progress('outlined')
+
+        # A cut-off outline is not cached, so a retry can get the whole deck
+        if outline_cache and not self.last_parse_report.truncated:
+            outline_cache.put(outline_key, structure)
+        return structure
+
     def parse_ai_response(self, response: str) -> Dict[str, Any]:
         """Parse and validate AI response"""
+        structure, self.last_parse_report = self.parse_ai_response_with_report(
+            response)
+        return structure
+
+    def parse_ai_response_with_report(self, response: str):
+        """Parse a response tolerantly, returning the outline and a ParseReport of what was fixed"""
+        try:
+            parser = IncrementalSlideParser()
+            parser.feed(response)
+            return parser.finish()
+        except Exception as e:
+            raise Exception(f"Failed to parse AI response: {str(e)}")
+
+    def create_presentation(self, structure: Dict[str, Any], template_prs: Presentation = None) -> Presentation:
+        """Create PowerPoint presentation from structure with proper styling"""
+        structure = self.fit_structure(structure)
+        prs, title_layout, content_layout = self.open_presentation(
+            template_prs)
+
+        # Add title slide
+        self.add_title_slide(prs, title_layout, structure.get(
+            'title', 'Generated Presentation'))
+
+        # Add content slides
+        for slide_data in structure['slides']:
+            self.add_content_slide(prs, content_layout, slide_data)
+
+        return prs
+
+    def _blank_and_digest(self, template_prs: Presentation = None):
+        """The slide-free package decks are built on, and its content hash"""
+        blank = self.template_blank
+        if blank is None:
+            blank = build_blank_template(
+                template_prs) if template_prs else default_blank_template()
+        digest = self.template_digest or hashlib.sha256(blank).hexdigest()
+        return blank, digest
+
+    @staticmethod
+    def _deck_items(structure: Dict[str, Any]) -> List[tuple]:
+        items = [('title', structure.get('title', 'Generated Presentation'))]
+        items += [('content', slide_data) for slide_data in structure['slides']]
+        return items
+
+    def _render_shards(self, items: List[tuple], blank: bytes, digest: str,
+                       pool: ProcessPoolExecutor = None, workers: int = None) -> List[SlideParts]:
+        """Render items in contiguous shards on the worker pool, keeping deck order"""
+        blank_path = publish_blank_template(digest, blank)
+        template_styles = getattr(self, 'template_styles', {})
+        # Workers only need what rendering reads, not the full extracted styles
+        render_styles = {key: template_styles[key] for key in ('style_plan', 'layout_index')
+                         if template_styles.get(key)}
+        workers = workers or RENDER_WORKERS
+        shard_count = max(1, min(workers, math.ceil(len(items) / MIN_SHARD_SLIDES)))
+        shard_size = math.ceil(len(items) / shard_count)
+        shards = [items[i:i + shard_size]
+                  for i in range(0, len(items), shard_size)]
+
+        shared_pool = pool is None
+        pool = pool or get_render_pool()
         try:
-            # Find JSON in the response
-            json_start = response.find('{')
-            json_end = response.rfind('}')
+            futures = [pool.submit(render_shard, digest, blank_path, render_styles, shard)
+                       for shard in shards]
+            return [parts for future in futures for parts in future.result()]
+        except BrokenProcessPool:
+            # A worker died (killed for memory, say); a broken pool refuses all further work
+            logging.getLogger(__name__).warning(
+                "Render worker pool broke; rendering %d slides in-process", len(items))
+            pool.shutdown(wait=False, cancel_futures=True)
+            if shared_pool:
+                get_render_pool.clear()  # The next render starts a fresh pool
+            return render_items(self, items, blank)
 
-            if json_start == -1 or json_end == -1:
-                raise ValueError("No JSON found in response")
+    def create_presentation_parallel(self, structure: Dict[str, Any], template_prs: Presentation = None,
+                                     pool: ProcessPoolExecutor = None, workers: int = None) -> Presentation:
+        """Create the presentation by rendering slide shards in worker processes and merging them"""
+        structure = self.fit_structure(structure)
+        blank, digest = self._blank_and_digest(template_prs)
+        slide_parts = self._render_shards(
+            self._deck_items(structure), blank, digest, pool, workers)
+        return Presentation(io.BytesIO(assemble_package(blank, slide_parts)))
 
-            json_str = response[json_start:json_end + 1]
-            structure = json.loads(json_str)
+    def slide_fingerprints(self, items: List[tuple], digest: str) -> List[str]:
+        """Fingerprint each deck item against the template and style plan it renders with"""
+        plan = getattr(self, 'template_styles', {}).get('style_plan')
+        plan_fingerprint = plan.fingerprint if plan else None
+        fingerprints = []
+        for kind, data in items:
+            if kind == 'title':
+                # The subtitle carries the generation date
+                data = [data, datetime.now().strftime('%Y-%m-%d')]
+            fingerprints.append(slide_fingerprint(
+                kind, data, plan_fingerprint, digest))
+        return fingerprints
 
-            if not structure.get('slides') or not isinstance(structure['slides'], list):
-                raise ValueError("Invalid presentation structure")
+    def preview_styles(self) -> Dict[str, Any]:
+        """The extracted styles of the template decks are rendered on"""
+        return self.template_styles if self.template_styles.get('layouts') else default_template_styles()
 
+    def fit_structure(self, structure: Dict[str, Any]) -> Dict[str, Any]:
+        """The outline with overflowing slides fitted to the template, unless fit_text is off"""
+        if not self.fit_text:
             return structure
+        with self.stage('fit'):
+            return TextFitter(self.preview_styles()).fit_structure(structure)
+
+    def submit_thumbnails(self, structure: Dict[str, Any], cache: ImageCache = None,
+                          pool: ThreadPoolExecutor = None) -> list:
+        """Start drawing a preview of each slide on the thumbnail pool; returns futures of PNG bytes.
+
+        Previews are cached by slide fingerprint, so unchanged slides cost a lookup.
+        """
+        cache = cache if cache is not None else get_thumbnail_cache()
+        pool = pool or get_thumbnail_pool()
+        styles = self.preview_styles()
+        _, digest = self._blank_and_digest(self.template_prs)
+        items = self._deck_items(self.fit_structure(structure))
+
+        def thumbnail(kind, data, fingerprint):
+            key = f"{fingerprint}:{THUMBNAIL_VERSION}:{THUMBNAIL_WIDTH}"
+            png = cache.get(key)
+            if png is None:
+                png = render_thumbnail(kind, data, styles)
+                cache.put(key, png)
+            return png
+
+        return [pool.submit(thumbnail, kind, data, fingerprint)
+                for (kind, data), fingerprint in zip(items, self.slide_fingerprints(items, digest))]
+
+    def create_presentation_incremental(self, structure: Dict[str, Any], template_prs: Presentation = None,
+                                        cache: SlidePartCache = None) -> Presentation:
+        """Create the presentation, reusing cached parts for slides that have not changed.
 
+        Only slides whose fingerprint is missing from the cache are rendered,
+        in worker shards when there are at least PARALLEL_RENDER_MIN_SLIDES of
+        them. The cached and fresh parts are then merged into one package.
+        """
+        cache = cache if cache is not None else get_slide_part_cache()
+        structure = self.fit_structure(structure)
+        blank, digest = self._blank_and_digest(template_prs)
+        items = self._deck_items(structure)
+        fingerprints = self.slide_fingerprints(items, digest)
+
+        slide_parts = [cache.get(fingerprint) for fingerprint in fingerprints]
+        misses = [i for i, parts in enumerate(slide_parts) if parts is None]
+        if misses:
+            stale_items = [items[i] for i in misses]
+            if len(misses) >= PARALLEL_RENDER_MIN_SLIDES:
+                with self.stage('render'):
+                    rendered = self._render_shards(stale_items, blank, digest)
+            else:
+                rendered = render_items(self, stale_items, blank)
+            for i, parts in zip(misses, rendered):
+                slide_parts[i] = parts
+                cache.put(fingerprints[i], parts)
+        self.last_render_stats = {
+            'slides': len(items), 'rendered': len(misses), 'reused': len(items) - len(misses)}
+        with self.stage('assemble'):
+            return Presentation(io.BytesIO(assemble_package(blank, slide_parts)))
+
+    def remember_slide_parts(self, structure: Dict[str, Any], prs: Presentation,
+                             template_prs: Presentation = None, cache: SlidePartCache = None):
+        """Seed the slide cache from a deck built some other way, e.g. while streaming"""
+        cache = cache if cache is not None else get_slide_part_cache()
+        items = self._deck_items(structure)
+        slide_parts = extract_slide_parts(prs)
+        if len(slide_parts) != len(items):
+            return
+        _, digest = self._blank_and_digest(template_prs)
+        for fingerprint, parts in zip(self.slide_fingerprints(items, digest), slide_parts):
+            cache.put(fingerprint, parts)
+
+    def create_presentation_streaming(self, chunks, template_prs: Presentation = None, on_slide=None,
+                                      continue_truncated=None):
+        """Build the presentation while the AI response streams in.
+
+        Each slide is added as soon as the parser sees it complete, and
+        on_slide(count, slide_data) is called after it is built. If the
+        stream is cut off, which the JSON left open or a ProviderStream's
+        finish reason shows, continue_truncated(structure) may return the
+        outline with its missing slides appended, and those are added too.
+        Returns the validated structure and the finished presentation once
+        the stream ends.
+        """
+        parser = IncrementalSlideParser()
+        fitter = TextFitter(self.preview_styles()) if self.fit_text else None
+        prs, title_layout, content_layout = self.open_presentation(
+            template_prs)
+
+        def add_slides(slide_data):
+            # Overflowing slides may become several
+            for fitted in fitter.fit_slide(slide_data) if fitter else [slide_data]:
+                self.add_content_slide(prs, content_layout, fitted)
+
+        title_slide = None
+        streamed_title = None
+
+        def place_title(title):
+            # The title slide comes first; its text may be fixed up once the full title is known
+            nonlocal title_slide, streamed_title
+            if title_slide is None:
+                title_slide = self.add_title_slide(prs, title_layout, title)
+            elif title != streamed_title:
+                self.set_title_text(title_slide, title_layout, title)
+            streamed_title = title
+
+        source = chunks
+        if self.metrics:
+            chunks = self.metrics.timed_stream(chunks)
+
+        for chunk in chunks:
+            with self.stage('parse'):
+                completed = parser.feed(chunk)
+            for slide_data in completed:
+                if title_slide is None:
+                    place_title(parser.title or 'Generated Presentation')
+                add_slides(slide_data)
+                if on_slide:
+                    on_slide(len(parser.slides), slide_data)
+
+        try:
+            with self.stage('parse'):
+                structure, self.last_parse_report = parser.finish()
         except Exception as e:
-            raise Exception(f"Failed to parse AI response: {str(e)}")
+            if not (continue_truncated and parser.cut_off and not parser.slides):
+                raise Exception(f"Failed to parse AI response: {str(e)}")
+            # Cut off before the first slide completed; the continuation asks for them all
+            structure = {'title': parser.title or 'Generated Presentation', 'slides': []}
+            self.last_parse_report = parser.report
+        if getattr(source, 'truncated', False):
+            # Stopped at the output token cap, even if the JSON happened to close
+            self.last_parse_report.truncated = True
+        if self.last_parse_report.truncated and continue_truncated:
+            structure = continue_truncated(structure)
+            if not structure['slides']:
+                raise Exception("Failed to parse AI response: Invalid presentation structure")
+            place_title(structure.get('title', 'Generated Presentation'))
+            for slide_data in structure['slides'][len(parser.slides):]:
+                add_slides(slide_data)
+                if on_slide:
+                    on_slide(len(prs.slides) - 1, slide_data)
+            return self.fit_structure(structure), prs
+        if len(structure['slides']) != len(parser.slides):
+            # The stream did not parse the way the full response does; rebuild from it
+            return self.fit_structure(structure), self.create_presentation(structure, template_prs)
+        place_title(structure.get('title', 'Generated Presentation'))
+        # The slides as rendered, so slide parts and previews line up with the deck
+        return self.fit_structure(structure), prs
 
-    def create_presentation(self, structure: Dict[str, Any], template_prs: Presentation = None) -> Presentation:
-        """Create PowerPoint presentation from structure with proper styling"""
-        if template_prs:
-            # Create a new presentation but copy the template file directly to preserve all styling
+    @timed_stage('template_open')
+    def open_presentation(self, template_prs: Presentation = None, blank: bytes = None):
+        """Open an empty presentation for the template and pick its title and content layouts"""
+        blank = blank or self.template_blank
+        if template_prs or blank:
             try:
-                # Method 1: Try to clone the entire template presentation
-                temp_buffer = io.BytesIO()
-                template_prs.save(temp_buffer)
-                temp_buffer.seek(0)
-                prs = Presentation(temp_buffer)
-
-                # Clear existing content slides (keep layouts and masters)
-                slides_to_remove = []
-                for i, slide in enumerate(prs.slides):
-                    slides_to_remove.append(i)
-
-                # Remove slides in reverse order to maintain indices
-                for i in reversed(slides_to_remove):
-                    r_id = prs.slides._sldIdLst[i].rId
-                    prs.part.drop_rel(r_id)
-                    del prs.slides._sldIdLst[i]
+                # Method 1: Open the prepared blank template (no per-deck save/reparse)
+                if blank is None:
+                    blank = build_blank_template(template_prs)
+                prs = Presentation(io.BytesIO(blank))
+                layouts_to_use = prs.slide_layouts
 
             except Exception as e:
                 # Method 2: Fallback - create new presentation with template layouts
@@ -312,37 +3689,39 @@ Remember: Respond with ONLY the JSON object, no additional text or formatting.""
                 except:
                     pass
 
-            # Use template layouts
-            try:
-                layouts_to_use = template_prs.slide_layouts
-            except:
-                layouts_to_use = prs.slide_layouts
+                # Use template layouts
+                try:
+                    layouts_to_use = template_prs.slide_layouts
+                except:
+                    layouts_to_use = prs.slide_layouts
         else:
             # Create new presentation with default template
             prs = Presentation()
             layouts_to_use = prs.slide_layouts
 
+        # Title and content layouts come from the template's layout index
+        index = self.get_layout_index()
+        title_slot, content_slot = index.resolve('title'), index.resolve(DEFAULT_ARCHETYPE)
+        title_layout = layouts_to_use[title_slot.layout] if len(
+            layouts_to_use) > title_slot.layout else prs.slide_layouts[0]
+        content_layout = layouts_to_use[content_slot.layout] if len(
+            layouts_to_use) > content_slot.layout else prs.slide_layouts[1]
+        return prs, title_layout, content_layout
+
+    def get_layout_index(self) -> LayoutIndex:
+        """The layout index of the template decks are rendered on"""
+        return getattr(self, 'template_styles', {}).get('layout_index') or default_layout_index()
+
+    @timed_stage('render')
+    def add_title_slide(self, prs: Presentation, title_layout, title: str):
+        """Add the styled title slide and return it"""
         # Get template styles for applying formatting
         template_styles = getattr(self, 'template_styles', {})
 
-        # Ensure we have at least 2 layouts (title and content)
-        title_layout = layouts_to_use[0] if len(
-            layouts_to_use) > 0 else prs.slide_layouts[0]
-        content_layout = layouts_to_use[1] if len(
-            layouts_to_use) > 1 else prs.slide_layouts[1]
-
-        # Add title slide
         title_slide = prs.slides.add_slide(title_layout)
-        layout_name = getattr(title_layout, 'name', None)
-        # Set title with styling
-        if title_slide.shapes.title:
-            title_slide.shapes.title.text = structure.get(
-                'title', 'Generated Presentation')
-            # Apply template font styling to title
-            for para in title_slide.shapes.title.text_frame.paragraphs:
-                self.apply_paragraph_styling(
-                    para, template_styles, 'title', layout_name=layout_name, placeholder_type='TITLE')
+        self.set_title_text(title_slide, title_layout, title)
         # Add subtitle if available
+        layout_name = getattr(title_layout, 'name', None)
         try:
             if len(title_slide.placeholders) > 1:
                 subtitle_placeholder = title_slide.placeholders[1]
@@ -353,73 +3732,104 @@ Remember: Respond with ONLY the JSON object, no additional text or formatting.""
                             para, template_styles, 'subtitle', layout_name=layout_name, placeholder_type='SUBTITLE')
         except:
             pass
+        return title_slide
 
-        # Add content slides
-        for slide_data in structure['slides']:
-            slide = prs.slides.add_slide(content_layout)
-            layout_name = getattr(content_layout, 'name', None)
-            # Set slide title with styling
-            if slide.shapes.title:
-                slide.shapes.title.text = slide_data['title']
-                for para in slide.shapes.title.text_frame.paragraphs:
+    def set_title_text(self, title_slide, title_layout, title: str):
+        """Set and style the title of the title slide"""
+        template_styles = getattr(self, 'template_styles', {})
+        layout_name = getattr(title_layout, 'name', None)
+        # Set title with styling
+        if title_slide.shapes.title:
+            title_slide.shapes.title.text = title
+            # Apply template font styling to title
+            for para in title_slide.shapes.title.text_frame.paragraphs:
+                self.apply_paragraph_styling(
+                    para, template_styles, 'title', layout_name=layout_name, placeholder_type='TITLE')
+
+    @timed_stage('render')
+    def add_content_slide(self, prs: Presentation, content_layout, slide_data: Dict[str, Any]):
+        """Add one styled content slide with bullets and speaker notes and return it.
+
+        The slide's "layout" archetype picks its layout and placeholders from
+        the layout index; content_layout is used for ordinary bullet slides.
+        """
+        template_styles = getattr(self, 'template_styles', {})
+        index = self.get_layout_index()
+        archetype = slide_data.get('layout') or DEFAULT_ARCHETYPE
+        slot = index.resolve(archetype)
+        layout = content_layout
+        if slot is not index.resolve(DEFAULT_ARCHETYPE) and slot.layout < len(prs.slide_layouts):
+            layout = prs.slide_layouts[slot.layout]
+
+        slide = prs.slides.add_slide(layout)
+        layout_name = getattr(layout, 'name', None)
+        # Set by TextFitter when the template size would overflow
+        font_size = Pt(slide_data['font_size']) if slide_data.get('font_size') else None
+        # Set slide title with styling
+        if slide.shapes.title:
+            slide.shapes.title.text = slide_data['title']
+            for para in slide.shapes.title.text_frame.paragraphs:
+                self.apply_paragraph_styling(
+                    para, template_styles, 'slide_title', layout_name=layout_name, placeholder_type='TITLE')
+        # Add content to the slot's placeholders; two-column slides split it in half
+        content = slide_data['content']
+        columns = [content]
+        if archetype == 'two_column' and len(slot.bodies) > 1:
+            half = math.ceil(len(content) / 2)
+            columns = [content[:half], content[half:]]
+        content_added = False
+        try:
+            for (idx, ph_type), points in zip(slot.bodies, columns):
+                text_frame = slide.placeholders[idx].text_frame
+                text_frame.clear()
+                for i, point in enumerate(points):
+                    if i == 0:
+                        p = text_frame.paragraphs[0]
+                    else:
+                        p = text_frame.add_paragraph()
+                    p.text = point
+                    p.level = 0
                     self.apply_paragraph_styling(
-                        para, template_styles, 'slide_title', layout_name=layout_name, placeholder_type='TITLE')
-            # Add content to the appropriate placeholder
-            content_added = False
-            # Try to find content placeholder
-            for placeholder in slide.placeholders:
-                try:
-                    ph_type = str(
-                        getattr(placeholder.placeholder_format, 'type', 'unknown'))
-                    if (placeholder.placeholder_format.idx == 1 or
-                        'content' in ph_type.lower() or
-                            'body' in ph_type.lower()):
-                        text_frame = placeholder.text_frame
-                        text_frame.clear()
-                        for i, point in enumerate(slide_data['content']):
-                            if i == 0:
-                                p = text_frame.paragraphs[0]
-                            else:
-                                p = text_frame.add_paragraph()
-                            p.text = point
-                            p.level = 0
-                            self.apply_paragraph_styling(
-                                p, template_styles, 'content', layout_name=layout_name, placeholder_type=ph_type)
-                        content_added = True
-                        break
-                except Exception as e:
-                    continue
-            # Fallback: add text box if no suitable placeholder found
-            if not content_added:
-                try:
-                    left = Inches(1)
-                    top = Inches(1.5)
-                    width = Inches(8)
-                    height = Inches(5)
-                    textbox = slide.shapes.add_textbox(
-                        left, top, width, height)
-                    text_frame = textbox.text_frame
-                    for i, point in enumerate(slide_data['content']):
-                        if i == 0:
-                            p = text_frame.paragraphs[0]
-                        else:
-                            p = text_frame.add_paragraph()
-                        p.text = f"• {point}"
-                        p.level = 0
-                        self.apply_paragraph_styling(
-                            p, template_styles, 'content', layout_name=layout_name, placeholder_type='BODY')
-                except:
-                    pass
-            # Add speaker notes
+                        p, template_styles, 'content', layout_name=layout_name, placeholder_type=ph_type)
+                    if font_size:
+                        for run in p.runs:
+                            run.font.size = font_size
+                content_added = True
+        except Exception:
+            pass
+        # Fallback: add text box if no suitable placeholder found
+        if not content_added:
             try:
-                if slide_data.get('notes'):
-                    notes_slide = slide.notes_slide
-                    if hasattr(notes_slide, 'notes_text_frame'):
-                        notes_slide.notes_text_frame.text = slide_data['notes']
+                left = Inches(1)
+                top = Inches(1.5)
+                width = Inches(8)
+                height = Inches(5)
+                textbox = slide.shapes.add_textbox(
+                    left, top, width, height)
+                text_frame = textbox.text_frame
+                for i, point in enumerate(content):
+                    if i == 0:
+                        p = text_frame.paragraphs[0]
+                    else:
+                        p = text_frame.add_paragraph()
+                    p.text = f"• {point}"
+                    p.level = 0
+                    self.apply_paragraph_styling(
+                        p, template_styles, 'content', layout_name=layout_name, placeholder_type='BODY')
+                    if font_size:
+                        for run in p.runs:
+                            run.font.size = font_size
             except:
                 pass
-
-        return prs
+        # Add speaker notes
+        try:
+            if slide_data.get('notes'):
+                notes_slide = slide.notes_slide
+                if hasattr(notes_slide, 'notes_text_frame'):
+                    notes_slide.notes_text_frame.text = slide_data['notes']
+        except:
+            pass
+        return slide
 
     def apply_text_styling(self, shape, template_styles: Dict, style_type: str):
         """Apply text styling from template to a text shape"""
@@ -438,69 +3848,21 @@ Remember: Respond with ONLY the JSON object, no additional text or formatting.""
         except Exception as e:
             pass  # Silently fail if styling can't be applied
 
+    @timed_stage('styling')
     def apply_paragraph_styling(self, paragraph, template_styles: Dict, style_type: str, layout_name: str = None, placeholder_type: str = None):
         """Apply paragraph-level styling from template, using layout and placeholder type if available."""
         if not template_styles or not hasattr(paragraph, 'runs'):
             return
         try:
-            font_info = None
-            # Try to get font info by layout and placeholder type
-            if layout_name and placeholder_type:
-                font_info = template_styles.get('placeholder_styles', {}).get(
-                    (layout_name, placeholder_type))
-            # Fallback: use any available font info
-            if not font_info:
-                layouts = template_styles.get('layouts', [])
-                for layout in layouts:
-                    for placeholder in layout.get('placeholders', []):
-                        if placeholder.get('font_info') and any(placeholder['font_info'].values()):
-                            font_info = placeholder['font_info']
-                            break
-                    if font_info:
-                        break
-            if not font_info:
+            plan = template_styles.get('style_plan')
+            if plan is None:
+                plan = compile_style_plan(template_styles)
+            font_style = plan.resolve(layout_name, placeholder_type)
+            if not font_style:
                 return
             for run in paragraph.runs:
                 if hasattr(run, 'font'):
-                    font = run.font
-                    if font_info.get('name'):
-                        try:
-                            font.name = font_info['name']
-                        except:
-                            fallback_fonts = [
-                                'Calibri', 'Arial', 'Times New Roman', 'Helvetica']
-                            for fallback in fallback_fonts:
-                                try:
-                                    font.name = fallback
-                                    break
-                                except:
-                                    continue
-                    if font_info.get('size') and font_info['size']:
-                        try:
-                            font.size = font_info['size']
-                        except:
-                            pass
-                    if font_info.get('bold') is not None:
-                        try:
-                            font.bold = font_info['bold']
-                        except:
-                            pass
-                    if font_info.get('italic') is not None:
-                        try:
-                            font.italic = font_info['italic']
-                        except:
-                            pass
-                    if font_info.get('color') and font_info['color']:
-                        try:
-                            color_str = font_info['color'].replace(
-                                'RGBColor(0x', '').replace(')', '')
-                            if len(color_str) == 6:
-                                r = int(color_str[0:2], 16)
-                                g = int(color_str[2:4], 16)
-                                b = int(color_str[4:6], 16)
-                                font.color.rgb = RGBColor(r, g, b)
-                        except:
-                            pass
+                    font_style.apply(run.font)
         except Exception as e:
             pass
 
@@ -531,7 +3893,401 @@ Remember: Respond with ONLY the JSON object, no additional text or formatting.""
             return False
 
 
+# Generation jobs run on a fixed pool shared by all sessions
+GENERATION_WORKERS = 4
+# Jobs kept for their sessions to collect, oldest finished ones dropped first
+JOB_STORE_MAX = 32
+JOB_POLL_INTERVAL = 1.0  # seconds between status reruns while a job runs
+
+
+class GenerationJob:
+    """Status, progress and result of one background generation."""
+
+    def __init__(self, job_id: str):
+        self.id = job_id
+        self.status = 'queued'  # queued, running, done or failed
+        self.progress = 0
+        self.message = "⏳ Waiting for a free worker..."
+        self.notices = []  # (level, text) to show with the result, e.g. parse repairs
+        self.structure = None
+        self.deck = None  # Saved .pptx, a DeckFile
+        self.thumbnails = []  # PNG preview of each slide
+        self.filename = None
+        self.template_applied = False
+        self.error = None
+        self.metrics = None  # Per-stage timing record, see GenerationMetrics.to_record
+        self.created = time.time()
+        self.finished = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in ('queued', 'running')
+
+    def update(self, progress: int = None, message: str = None):
+        if progress is not None:
+            self.progress = progress
+        if message is not None:
+            self.message = message
+
+
+class JobQueue:
+    """Fixed thread pool running generation jobs, with a bounded store of their results.
+
+    Jobs keep running across Streamlit reruns; sessions hold only the job ID
+    and poll the job for progress. Once more than max_jobs are stored, the
+    oldest finished jobs (and their decks) are dropped.
+    """
+
+    def __init__(self, workers: int = GENERATION_WORKERS, max_jobs: int = JOB_STORE_MAX):
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="generation")
+        self._jobs = OrderedDict()  # job id -> GenerationJob
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args) -> GenerationJob:
+        """Queue fn(job, *args); fn reports progress on the job and fills in its result."""
+        job = GenerationJob(os.urandom(8).hex())
+        with self._lock:
+            self._jobs[job.id] = job
+            self._evict()
+        self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def get(self, job_id: str) -> Optional[GenerationJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job: GenerationJob, fn, args):
+        job.status = 'running'
+        try:
+            fn(job, *args)
+            job.status = 'done'
+        except Exception as e:
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished = time.time()
+            with self._lock:
+                self._evict()
+
+    def _evict(self):
+        excess = len(self._jobs) - self.max_jobs
+        if excess <= 0:
+            return
+        for job_id in [job.id for job in self._jobs.values() if not job.active][:excess]:
+            del self._jobs[job_id]
+
+
+@st.cache_resource
+def get_job_queue() -> JobQueue:
+    """Return the generation job queue shared by all sessions in this process."""
+    return JobQueue()
+
+
+def run_generation(job: GenerationJob, generator: PresentationGenerator, provider: str, api_key: str,
+                   input_text: str, guidance: str, long_document: bool, stream_slides: bool,
+                   outline_cache: Optional[OutlineCache], slide_cache: SlidePartCache,
+                   metrics_registry: MetricsRegistry, outline_engine: str = 'ai', slim: bool = False):
+    """Outline and render a deck on a worker thread, reporting progress and stage metrics on the job"""
+    local = outline_locally(outline_engine, input_text)
+    stage_order = list(DEFAULT_STAGE_WEIGHTS)
+
+    def on_stage(name):
+        # Progress follows the measured time share of the stages reached so far;
+        # streamed decks report progress per slide instead
+        if name in stage_order and not (stream_slides and not long_document and not local):
+            done = stage_order[:stage_order.index(name)]
+            job.update(max(job.progress, metrics_registry.progress(done)))
+
+    metrics = generator.metrics = GenerationMetrics(on_stage)
+    mode = 'local' if local else 'chunked' if long_document else 'streaming' if stream_slides else 'single'
+    status = 'failed'
+    try:
+        generate_deck(job, generator, provider, api_key, input_text, guidance,
+                      long_document, stream_slides, outline_cache, slide_cache, local, slim)
+        status = 'done'
+    finally:
+        job.metrics = metrics.to_record(
+            job=job.id, provider='local' if local else provider,
+            model=None if local else PROVIDER_MODELS[provider], mode=mode, status=status,
+            slides=len(job.structure['slides']) + 1 if job.structure else None)
+        metrics_registry.record(job.metrics)
+
+
+# Job messages for generate_structure's progress events
+OUTLINE_PROGRESS_MESSAGES = {
+    'local': "📝 Outlining markdown locally...",
+    'cached': "♻️ Reusing cached outline...",
+    'chunked': "📋 Merged section outlines...",
+    'outlined': "📋 Parsing AI response...",
+}
+
+
+def generate_deck(job: GenerationJob, generator: PresentationGenerator, provider: str, api_key: str,
+                  input_text: str, guidance: str, long_document: bool, stream_slides: bool,
+                  outline_cache: Optional[OutlineCache], slide_cache: SlidePartCache, local: bool = False,
+                  slim: bool = False):
+    """The generation pipeline run by run_generation; local outlines markdown without the AI"""
+    # Step 1: Generate structure
+    job.update(message="🔍 Analyzing content structure...")
+
+    prs = None
+
+    def outline_streaming(provider, api_key, input_text, guidance):
+        # Slides are rendered as the response streams in
+        nonlocal prs
+        with generator.stage('prompt'):
+            prompt = generator.create_prompt(input_text, guidance)
+
+        def on_slide(count, slide_data):
+            # The prompt asks for 5-12 slides; fill 25-85% as they arrive
+            job.update(min(85, 25 + count * 5),
+                       f"🎨 Built slide {count}: {slide_data.get('title', '')}")
+
+        def continue_truncated(partial):
+            job.update(message="✂️ Response was cut off, requesting the remaining slides...")
+            return generator.continue_outline(
+                provider, api_key, input_text, guidance, partial)
+
+        structure, prs = generator.create_presentation_streaming(
+            generator.stream_ai_api(provider, api_key, prompt),
+            generator.template_prs, on_slide=on_slide,
+            continue_truncated=continue_truncated)
+        generator.remember_slide_parts(structure, prs, generator.template_prs, slide_cache)
+        return structure
+
+    # Local outlines take milliseconds, so they are not cached; cut-off
+    # responses are completed with continuation requests
+    structure = generator.generate_structure(
+        provider, api_key, input_text, guidance, long_document, outline_cache,
+        'local' if local else 'ai',
+        on_progress=lambda event: job.update(message=OUTLINE_PROGRESS_MESSAGES[event]),
+        outline_single=outline_streaming if stream_slides else None)
+
+    hedges = generator.metrics.hedges if generator.metrics else {}
+    if hedges and generator.hedge:
+        used = ', '.join(f"{count} from {name}" for name, count in hedges.items())
+        job.notices.append(
+            ('info', f"⏱️ {provider} was slow, so {sum(hedges.values())} request(s) also went to "
+                     f"{generator.hedge[0]} (answers used: {used})."))
+
+    parse_report = generator.last_parse_report
+    if parse_report and not parse_report.clean:
+        job.notices.append(
+            ('warning', f"⚠️ The AI response needed fixing: {parse_report.summary()}."))
+    elif parse_report and parse_report.continuations:
+        job.notices.append(
+            ('info', f"✂️ {parse_report.summary().capitalize()}."))
+
+    if prs is None:
+        # Step 3: Create presentation
+        job.update(message="🎨 Creating presentation...")
+
+        # Overflowing slides are fitted here, after caching, as the fit depends on the template
+        structure = generator.fit_structure(structure)
+
+        # Unchanged slides come from the slide cache; large
+        # numbers of new ones are rendered in worker shards
+        prs = generator.create_presentation_incremental(
+            structure, generator.template_prs, slide_cache)
+
+    # Step 4: Finalize
+    job.update(message="✅ Finalizing presentation...")
+
+    # Generate filename
+    safe_title = re.sub(
+        r'[^a-z0-9\s]', '', structure.get('title', 'presentation').lower())
+    safe_title = re.sub(r'\s+', '_', safe_title)
+    job.filename = f"{safe_title}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pptx"
+
+    # Previews are drawn on the thumbnail pool while the deck is slimmed and saved
+    thumbnails = generator.submit_thumbnails(structure)
+
+    if slim:
+        with generator.stage('slim'):
+            slimmed = slim_presentation(prs, get_image_cache())
+        job.notices.append(('info', f"🗜️ {describe_slimming(slimmed)}"))
+
+    # Save presentation, spooled to disk once it grows large
+    with generator.stage('save'):
+        job.deck = DeckFile(prs)
+    with generator.stage('preview'):
+        job.thumbnails = [future.result() for future in thumbnails]
+    job.structure = structure
+    job.template_applied = bool(generator.template_blank)
+    job.update(100, "🎉 Presentation generated successfully!")
+
+
+def render_generation_job(job: Optional[GenerationJob]):
+    """Show a generation job's progress, or its result once finished"""
+    if job is None:
+        st.info("The last generation is no longer available. Please generate again.")
+        return
+
+    if job.active:
+        st.progress(job.progress)
+        st.text(job.message)
+        return
+
+    for level, text in job.notices:
+        getattr(st, level)(text)
+
+    if job.status == 'failed':
+        st.error(f"❌ Error: {job.error}")
+        st.info("💡 Try using a different AI provider or check your API key.")
+        return
+
+    structure = job.structure
+    # Success message with details
+    st.markdown(f"""
+    <div class="success-box">
+        <h4>✅ Success!</h4>
+        <p><strong>Title:</strong> {structure.get('title', 'Generated Presentation')}</p>
+        <p><strong>Slides Created:</strong> {len(structure['slides']) + 1} (including title slide)</p>
+        <p><strong>Template Applied:</strong> {'Yes' if job.template_applied else 'Default'}</p>
+    </div>
+    """, unsafe_allow_html=True)
+
+    # Download button
+    st.download_button(
+        label="📥 Download Presentation",
+        data=deck_download_data(job.deck),
+        file_name=job.filename,
+        mime="application/vnd.openxmlformats-officedocument.presentationml.presentation"
+    )
+
+    if job.thumbnails:
+        with st.expander("🖼️ Slide previews", expanded=True):
+            render_thumbnail_grid(job.thumbnails)
+
+    # Show presentation structure
+    with st.expander("📋 Generated Structure"):
+        st.json(structure)
+
+    if job.metrics:
+        render_generation_metrics(job.metrics)
+
+
+def render_generation_metrics(record: Dict[str, Any]):
+    """Show where a generation's time went, stage by stage"""
+    with st.expander("⏱️ Performance"):
+        summary = f"**Total:** {record['total_ms'] / 1000:.2f}s"
+        if record.get('ttft_ms') is not None:
+            summary += f" • **Time to first token:** {record['ttft_ms'] / 1000:.2f}s"
+        st.markdown(summary)
+        st.table([{
+            'Stage': name,
+            'Wall (ms)': stage['wall_ms'],
+            'CPU (ms)': stage['cpu_ms'],
+            'Alloc. blocks': stage['alloc_blocks'],
+            'Calls': stage['calls'],
+        } for name, stage in record['stages'].items()])
+        st.caption("Styling runs inside rendering; provider time counts only waiting on the AI. "
+                   "Streamed decks render while the provider is still responding.")
+        st.json(record, expanded=False)
+
+
+def render_page_chrome():
+    """Configure the page and draw the shared CSS and header"""
+    # Page configuration
+    st.set_page_config(
+        page_title="📊 Text to PowerPoint Generator",
+        page_icon="📊",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
+
+    # Custom CSS for better styling
+    st.markdown("""
+    <style>
+        .main-header {
+            background: linear-gradient(135deg, #4f46e5 0%, #7c3aed 100%);
+            padding: 2rem;
+            border-radius: 10px;
+            color: white;
+            text-align: center;
+            margin-bottom: 2rem;
+        }
+        .feature-box {
+            background: #f8fafc;
+            padding: 1.5rem;
+            border-radius: 8px;
+            border-left: 4px solid #4f46e5;
+            margin: 1rem 0;
+        }
+        .warning-box {
+            background: #fef3c7;
+            padding: 1rem;
+            border-radius: 8px;
+            border-left: 4px solid #f59e0b;
+            margin: 1rem 0;
+        }
+        .success-box {
+            background: #f0fdf4;
+            padding: 1rem;
+            border-radius: 8px;
+            border-left: 4px solid #10b981;
+            margin: 1rem 0;
+        }
+    </style>
+    """, unsafe_allow_html=True)
+
+    # Header
+    st.markdown("""
+    <div class="main-header">
+        <h1>📊 Text to PowerPoint Generator</h1>
+        <p>Transform your text into beautiful presentations using AI and custom templates</p>
+    </div>
+    """, unsafe_allow_html=True)
+
+
+def render_outline_editor(generator: PresentationGenerator, slim: bool = False):
+    """Let the user edit the last outline and rebuild only the slides that changed"""
+    structure = st.session_state['structure']
+    outline_json = json.dumps(structure, indent=2, ensure_ascii=False)
+    with st.expander("✏️ Edit outline and re-render"):
+        edited = st.text_area(
+            "Outline JSON",
+            value=outline_json,
+            height=400,
+            key=f"outline_editor_{hashlib.sha256(outline_json.encode('utf-8')).hexdigest()[:16]}",
+            help="Change slide titles, bullet points or notes. Unchanged slides are reused as they are."
+        )
+        if not st.button("🔁 Re-render edited outline"):
+            return
+        try:
+            edited_structure = generator.parse_ai_response(edited)
+            started = time.perf_counter()
+            prs = generator.create_presentation_incremental(
+                edited_structure, generator.template_prs)
+            thumbnails = generator.submit_thumbnails(edited_structure)
+            if slim:
+                slim_presentation(prs, get_image_cache())
+            deck = DeckFile(prs)
+            thumbnails = [future.result() for future in thumbnails]
+            elapsed = time.perf_counter() - started
+        except Exception as e:
+            st.error(f"❌ Error: {str(e)}")
+            return
+
+        stats = generator.last_render_stats
+        st.success(f"✅ Re-rendered {stats['rendered']} of {stats['slides']} slides "
+                   f"({stats['reused']} reused) in {elapsed:.2f}s")
+        safe_title = re.sub(
+            r'[^a-z0-9\s]', '', edited_structure.get('title', 'presentation').lower())
+        safe_title = re.sub(r'\s+', '_', safe_title)
+        st.download_button(
+            label="📥 Download Re-rendered Presentation",
+            data=deck_download_data(deck),
+            file_name=f"{safe_title}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pptx",
+            mime="application/vnd.openxmlformats-officedocument.presentationml.presentation"
+        )
+        render_thumbnail_grid(thumbnails)
+
+
 def main():
+    render_page_chrome()
     generator = PresentationGenerator()
 
     # Sidebar for configuration
@@ -542,7 +4298,7 @@ def main():
         st.subheader("AI Provider")
         provider = st.selectbox(
             "Choose AI Provider",
-            ["OpenAI", "Anthropic", "Google Gemini"],
+            provider_names(),
             help="Select your preferred AI service"
         )
 
@@ -565,25 +4321,89 @@ def main():
                 </ul>
             </div>
             """, unsafe_allow_html=True)
+        else:
+            # Import the provider's SDK while the user is still editing
+            preload_sdk(provider)
+
+        hedge_provider = st.selectbox(
+            "⏱️ Backup provider for slow requests",
+            [None] + [name for name in provider_names() if name != provider],
+            format_func=lambda name: "None" if name is None else name,
+            help="When the AI provider is slower than usual to start answering, send the same request "
+                 "to this provider too and use whichever answers first."
+        )
+        if hedge_provider:
+            hedge_key = st.text_input(
+                f"{hedge_provider} API Key",
+                type="password",
+                key="hedge_api_key",
+                help="Used only for requests the main provider is slow to answer"
+            )
+            if hedge_key:
+                generator.hedge = (hedge_provider, hedge_key)
+                preload_sdk(hedge_provider)
 
         st.divider()
 
         # Template Upload
         st.subheader("🎨 Template")
-        template_file = st.file_uploader(
-            "Upload PowerPoint Template",
-            type=['pptx', 'potx'],
-            help="Upload your branded PowerPoint template to preserve styling"
-        )
+        registry = get_template_registry()
+        saved_templates = {manifest['id']: manifest for manifest in registry.list()}
+        saved_template_id = None
+        if saved_templates:
+            saved_template_id = st.selectbox(
+                "Saved Template",
+                [None] + list(saved_templates),
+                format_func=lambda template_id: "Upload a template instead" if template_id is None
+                else f"{saved_templates[template_id]['name']} ({template_id})",
+                help="Templates saved to this server's library load without re-parsing the file"
+            )
 
-        if template_file:
+        template_file = None
+        if saved_template_id is None:
+            template_file = st.file_uploader(
+                "Upload PowerPoint Template",
+                type=['pptx', 'potx'],
+                help="Upload your branded PowerPoint template to preserve styling"
+            )
+
+        if saved_template_id or template_file:
             try:
-                # Load template
-                generator.template_prs = Presentation(template_file)
-                generator.template_styles = generator.extract_template_styles(
-                    generator.template_prs)
+                if saved_template_id:
+                    # Compiled artifact: no package parsing or style extraction
+                    cached_template = registry.load(saved_template_id)
+                else:
+                    # Load template (parsed once per process for identical uploads)
+                    cached_template = get_template_cache().get_or_load(
+                        template_file.getvalue())
+                generator.template_prs = cached_template.prs
+                generator.template_styles = cached_template.styles
+                generator.template_blank = cached_template.blank
+                generator.template_digest = cached_template.digest
                 st.success("✅ Template loaded successfully!")
 
+                # The registry is shared by every session, so saving is opt-in and never replaces
+                if template_file and TEMPLATE_LIBRARY_UPLOADS:
+                    with st.expander("💾 Save to template library"):
+                        new_template_id = st.text_input(
+                            "Template ID",
+                            value=re.sub(r'[^A-Za-z0-9_.-]+', '-',
+                                         os.path.splitext(template_file.name)[0]).strip('-.'),
+                            help="Letters, digits, '.', '_' and '-'. Existing IDs cannot be replaced here."
+                        )
+                        if st.button("Save template"):
+                            try:
+                                registry.compile(new_template_id, template_file.getvalue(),
+                                                 name=template_file.name,
+                                                 template_cache=get_template_cache(),
+                                                 overwrite=False)
+                                st.success(
+                                    f"✅ Saved as '{new_template_id}'. Pick it under Saved Template next time.")
+                            except FileExistsError:
+                                st.error(f"❌ '{new_template_id}' is already taken; choose another ID.")
+                            except Exception as e:
+                                st.error(f"❌ Could not save template: {str(e)}")
+
                 # Show template info
                 with st.expander("Template Information"):
                     st.write(
@@ -648,6 +4468,8 @@ def main():
                 # Reset template data
                 generator.template_prs = None
                 generator.template_styles = {}
+                generator.template_blank = None
+                generator.template_digest = None
 
     # Main content area
     col1, col2 = st.columns([2, 1])
@@ -713,6 +4535,53 @@ def main():
             if custom_guidance:
                 guidance = custom_guidance
 
+        outline_engine = st.radio(
+            "🧭 Outline engine",
+            list(OUTLINE_ENGINES),
+            format_func=OUTLINE_ENGINES.get,
+            horizontal=True,
+            help="Auto outlines structured markdown (headings and lists) locally in milliseconds "
+                 "and sends other text to the AI. Local never calls the AI and needs no API key."
+        )
+        if outline_engine == 'auto' and input_text.strip():
+            st.caption("📝 Structured markdown: will be outlined locally"
+                       if is_structured_markdown(input_text) else "🤖 Unstructured text: will be outlined by the AI")
+
+        long_document = st.checkbox(
+            "📚 Long document mode",
+            value=len(input_text) > LONG_DOCUMENT_CHARS,
+            help="Outline the text in sections concurrently and merge the results. Recommended for long reports."
+        )
+
+        stream_slides = st.checkbox(
+            "⚡ Build slides as the AI responds",
+            value=True,
+            disabled=long_document,
+            help="Stream the AI response and add each slide as soon as it arrives"
+        )
+
+        use_outline_cache = st.checkbox(
+            "♻️ Reuse cached outline",
+            value=True,
+            help="Skip the AI call when the same text, guidance and provider were outlined before "
+                 "(e.g. when only the template changed). Outlines are cached on this server's disk."
+        )
+
+        generator.fit_text = st.checkbox(
+            "📏 Fit bullets to slides",
+            value=True,
+            help="Measure each slide's bullets against the template's text box. Slides that would "
+                 "overflow get a slightly smaller font, or continue on a new slide."
+        )
+
+        slim_output = st.checkbox(
+            "🗜️ Slim output file",
+            value=False,
+            help="Drop template layouts the deck does not use, store duplicate media once and downsample "
+                 f"images larger than needed at {IMAGE_TARGET_DPI} DPI. Dropped layouts are no longer "
+                 "available when adding slides in PowerPoint."
+        )
+
     with col2:
         st.header("🚀 Features")
 
@@ -733,7 +4602,7 @@ def main():
         st.markdown("""
         <div class="feature-box">
             <h4>🔒 Privacy First</h4>
-            <p>No data storage - everything processed securely</p>
+            <p>API keys are never stored. Outline caching can be switched off per generation.</p>
         </div>
         """, unsafe_allow_html=True)
 
@@ -747,94 +4616,51 @@ def main():
     # Generation button and process
     st.divider()
 
+    job_queue = get_job_queue()
     if st.button("🚀 Generate Presentation", type="primary", use_container_width=True):
         if not input_text.strip():
             st.error("❌ Please enter some content to convert.")
             return
 
-        if not api_key.strip():
+        if not api_key.strip() and not outline_locally(outline_engine, input_text):
             st.error("❌ Please enter your API key.")
             return
 
-        try:
-            with st.spinner("🤖 Analyzing content with AI..."):
-                # Create progress bar
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-
-                # Step 1: Generate structure
-                status_text.text("🔍 Analyzing content structure...")
-                progress_bar.progress(25)
-
-                prompt = generator.create_prompt(input_text, guidance)
-                ai_response = generator.call_ai_api(provider, api_key, prompt)
-
-                # Step 2: Parse response
-                status_text.text("📋 Parsing AI response...")
-                progress_bar.progress(50)
-
-                structure = generator.parse_ai_response(ai_response)
-
-                # Step 3: Create presentation
-                status_text.text("🎨 Creating presentation...")
-                progress_bar.progress(75)
-
-                prs = generator.create_presentation(
-                    structure, generator.template_prs)
-
-                # Step 4: Finalize
-                status_text.text("✅ Finalizing presentation...")
-                progress_bar.progress(90)
+        # Generation runs on the shared worker pool, so reruns and other
+        # widgets do not interrupt it; this session only keeps the job ID
+        job = job_queue.submit(
+            run_generation, generator.fork(), provider, api_key, input_text, guidance,
+            long_document, stream_slides, get_outline_cache() if use_outline_cache else None,
+            get_slide_part_cache(), get_metrics_registry(), outline_engine, slim_output)
+        st.session_state['generation_job'] = job.id
+        st.session_state.pop('structure', None)
 
-                # Generate filename
-                safe_title = re.sub(
-                    r'[^a-z0-9\s]', '', structure.get('title', 'presentation').lower())
-                safe_title = re.sub(r'\s+', '_', safe_title)
-                filename = f"{safe_title}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pptx"
+    job = None
+    if st.session_state.get('generation_job'):
+        job = job_queue.get(st.session_state['generation_job'])
+        render_generation_job(job)
+        if job and job.status == 'done':
+            # Keep the outline so it can be edited and re-rendered
+            st.session_state['structure'] = job.structure
 
-                # Save presentation
-                output = io.BytesIO()
-                prs.save(output)
-                output.seek(0)
-
-                progress_bar.progress(100)
-                status_text.text("🎉 Presentation generated successfully!")
-
-                # Success message with details
-                st.markdown(f"""
-                <div class="success-box">
-                    <h4>✅ Success!</h4>
-                    <p><strong>Title:</strong> {structure.get('title', 'Generated Presentation')}</p>
-                    <p><strong>Slides Created:</strong> {len(structure['slides']) + 1} (including title slide)</p>
-                    <p><strong>Template Applied:</strong> {'Yes' if generator.template_prs else 'Default'}</p>
-                </div>
-                """, unsafe_allow_html=True)
-
-                # Download button
-                st.download_button(
-                    label="📥 Download Presentation",
-                    data=output.getvalue(),
-                    file_name=filename,
-                    mime="application/vnd.openxmlformats-officedocument.presentationml.presentation"
-                )
-
-                # Show presentation structure
-                with st.expander("📋 Generated Structure"):
-                    st.json(structure)
-
-        except Exception as e:
-            st.error(f"❌ Error: {str(e)}")
-            st.info("💡 Try using a different AI provider or check your API key.")
+    if st.session_state.get('structure'):
+        render_outline_editor(generator, slim_output)
 
     # Footer
     st.divider()
     st.markdown("""
     <div style="text-align: center; color: #6b7280; padding: 2rem;">
         <p>Made with ❤️ using Streamlit • Transform your ideas into professional presentations</p>
-        <p><small>Your API keys and content are processed securely and never stored</small></p>
+        <p><small>Your API keys are never stored. Outlines of your content are cached on this server
+        unless you switch off "Reuse cached outline".</small></p>
     </div>
     """, unsafe_allow_html=True)
 
+    if job and job.active:
+        # Poll the running job; the rest of the page stays usable in between
+        time.sleep(JOB_POLL_INTERVAL)
+        st.rerun()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,102 @@
+import json
+import logging
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+logging.getLogger('streamlit').setLevel(logging.ERROR)
+
+OUTLINE = json.dumps({'title': 'Fake Deck',
+                      'slides': [{'title': f'Slide {i}', 'content': ['a', 'b']} for i in range(3)]})
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """Local stand-in for the OpenAI chat completions endpoint that records client connections."""
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _FakeOpenAIHandler)
+        self.connections = set()  # (host, port) of each TCP connection seen
+        self.requests = 0
+        self.reply = OUTLINE
+        self.finish_reason = 'stop'
+        self.failures = []  # (status, headers) to answer the next requests with, in order
+        self.url = f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+
+class _FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, so connections can be reused
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        self.server.connections.add(self.client_address)
+        self.server.requests += 1
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        if self.server.failures:
+            self.send_failure(*self.server.failures.pop(0))
+            return
+        if request.get('stream'):
+            self.send_stream()
+            return
+        body = json.dumps({
+            'id': 'fake', 'object': 'chat.completion', 'created': 0, 'model': 'gpt-4',
+            'choices': [{'index': 0, 'finish_reason': self.server.finish_reason,
+                         'message': {'role': 'assistant', 'content': self.server.reply}}],
+            'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2},
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_failure(self, status, headers):
+        body = json.dumps({'error': {'message': f'fake failure {status}', 'type': 'fake_error'}}).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_stream(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        text = self.server.reply
+        deltas = [({'content': text[i:i + 20]}, None) for i in range(0, len(text), 20)]
+        for delta, finish_reason in deltas + [({}, self.server.finish_reason)]:
+            chunk = {'id': 'fake', 'object': 'chat.completion.chunk', 'created': 0, 'model': 'gpt-4',
+                     'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]}
+            self.write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+        self.write_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+@pytest.fixture
+def provider_layers():
+    """List a test appends its provider layers to, so their loop threads are stopped afterwards."""
+    layers = []
+    yield layers
+    for layer in layers:
+        layer.close()
+
+
+@pytest.fixture
+def openai_server():
+    server = FakeOpenAIServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,29 @@
+import pytest
+
+pytest.importorskip('pptx')
+
+import streamlit_app  # noqa: E402
+from batch_generate import run_batch  # noqa: E402
+from streamlit_app import AsyncProviderLayer, PresentationGenerator  # noqa: E402
+
+
+def test_each_item_is_outlined_on_its_own_generator(monkeypatch, tmp_path, provider_layers):
+    generators = []
+
+    def generate_structure(self, provider, api_key, input_text, guidance='', **kwargs):
+        # The parse report and stage timings live on the generator, so it must not be shared
+        generators.append(self)
+        self.last_parse_report = None
+        return {'title': input_text, 'slides': [{'title': 'Slide', 'content': ['a', 'b']}]}
+
+    monkeypatch.setattr(PresentationGenerator, 'generate_structure', generate_structure)
+    provider_layers.append(AsyncProviderLayer())
+    monkeypatch.setattr(streamlit_app, 'get_provider_layer', lambda: provider_layers[-1])
+    items = [{'id': f'deck{i}', 'text': f'Deck {i}', 'output': f'deck{i}.pptx'} for i in range(4)]
+
+    summary = run_batch(items, 'OpenAI', 'key', str(tmp_path), ai_workers=4, render_workers=1,
+                        use_cache=False)
+
+    assert summary['done'] == 4
+    assert len(set(map(id, generators))) == 4
+    assert sorted(p.name for p in tmp_path.glob('*.pptx')) == [f'deck{i}.pptx' for i in range(4)]
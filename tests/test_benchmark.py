@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from benchmark import DEFAULT_THRESHOLD, Result, find_regressions, save_baseline
+
+
+def result(p50=1.0, peak_bytes=1000):
+    return Result(p50=p50, p95=p50 * 2, throughput=1 / p50 if p50 else 0.0, unit='slides', peak_bytes=peak_bytes)
+
+
+def baseline(**results):
+    return {'results': {name: r._asdict() for name, r in results.items()}}
+
+
+@pytest.mark.parametrize('current, regressions', [
+    (result(), []),
+    (result(p50=1.2), []),  # Within the threshold
+    (result(p50=1.25), []),  # Exactly at the threshold is not a regression
+    (result(p50=0.5, peak_bytes=500), []),  # Improvements never are
+    (result(p50=1.5), ['render: p50 latency +50% (1 → 1.5)']),
+    (result(peak_bytes=2000), ['render: peak memory +100% (1000 → 2000)']),
+    (result(p50=2.0, peak_bytes=1300),
+     ['render: p50 latency +100% (1 → 2)', 'render: peak memory +30% (1000 → 1300)']),
+])
+def test_regressions_beyond_the_threshold_are_reported(current, regressions):
+    assert DEFAULT_THRESHOLD == 0.25
+    assert find_regressions({'render': current}, baseline(render=result())) == regressions
+
+
+def test_threshold_can_be_tightened():
+    assert find_regressions({'render': result(p50=1.1)}, baseline(render=result()), threshold=0.05) == [
+        'render: p50 latency +10% (1 → 1.1)']
+
+
+def test_cases_missing_from_the_baseline_or_zero_there_are_skipped():
+    previous = baseline(parse=result(p50=0.0, peak_bytes=0))
+    current = {'render': result(p50=9.0), 'parse': result(p50=1.0, peak_bytes=1)}
+
+    assert find_regressions(current, previous) == []
+    assert find_regressions(current, {}) == []
+
+
+def test_saved_baselines_compare_against_themselves(tmp_path):
+    results = {'render': result(), 'parse': result(p50=0.01, peak_bytes=10)}
+    path = tmp_path / 'baseline.json'
+    save_baseline(str(path), results, repeat=5)
+
+    assert find_regressions(results, json.loads(path.read_text())) == []
@@ -0,0 +1,68 @@
+import json
+import textwrap
+
+from streamlit_app import (AsyncProviderLayer, Completion, PresentationGenerator, ProviderClientRegistry,
+                           merge_structures, split_into_chunks)
+
+
+def sections(count, indent=''):
+    text = ''.join(f"# Section {i}\n\n{'Some words here. ' * 20}\n\n" for i in range(count))
+    return textwrap.indent(text, indent)
+
+
+def test_chunks_start_at_headings():
+    chunks = split_into_chunks(sections(4), max_chars=400)
+
+    assert len(chunks) == 4
+    assert all(chunk.startswith('# Section') for chunk in chunks)
+
+
+def test_indented_text_is_split_on_its_headings():
+    text = "Report\n" + sections(4, indent='        ')
+    chunks = split_into_chunks(text, max_chars=400)
+
+    assert [chunk.splitlines()[0] for chunk in chunks[1:]] == [
+        '# Section 1', '# Section 2', '# Section 3']
+    assert chunks[0].startswith('Report\n# Section 0')
+
+
+class ChunkOutlineLayer(AsyncProviderLayer):
+    """Provider layer that outlines every chunk as a section slide followed by a content slide."""
+
+    def __init__(self):
+        super().__init__(ProviderClientRegistry(), max_retries=0)
+        self.registry._create = lambda provider, api_key: object()
+        self.parts = 0
+
+    async def _complete_once(self, provider, client, prompt):
+        self.parts += 1
+        part = self.parts
+        return Completion(json.dumps({'title': 'Deck', 'slides': [
+            {'title': f'Part {part}', 'content': [], 'layout': 'section'},
+            {'title': 'Summary', 'content': [f'Point {part}']},
+        ]}), False, 'stop')
+
+
+def test_chunked_outline_keeps_slide_layouts(provider_layers):
+    generator = PresentationGenerator()
+    generator.provider_layer = ChunkOutlineLayer()
+    provider_layers.append(generator.provider_layer)
+    text = sections(30)
+
+    structure = generator.generate_structure_chunked('OpenAI', 'key', text)
+
+    chunks = len(split_into_chunks(text))
+    assert chunks > 1
+    # Section slides survive the merge; the repeated "Summary" slides fold into one
+    assert [s.get('layout') for s in structure['slides']] == ['section', None] + ['section'] * (chunks - 1)
+
+
+def test_merged_duplicates_keep_the_first_layout():
+    structure = merge_structures([
+        {'title': 'A', 'slides': [{'title': 'Roadmap', 'content': ['Q1'], 'layout': 'two_column'}]},
+        {'title': 'B', 'slides': [{'title': 'roadmap!', 'content': ['Q2'], 'layout': 'bullets'},
+                                  {'title': 'Next Steps', 'content': [], 'layout': 'section'}]},
+    ])
+
+    assert [(s['title'], s['content'], s.get('layout')) for s in structure['slides']] == [
+        ('Roadmap', ['Q1', 'Q2'], 'two_column'), ('Next Steps', [], 'section')]
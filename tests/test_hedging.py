@@ -0,0 +1,156 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from streamlit_app import (AsyncProviderLayer, Completion, GenerationMetrics, LatencyTracker,
+                           PresentationGenerator, ProviderClientRegistry)
+
+HEDGE_DEADLINE = 0.2  # seconds before a request is hedged
+STALL = 5.0  # seconds a stalled provider takes; a hedged test finishes long before
+
+
+class FakeClientRegistry(ProviderClientRegistry):
+    def _create(self, provider, api_key):
+        return object()
+
+
+class FakeProviderLayer(AsyncProviderLayer):
+    """Provider layer whose providers answer after a set delay with a good outline, garbage or an error.
+
+    'error' fails for good; 'unavailable' fails with a retryable connection error.
+    """
+
+    def __init__(self, behaviour):
+        super().__init__(FakeClientRegistry(), max_retries=0,
+                         latency_stats=LatencyTracker(default_deadline=HEDGE_DEADLINE))
+        self.behaviour = behaviour  # provider -> (reply: 'outline', 'garbage', 'error' or 'unavailable', delay)
+        self.requests = []
+        self.cancelled = []
+
+    def reply(self, provider):
+        return json.dumps({'title': f'{provider} deck',
+                           'slides': [{'title': f'{provider} slide', 'content': ['a', 'b']}]})
+
+    async def answer(self, provider):
+        self.requests.append(provider)
+        reply, delay = self.behaviour[provider]
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(provider)
+            raise
+        if reply == 'error':
+            raise RuntimeError(f"{provider} failed")
+        if reply == 'unavailable':
+            raise ConnectionError(f"{provider} unavailable")
+        return 'not an outline' if reply == 'garbage' else self.reply(provider)
+
+    async def _complete_once(self, provider, client, prompt):
+        return Completion(await self.answer(provider), False, 'stop')
+
+    async def _stream_once(self, provider, client, prompt):
+        text = await self.answer(provider)
+        for i in range(0, len(text), 16):
+            yield text[i:i + 16]
+
+
+def hedged_generator(layers, behaviour):
+    generator = PresentationGenerator()
+    generator.provider_layer = FakeProviderLayer(behaviour)
+    layers.append(generator.provider_layer)
+    generator.hedge = ('Anthropic', 'secondary-key')
+    generator.metrics = GenerationMetrics()
+    return generator
+
+
+def settle(layer):
+    # Let cancelled losers unwind on the provider loop
+    layer.run(asyncio.sleep(0.05))
+
+
+def test_stalled_primary_loses_and_is_cancelled(provider_layers):
+    generator = hedged_generator(provider_layers, {'OpenAI': ('outline', STALL), 'Anthropic': ('outline', 0.01)})
+    started = time.perf_counter()
+    structure = generator.generate_outline('OpenAI', 'primary-key', 'text')
+    settle(generator.provider_layer)
+
+    assert time.perf_counter() - started < 2
+    assert structure['title'] == 'Anthropic deck'
+    assert generator.provider_layer.cancelled == ['OpenAI']
+    assert generator.metrics.hedges == {'Anthropic': 1}
+
+
+def test_unparseable_answer_loses_to_a_slower_valid_one(provider_layers):
+    generator = hedged_generator(provider_layers, {'OpenAI': ('outline', 0.5), 'Anthropic': ('garbage', 0.01)})
+    structure = generator.generate_outline('OpenAI', 'primary-key', 'text')
+
+    assert structure['title'] == 'OpenAI deck'
+    assert generator.metrics.hedges == {'OpenAI': 1}
+    # Only the answer that was used is timed
+    assert generator.metrics.stages['parse']['calls'] == 1
+    assert generator.metrics.stages['provider']['calls'] == 1
+
+
+def test_both_failing_raises_the_primary_error(provider_layers):
+    generator = hedged_generator(provider_layers, {'OpenAI': ('error', 0.5), 'Anthropic': ('error', 0.01)})
+    with pytest.raises(Exception, match='OpenAI failed'):
+        generator.generate_outline('OpenAI', 'primary-key', 'text')
+
+
+def test_fast_primary_is_never_hedged(provider_layers):
+    generator = hedged_generator(provider_layers, {'OpenAI': ('outline', 0.01), 'Anthropic': ('outline', 0.01)})
+    for _ in range(3):
+        generator.generate_outline('OpenAI', 'primary-key', 'text')
+
+    assert generator.provider_layer.requests == ['OpenAI'] * 3
+    assert generator.metrics.hedges == {}
+
+
+def test_primary_failing_retryably_before_the_deadline_goes_to_the_secondary(provider_layers):
+    generator = hedged_generator(provider_layers, {'OpenAI': ('unavailable', 0.01), 'Anthropic': ('outline', 0.01)})
+    started = time.perf_counter()
+    structure = generator.generate_outline('OpenAI', 'primary-key', 'text')
+
+    assert time.perf_counter() - started < HEDGE_DEADLINE
+    assert structure['title'] == 'Anthropic deck'
+    assert generator.provider_layer.requests == ['OpenAI', 'Anthropic']
+    assert generator.metrics.hedges == {'Anthropic': 1}
+
+
+def test_secondary_failing_too_after_a_retryable_primary_error_raises_the_primary_error(provider_layers):
+    generator = hedged_generator(provider_layers, {'OpenAI': ('unavailable', 0.01), 'Anthropic': ('error', 0.01)})
+    with pytest.raises(Exception, match='OpenAI unavailable'):
+        generator.generate_outline('OpenAI', 'primary-key', 'text')
+
+
+def test_primary_failing_for_good_before_the_deadline_is_not_hedged(provider_layers):
+    generator = hedged_generator(provider_layers, {'OpenAI': ('error', 0.01), 'Anthropic': ('outline', 0.01)})
+    with pytest.raises(Exception, match='OpenAI failed'):
+        generator.generate_outline('OpenAI', 'primary-key', 'text')
+    assert generator.provider_layer.requests == ['OpenAI']
+
+
+def test_stream_with_a_stalled_first_token_uses_the_secondary(provider_layers):
+    generator = hedged_generator(provider_layers, {'OpenAI': ('outline', STALL), 'Anthropic': ('outline', 0.01)})
+    layer = generator.provider_layer
+    started = time.perf_counter()
+    text = ''.join(generator.stream_ai_api('OpenAI', 'primary-key', 'prompt'))
+    settle(layer)
+
+    assert time.perf_counter() - started < 2
+    assert text == layer.reply('Anthropic')
+    assert layer.cancelled == ['OpenAI']
+    assert generator.metrics.hedges == {'Anthropic': 1}
+
+
+def test_deadline_adapts_to_observed_latency():
+    tracker = LatencyTracker(min_samples=10, default_deadline=30, min_deadline=0.1, max_deadline=5)
+    assert tracker.deadline('OpenAI', 'completion') == 30
+    for seconds in [0.2] * 18 + [1.0, 9.0]:
+        tracker.record('OpenAI', 'completion', seconds)
+
+    assert tracker.percentile('OpenAI', 'completion', 95) == 1.0
+    assert tracker.deadline('OpenAI', 'completion') == 1.0
+    assert tracker.deadline('OpenAI', 'first_token') == 30
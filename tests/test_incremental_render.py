@@ -0,0 +1,47 @@
+import copy
+import json
+
+import pytest
+
+pytest.importorskip('pptx')
+
+from pptx import Presentation  # noqa: E402
+from pptx.util import Inches  # noqa: E402
+
+from parallel_render import extract_slide_parts  # noqa: E402
+from streamlit_app import PresentationGenerator, SlidePartCache  # noqa: E402
+
+STRUCTURE = {'title': 'Deck', 'slides': [{'title': f'Slide {i}', 'content': ['a', 'b']} for i in range(4)]}
+
+
+def widescreen_template():
+    prs = Presentation()
+    prs.slide_width, prs.slide_height = Inches(13.333), Inches(7.5)
+    return prs
+
+
+def test_unchanged_slides_are_reused_byte_for_byte():
+    generator = PresentationGenerator()
+    cache = SlidePartCache()
+    first = extract_slide_parts(generator.create_presentation_incremental(STRUCTURE, cache=cache))
+    assert generator.last_render_stats == {'slides': 5, 'rendered': 5, 'reused': 0}
+
+    edited = copy.deepcopy(STRUCTURE)
+    edited['slides'][2]['content'].append('c')
+    second = extract_slide_parts(generator.create_presentation_incremental(edited, cache=cache))
+
+    assert generator.last_render_stats == {'slides': 5, 'rendered': 1, 'reused': 4}
+    assert [a == b for a, b in zip(first, second)] == [True, True, True, False, True]
+    assert b'>c<' in second[3].slide_xml
+
+
+def test_remembered_slides_are_fingerprinted_against_the_loaded_template():
+    template = widescreen_template()
+    generator = PresentationGenerator()
+    cache = SlidePartCache()
+    prs = generator.create_presentation(json.loads(json.dumps(STRUCTURE)), template)
+    generator.remember_slide_parts(STRUCTURE, prs, template, cache)
+
+    generator.create_presentation_incremental(STRUCTURE, template, cache=cache)
+
+    assert generator.last_render_stats == {'slides': 5, 'rendered': 0, 'reused': 5}
@@ -0,0 +1,63 @@
+import textwrap
+
+from streamlit_app import is_structured_markdown, outline_markdown
+
+
+def outline(text):
+    return outline_markdown(textwrap.dedent(text))
+
+
+def test_headings_and_lists_become_slides():
+    structure = outline("""\
+        # Quarterly Review
+
+        ## Wins
+        - Revenue up
+        - Churn down
+
+        ## Next
+        1. Hire
+        2. Ship
+        """)
+
+    assert structure['title'] == 'Quarterly Review'
+    assert [(s['title'], s['content']) for s in structure['slides']] == [
+        ('Wins', ['Revenue up', 'Churn down']), ('Next', ['Hire', 'Ship'])]
+
+
+def test_rules_are_not_bullets():
+    structure = outline("""\
+        # Deck
+
+        ## One
+        - First
+
+        * * *
+
+        ## Two
+        - Second
+        - - -
+        - Third
+        """)
+
+    assert [s['content'] for s in structure['slides']] == [['First'], ['Second', 'Third']]
+
+
+def test_table_rows_become_bullets_without_header_or_separator():
+    text = """\
+        # Deck
+
+        ## Prices
+        | Plan | Price | Seats |
+        |:-----|------:|-------|
+        | **Basic** | $10 | 1 |
+        | Team | $50 | 10 \\| more |
+
+        ## Notes
+        - Annual billing
+        """
+    structure = outline(text)
+
+    assert is_structured_markdown(textwrap.dedent(text))
+    slide = structure['slides'][0]
+    assert (slide['title'], slide['content']) == ('Prices', ['Basic: $10, 1', 'Team: $50, 10 | more'])
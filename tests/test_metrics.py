@@ -0,0 +1,107 @@
+import re
+
+import pytest
+
+from streamlit_app import STAGE_SECONDS_BUCKETS, LatencyTracker, MetricsRegistry
+
+NAME = r'[a-zA-Z_:][a-zA-Z0-9_:]*'
+LABEL_VALUE = r'"(?:[^"\\\n]|\\[\\"n])*"'
+LABELS = rf'\{{(?:[a-zA-Z_][a-zA-Z0-9_]*={LABEL_VALUE}(?:,[a-zA-Z_][a-zA-Z0-9_]*={LABEL_VALUE})*)?\}}'
+SAMPLE = re.compile(rf'^({NAME})({LABELS})? (\S+)$')
+COMMENT = re.compile(rf'^# (HELP|TYPE) ({NAME}) (.+)$')
+LABEL = re.compile(rf'([a-zA-Z_][a-zA-Z0-9_]*)=({LABEL_VALUE})')
+
+
+def generation(provider='openai', status='ok', ttft_ms=120.0, hedges=None, **stage_ms):
+    return {'provider': provider, 'status': status, 'ttft_ms': ttft_ms, 'hedges': hedges or {},
+            'stages': {name: {'wall_ms': ms, 'cpu_ms': ms / 2} for name, ms in stage_ms.items()}}
+
+
+def unescape(value):
+    return re.sub(r'\\(.)', lambda m: {'n': '\n'}.get(m.group(1), m.group(1)), value[1:-1])
+
+
+def parse(text):
+    """Check every line against the text exposition format; return {name: type} and the samples."""
+    assert text.endswith('\n')
+    types, samples = {}, []
+    for line in text.splitlines():
+        comment = COMMENT.match(line)
+        if comment:
+            kind, name, rest = comment.groups()
+            if kind == 'TYPE':
+                assert rest in ('counter', 'gauge', 'histogram', 'summary')
+                assert name not in types, f'{name} typed twice'
+                types[name] = rest
+            continue
+        match = SAMPLE.match(line)
+        assert match, f'not a valid sample line: {line!r}'
+        name, labels, value = match.groups()
+        float(value)
+        family = re.sub(r'_(bucket|sum|count)$', '', name)
+        assert name in types or family in types, f'{name} sampled before its # TYPE'
+        samples.append((name, {k: unescape(v) for k, v in LABEL.findall(labels or '')}, float(value)))
+    return types, samples
+
+
+@pytest.fixture
+def registry():
+    registry = MetricsRegistry()
+    registry.record(generation(prompt=2.0, render=300.0))
+    registry.record(generation(render=40.0, hedges={'anthropic': 1}))
+    registry.record(generation(provider='anthropic', status='error', ttft_ms=None, render=99_000.0))
+    return registry
+
+
+def test_exposition_is_well_formed(registry):
+    types, samples = parse(registry.prometheus_text())
+
+    assert types['ttp_generations_total'] == 'counter'
+    assert types['ttp_stage_seconds'] == 'histogram'
+    assert all(name.startswith('ttp_') for name in types)
+    generations = {(labels['provider'], labels['status']): value
+                   for name, labels, value in samples if name == 'ttp_generations_total'}
+    assert generations == {('openai', 'ok'): 2, ('anthropic', 'error'): 1}
+    assert ('ttp_hedged_requests_total', {'winner': 'anthropic'}, 1.0) in samples
+    assert ('ttp_ttft_seconds_count', {}, 2.0) in samples
+
+
+def test_stage_histograms_are_cumulative_and_end_at_the_count(registry):
+    _, samples = parse(registry.prometheus_text())
+
+    buckets = [(labels['le'], value) for name, labels, value in samples
+               if name == 'ttp_stage_seconds_bucket' and labels['stage'] == 'render']
+    count = next(value for name, labels, value in samples
+                 if name == 'ttp_stage_seconds_count' and labels['stage'] == 'render')
+    total = next(value for name, labels, value in samples
+                 if name == 'ttp_stage_seconds_sum' and labels['stage'] == 'render')
+
+    assert [le for le, _ in buckets] == [str(bound) for bound in STAGE_SECONDS_BUCKETS] + ['+Inf']
+    values = [value for _, value in buckets]
+    assert values == sorted(values)
+    assert values[-1] == count == 3
+    assert values[-2] == 2  # The 99 s render only lands in +Inf
+    assert total == pytest.approx(99.34)
+
+
+def test_label_values_are_escaped():
+    latency = LatencyTracker()
+    latency.record('odd "provider"\\\nname', 'completion', 0.5)
+    registry = MetricsRegistry(latency_stats=latency)
+    registry.record(generation(provider='odd "provider"\\\nname', render=1.0))
+
+    text = registry.prometheus_text()
+    _, samples = parse(text)
+
+    assert 'provider="odd \\"provider\\"\\\\\\nname"' in text
+    providers = {labels['provider'] for _, labels, _ in samples if 'provider' in labels}
+    assert providers == {'odd "provider"\\\nname'}
+    quantiles = {labels['quantile'] for name, labels, _ in samples if name == 'ttp_provider_latency_seconds'}
+    assert quantiles == {'0.5', '0.95'}
+
+
+def test_empty_registry_still_exports_help_and_types():
+    types, samples = parse(MetricsRegistry().prometheus_text())
+
+    assert {'ttp_generations_total', 'ttp_stage_seconds', 'ttp_ttft_seconds'} <= set(types)
+    assert ('ttp_ttft_seconds_count', {}, 0.0) in samples
@@ -0,0 +1,71 @@
+import json
+import os
+import time
+
+from streamlit_app import OutlineCache
+
+STRUCTURE = {'title': 'Deck', 'slides': [{'title': 'Slide', 'content': ['a', 'b']}]}
+TEXT = "# Report\n\nFirst point.\n\nSecond point."
+
+
+def key(text=TEXT, guidance='', provider='OpenAI', model='gpt-4', mode='single'):
+    return OutlineCache.make_key(text, guidance, provider, model, mode)
+
+
+def backdate(path, seconds):
+    stamp = time.time() - seconds
+    os.utime(path, (stamp, stamp))
+
+
+def test_stored_outlines_are_returned(tmp_path):
+    cache = OutlineCache(str(tmp_path))
+    cache.put(key(), STRUCTURE)
+
+    assert cache.get(key()) == STRUCTURE
+    assert cache.get(key(guidance='shorter')) is None
+
+
+def test_whitespace_edits_hit_and_other_inputs_miss():
+    assert key("  # Report\n\n\n\nFirst point.   \n\nSecond point.\n") == key()
+    assert key(guidance=' board meeting ') == key(guidance='board meeting')
+    assert len({key(), key(guidance='board meeting'), key(model='gpt-4o'), key(provider='Anthropic'),
+                key(mode='chunked'), key(TEXT + ' Third point.')}) == 6
+
+
+def test_expired_entries_miss_and_are_removed(tmp_path):
+    cache = OutlineCache(str(tmp_path), ttl=60)
+    cache.put(key(), STRUCTURE)
+    path = tmp_path / f"{key()}.json"
+    entry = json.loads(path.read_text())
+    entry['created'] -= 61
+    path.write_text(json.dumps(entry))
+
+    assert cache.get(key()) is None
+    assert not path.exists()
+
+
+def test_least_recently_used_entries_are_evicted_past_the_size_bound(tmp_path):
+    cache = OutlineCache(str(tmp_path))
+    keys = [key(f"Document {i}") for i in range(4)]
+    for age, k in zip((40, 30, 20, 10), keys):
+        cache.put(k, STRUCTURE)
+        backdate(tmp_path / f"{k}.json", age)
+    entry_bytes = (tmp_path / f"{keys[0]}.json").stat().st_size
+
+    cache.get(keys[0])  # Now the most recently used
+    # Room for three entries; slack because the stored timestamps vary in length
+    cache.max_bytes = int(entry_bytes * 3.5)
+    cache.put(key("Document 4"), STRUCTURE)
+
+    assert sum(p.stat().st_size for p in tmp_path.glob('*.json')) <= cache.max_bytes
+    assert cache.get(keys[1]) is None and cache.get(keys[2]) is None
+    assert all(cache.get(k) == STRUCTURE for k in (keys[0], keys[3], key("Document 4")))
+
+
+def test_eviction_also_removes_stale_files(tmp_path):
+    cache = OutlineCache(str(tmp_path), ttl=60)
+    cache.put(key("old"), STRUCTURE)
+    backdate(tmp_path / f"{key('old')}.json", 120)
+    cache.put(key("new"), STRUCTURE)
+
+    assert [p.name for p in tmp_path.glob('*.json')] == [f"{key('new')}.json"]
@@ -0,0 +1,106 @@
+import io
+import random
+import zipfile
+
+import pytest
+
+pytest.importorskip('pptx')
+PILImage = pytest.importorskip('PIL.Image')
+
+from pptx import Presentation  # noqa: E402
+from pptx.enum.shapes import MSO_SHAPE_TYPE  # noqa: E402
+from pptx.util import Inches  # noqa: E402
+
+from streamlit_app import STORED_CONTENT_TYPES, ImageCache, slim_presentation, write_presentation  # noqa: E402
+
+
+def noise_jpeg(width, height, seed):
+    # Noise does not compress, so the file is as large as a photo
+    image = PILImage.frombytes('RGB', (width, height), random.Random(seed).randbytes(width * height * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=95)
+    return buffer.getvalue()
+
+
+def deck_with_duplicate_media():
+    """Two slides with separate media parts holding the same oversized image."""
+    prs = Presentation()
+    for seed in (3, 7):
+        slide = prs.slides.add_slide(prs.slide_layouts[6])
+        slide.shapes.add_picture(io.BytesIO(noise_jpeg(1600, 1200, seed)), Inches(1), Inches(1), Inches(2))
+    buffer = io.BytesIO()
+    prs.save(buffer)
+
+    # Make the second image a byte-for-byte copy of the first, as decks merged from several sources have
+    output = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(buffer.getvalue())) as source, \
+            zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as package:
+        media = sorted(name for name in source.namelist() if name.startswith('ppt/media/'))
+        assert len(media) == 2
+        for info in source.infolist():
+            data = source.read(media[0] if info.filename == media[1] else info)
+            package.writestr(info.filename, data)
+    return Presentation(io.BytesIO(output.getvalue()))
+
+
+def media_names(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as package:
+        return [name for name in package.namelist() if name.startswith('ppt/media/')]
+
+
+def test_slimmed_deck_merges_duplicates_downsamples_and_reopens():
+    prs = deck_with_duplicate_media()
+    original = io.BytesIO()
+    prs.save(original)
+
+    slimmed = slim_presentation(prs, ImageCache())
+    output = io.BytesIO()
+    write_presentation(prs, output)
+
+    assert slimmed['duplicates'] == 1
+    assert slimmed['images'] == 1
+    assert slimmed['layouts'] > 0
+    assert len(media_names(output.getvalue())) == 1
+    assert len(output.getvalue()) < len(original.getvalue()) / 4
+
+    reopened = Presentation(io.BytesIO(output.getvalue()))
+    pictures = [shape for slide in reopened.slides for shape in slide.shapes if shape.shape_type == MSO_SHAPE_TYPE.PICTURE]
+    assert len(pictures) == 2
+    assert pictures[0].image.sha1 == pictures[1].image.sha1
+    assert pictures[0].image.size[0] <= 400  # 2 inches at 150 dpi, not 1600 px
+
+    resaved = io.BytesIO()
+    reopened.save(resaved)
+    assert len(Presentation(io.BytesIO(resaved.getvalue())).slides) == 2
+
+
+def test_written_deck_matches_save_with_media_stored():
+    prs = Presentation()
+    for seed in (1, 2):
+        slide = prs.slides.add_slide(prs.slide_layouts[5])
+        slide.shapes.title.text = f'Slide {seed}'
+        slide.shapes.add_picture(io.BytesIO(noise_jpeg(200, 150, seed)), Inches(1), Inches(2))
+    saved = io.BytesIO()
+    prs.save(saved)
+    written = io.BytesIO()
+    write_presentation(prs, written)
+
+    stored = {part.partname.membername for part in prs.part.package.iter_parts()
+              if part.content_type in STORED_CONTENT_TYPES}
+    assert {name for name in stored if name.startswith('ppt/media/')}
+
+    with zipfile.ZipFile(io.BytesIO(saved.getvalue())) as expected, \
+            zipfile.ZipFile(io.BytesIO(written.getvalue())) as package:
+        assert package.testzip() is None
+        assert sorted(package.namelist()) == sorted(expected.namelist())
+        for info in package.infolist():
+            if info.filename in stored:
+                assert info.compress_type == zipfile.ZIP_STORED, info.filename
+                assert package.read(info) == expected.read(info.filename)
+            else:
+                assert info.compress_type == zipfile.ZIP_DEFLATED, info.filename
+
+    reopened = Presentation(io.BytesIO(written.getvalue()))
+    assert [slide.shapes.title.text for slide in reopened.slides] == ['Slide 1', 'Slide 2']
+    pictures = [shape for slide in reopened.slides for shape in slide.shapes if shape.shape_type == MSO_SHAPE_TYPE.PICTURE]
+    assert [picture.image.content_type for picture in pictures] == ['image/jpeg'] * 2
@@ -0,0 +1,78 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+pytest.importorskip('pptx')
+
+import parallel_render  # noqa: E402
+import streamlit_app  # noqa: E402
+from streamlit_app import PresentationGenerator  # noqa: E402
+
+
+def deck_items(count):
+    items = [('title', 'Deck')]
+    items += [('content', {'title': f'Slide {i}', 'content': ['a', 'b']}) for i in range(count)]
+    return items
+
+
+def broken_pool():
+    pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+    with pytest.raises(BrokenProcessPool):
+        pool.submit(os._exit, 1).result()
+    return pool
+
+
+class FakeRenderPool:
+    """Stands in for the cached get_render_pool, recording clear() calls."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.cleared = 0
+
+    def __call__(self):
+        return self.pool
+
+    def clear(self):
+        self.cleared += 1
+
+
+def test_broken_shared_pool_is_cleared_and_rendering_falls_back(monkeypatch, tmp_path):
+    monkeypatch.setattr(parallel_render, 'SHARD_TEMPLATE_DIR', str(tmp_path))
+    render_pool = FakeRenderPool(broken_pool())
+    monkeypatch.setattr(streamlit_app, 'get_render_pool', render_pool)
+    generator = PresentationGenerator()
+    blank, digest = generator._blank_and_digest()
+    items = deck_items(12)
+
+    parts = generator._render_shards(items, blank, digest, workers=2)
+
+    assert len(parts) == len(items)
+    assert render_pool.cleared == 1
+
+
+def test_parallel_deck_renders_in_process_when_a_given_pool_is_broken(monkeypatch, tmp_path):
+    monkeypatch.setattr(parallel_render, 'SHARD_TEMPLATE_DIR', str(tmp_path))
+    structure = {'title': 'Deck', 'slides': [item[1] for item in deck_items(12)[1:]]}
+
+    prs = PresentationGenerator().create_presentation_parallel(structure, pool=broken_pool(), workers=2)
+
+    assert len(prs.slides) == 13
+    assert prs.slides[1].shapes.title.text == 'Slide 0'
+
+
+def test_published_blank_templates_are_bounded(monkeypatch, tmp_path):
+    monkeypatch.setattr(parallel_render, 'SHARD_TEMPLATE_DIR', str(tmp_path))
+    monkeypatch.setattr(parallel_render, 'SHARD_TEMPLATE_KEEP', 3)
+    paths = []
+    for i in range(5):
+        paths.append(parallel_render.publish_blank_template(f'digest{i}', b'blank'))
+        os.utime(paths[-1], (i, i))  # Distinct mtimes, oldest first
+
+    # Publishing a kept template again marks it recently used
+    parallel_render.publish_blank_template('digest2', b'blank')
+    parallel_render.publish_blank_template('digest5', b'blank')
+
+    assert sorted(os.listdir(tmp_path)) == ['digest2.pptx', 'digest4.pptx', 'digest5.pptx']
@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+from streamlit_app import IncrementalSlideParser, PresentationGenerator, repair_json
+
+OUTLINE = '{"title": "T", "slides": [{"title": "A", "content": ["x"]}]}'
+
+
+def parse(response):
+    return PresentationGenerator().parse_ai_response_with_report(response)
+
+
+@pytest.mark.parametrize('response, slides, repairs', [
+    (OUTLINE, [{'title': 'A', 'content': ['x']}], []),
+    ('```json\n' + OUTLINE + '\n```', [{'title': 'A', 'content': ['x']}], []),
+    ('Here is {your} outline:\n' + OUTLINE + '\nEnjoy {it}!', [{'title': 'A', 'content': ['x']}], []),
+    ('{"title": "T", "slides": [{"title": "A", "content": ["x", "y",],},],}',
+     [{'title': 'A', 'content': ['x', 'y']}], ['trailing commas']),
+    ('{“title”: “T”, “slides”: [{“title”: “A "q" b”, '
+     '“content”: [“x”]}]}',
+     [{'title': 'A "q" b', 'content': ['x']}], ['smart quotes']),
+    ('{"title": "T", "slides": [{"title": "A", "content": ["line\nbreak\tx"]}]}',
+     [{'title': 'A', 'content': ['line\nbreak\tx']}], ['control characters in strings']),
+    ('{"slides": [{"title": "A", "content": ["x"]}]}',
+     [{'title': 'A', 'content': ['x']}], ['missing presentation title']),
+], ids=['clean', 'code fence', 'commentary', 'trailing commas', 'smart quotes', 'control characters',
+        'missing title'])
+def test_repairs(response, slides, repairs):
+    structure, report = parse(response)
+
+    assert structure['slides'] == slides
+    assert report.repairs == repairs
+    assert not report.truncated
+    assert report.clean == (not repairs)
+    assert report.summary() == (f"repaired {repairs[0]}" if repairs else '')
+
+
+@pytest.mark.parametrize('response, salvaged', [
+    ('{"title": "T", "slides": [{"title": "A", "content": ["x"]}, {"title": "B", "content": ["y"]}, '
+     '{"title": "C", "content": ["z', 2),
+    ('{"title": "T", "slides": [{"title": "A", "content": ["x"]}, {"tit', 1),
+    ('{"title": "T", "slides": [{"title": "A", "content": ["x"]},', 1),
+])
+def test_truncated_responses_keep_complete_slides(response, salvaged):
+    structure, report = parse(response)
+
+    assert len(structure['slides']) == salvaged
+    assert report.truncated
+    assert report.salvaged_slides == salvaged
+    assert report.summary() == f"the response was cut off; kept the {salvaged} complete slides"
+
+
+def test_unusable_slides_are_dropped_and_others_coerced():
+    structure, report = parse('{"title": "T", "slides": [{"title": "A", "content": "x"}, '
+                              '{"content": ["y"]}, 5, {"title": 7, "content": [1, {"k": 2}, null]}]}')
+
+    assert structure['slides'] == [{'title': 'A', 'content': ['x']},
+                                   {'title': '7', 'content': ['1', '{"k": 2}']}]
+    assert report.dropped == ['slide 2 (no title)', 'slide 3 (not an object)']
+    assert report.summary() == "dropped slide 2 (no title); slide 3 (not an object)"
+
+
+@pytest.mark.parametrize('response', [
+    '[{"title": "A", "content": ["x"]}]',
+    "{'title': 'T', 'slides': [{'title': 'A', 'content': ['x']}]}",
+    '{"title": "T", "slides": []}',
+    'No outline here.',
+    '',
+], ids=['top-level array', 'single quotes', 'no slides', 'no json', 'empty'])
+def test_unrecoverable_responses_are_rejected(response):
+    with pytest.raises(Exception, match='Failed to parse AI response'):
+        parse(response)
+
+
+def test_streamed_chunks_parse_like_the_whole_response():
+    response = '```json\n{"title": "T", "slides": [{"title": "A", "content": ["x",]}, ' \
+               '{“title”: “B”, "content": []}]}\n```'
+    parser = IncrementalSlideParser()
+    for c in response:
+        parser.feed(c)
+
+    assert parser.finish()[0] == parse(response)[0]
+
+
+def test_repair_json_leaves_valid_json_alone():
+    text = json.dumps({'title': 'a, ]', 'slides': [{'title': '“quoted”', 'content': ['}']}]})
+
+    assert repair_json(text) == (text, [])
+    assert repair_json('[1, 2, ]') == ('[1, 2 ]', ['trailing commas'])
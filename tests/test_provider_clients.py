@@ -0,0 +1,146 @@
+import time
+
+import pytest
+
+pytest.importorskip('openai')
+
+from streamlit_app import AsyncProviderLayer, ProviderClientRegistry  # noqa: E402
+
+
+def make_layer(layers, server, idle_timeout=300):
+    registry = ProviderClientRegistry(idle_timeout=idle_timeout, base_urls={'OpenAI': server.url})
+    layers.append(AsyncProviderLayer(registry, max_retries=0))
+    return layers[-1], registry
+
+
+def leased_client(layer, registry):
+    async def lease():
+        with registry.lease('OpenAI', 'test-key') as client:
+            return client
+    return layer.run(lease())
+
+
+def test_requests_with_the_same_key_reuse_one_client_and_connection(openai_server, provider_layers):
+    layer, registry = make_layer(provider_layers, openai_server)
+    client = leased_client(layer, registry)
+    for _ in range(5):
+        assert layer.run(layer.complete('OpenAI', 'test-key', 'prompt')).startswith('{')
+        assert leased_client(layer, registry) is client
+
+    assert len(registry._entries) == 1
+    assert openai_server.requests == 5
+    assert len(openai_server.connections) == 1
+
+
+def test_keys_get_their_own_clients(openai_server, provider_layers):
+    layer, registry = make_layer(provider_layers, openai_server)
+    layer.run(layer.complete('OpenAI', 'key-a', 'prompt'))
+    layer.run(layer.complete('OpenAI', 'key-b', 'prompt'))
+
+    assert len(registry._entries) == 2
+
+
+def test_idle_clients_are_evicted_and_replaced(openai_server, provider_layers):
+    layer, registry = make_layer(provider_layers, openai_server, idle_timeout=0.2)
+    layer.run(layer.complete('OpenAI', 'test-key', 'prompt'))
+    client = leased_client(layer, registry)
+
+    time.sleep(0.3)
+    layer.run(layer.complete('OpenAI', 'test-key', 'prompt'))
+
+    assert leased_client(layer, registry) is not client
+    assert len(registry._entries) == 1
+    assert len(openai_server.connections) == 2
+
+
+def test_closing_the_registry_off_the_loop_closes_clients(openai_server, provider_layers):
+    layer, registry = make_layer(provider_layers, openai_server)
+    layer.run(layer.complete('OpenAI', 'test-key', 'prompt'))
+    client = leased_client(layer, registry)
+
+    registry.close()  # From this thread, not the provider loop
+    deadline = time.monotonic() + 2
+    while not client.is_closed() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert client.is_closed()
+
+
+def test_closing_the_layer_closes_clients_and_stops_its_thread(openai_server):
+    layer, registry = make_layer([], openai_server)
+    layer.run(layer.complete('OpenAI', 'test-key', 'prompt'))
+    client = leased_client(layer, registry)
+
+    layer.close()
+
+    assert client.is_closed()
+    assert not layer._thread.is_alive()
+    assert not registry._entries
+    layer.close()  # Closing again is harmless
+
+
+class FakeGeminiClient:
+    """Stands in for GenerativeServiceAsyncClient, answering with canned responses."""
+
+    def __init__(self, glm, texts, finish_reason='STOP'):
+        self.glm = glm
+        self.texts = texts
+        self.finish_reason = finish_reason
+        self.requests = []
+
+    def response(self, text, finish_reason=None):
+        candidate = self.glm.Candidate(content=self.glm.Content(parts=[self.glm.Part(text=text)]),
+                                       finish_reason=finish_reason)
+        return self.glm.GenerateContentResponse(candidates=[candidate])
+
+    async def generate_content(self, request):
+        self.requests.append(request)
+        return self.response(''.join(self.texts), self.finish_reason)
+
+    async def stream_generate_content(self, request):
+        self.requests.append(request)
+        responses = [self.response(text) for text in self.texts]
+        responses.append(self.response('', self.finish_reason))
+
+        async def chunks():
+            for response in responses:
+                yield response
+        return chunks()
+
+
+def test_gemini_requests_use_the_service_client(provider_layers):
+    glm = pytest.importorskip('google.ai.generativelanguage')
+    layer = AsyncProviderLayer(ProviderClientRegistry(), max_retries=0)
+    provider_layers.append(layer)
+    client = FakeGeminiClient(glm, ['{"title": ', '"T"}'], finish_reason='MAX_TOKENS')
+
+    completion = layer.run(layer._complete_once('Google Gemini', client, 'prompt'))
+
+    async def stream():
+        return [item async for item in layer._stream_once('Google Gemini', client, 'prompt')]
+    *texts, end = layer.run(stream())
+
+    assert (completion.text, completion.truncated, completion.finish_reason) == (
+        '{"title": "T"}', True, 'MAX_TOKENS')
+    assert texts == ['{"title": ', '"T"}']
+    assert (end.truncated, end.finish_reason) == (True, 'MAX_TOKENS')
+    request = client.requests[0]
+    assert request.model == 'models/gemini-2.0-flash'
+    assert request.contents[0].parts[0].text == 'prompt'
+
+
+def test_gemini_clients_are_closed_through_their_transport(provider_layers):
+    pytest.importorskip('google.ai.generativelanguage')
+    layer = AsyncProviderLayer(ProviderClientRegistry(), max_retries=0)
+    provider_layers.append(layer)
+
+    async def lease():
+        with layer.registry.lease('Google Gemini', 'test-key') as client:
+            return client
+    client = layer.run(lease())
+    channel = client.transport.grpc_channel._channel
+    assert not channel.closed()
+
+    layer.close()
+
+    assert channel.closed()
@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+pytest.importorskip('openai')
+
+from streamlit_app import AIProviderError, AsyncProviderLayer, ProviderClientRegistry  # noqa: E402
+
+
+def make_layer(layers, server, **options):
+    registry = ProviderClientRegistry(base_urls={'OpenAI': server.url})
+    layers.append(AsyncProviderLayer(registry, **options))
+    return layers[-1]
+
+
+def timed_completion(layer):
+    started = time.perf_counter()
+    text = layer.run(layer.complete('OpenAI', 'test-key', 'prompt'))
+    return text, time.perf_counter() - started
+
+
+def test_rate_limited_request_waits_for_retry_after(openai_server, provider_layers):
+    openai_server.failures = [(429, {'Retry-After': '0.3'})]
+    # Backoff alone would wait far longer, so a quick retry means Retry-After was used
+    layer = make_layer(provider_layers, openai_server, max_retries=2, base_delay=30, max_delay=60)
+
+    text, seconds = timed_completion(layer)
+
+    assert text.startswith('{')
+    assert openai_server.requests == 2
+    assert 0.3 <= seconds < 5
+
+
+def test_retry_after_is_capped_at_max_delay(openai_server, provider_layers):
+    openai_server.failures = [(429, {'Retry-After': '3600'})]
+    layer = make_layer(provider_layers, openai_server, max_retries=1, max_delay=0.2)
+
+    text, seconds = timed_completion(layer)
+
+    assert openai_server.requests == 2
+    assert 0.2 <= seconds < 5
+
+
+def test_server_errors_are_retried_with_backoff(openai_server, provider_layers):
+    openai_server.failures = [(503, {}), (500, {})]
+    layer = make_layer(provider_layers, openai_server, max_retries=2, base_delay=0.01)
+
+    text, _ = timed_completion(layer)
+
+    assert text.startswith('{')
+    assert openai_server.requests == 3
+
+
+def test_server_errors_beyond_max_retries_are_raised(openai_server, provider_layers):
+    openai_server.failures = [(502, {})] * 3
+    layer = make_layer(provider_layers, openai_server, max_retries=2, base_delay=0.01)
+
+    with pytest.raises(AIProviderError) as raised:
+        timed_completion(layer)
+
+    assert raised.value.status == 502 and raised.value.retryable
+    assert openai_server.requests == 3
+
+
+def test_client_errors_are_not_retried(openai_server, provider_layers):
+    openai_server.failures = [(400, {})]
+    layer = make_layer(provider_layers, openai_server, max_retries=2, base_delay=0.01)
+
+    with pytest.raises(AIProviderError) as raised:
+        timed_completion(layer)
+
+    assert raised.value.status == 400 and not raised.value.retryable
+    assert openai_server.requests == 1
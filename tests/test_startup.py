@@ -0,0 +1,37 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROVIDER_SDKS = ('openai', 'anthropic', 'google.generativeai', 'google.ai.generativelanguage')
+
+# A fresh interpreter, since this test session may already have imported the SDKs
+IMPORT_APP = """
+import json, sys
+import provider_plugins
+import streamlit_app
+registered = [plugin.module for plugin in provider_plugins._plugins.values()]
+print(json.dumps({'registered': registered, 'loaded': sorted(sys.modules)}))
+"""
+
+
+@pytest.fixture(scope='module')
+def imported():
+    result = subprocess.run([sys.executable, '-c', IMPORT_APP], cwd=ROOT, capture_output=True,
+                            text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+@pytest.mark.parametrize('module', PROVIDER_SDKS)
+def test_importing_the_app_does_not_load_provider_sdks(imported, module):
+    assert module not in imported['loaded']
+
+
+def test_every_registered_sdk_is_left_unloaded(imported):
+    assert set(imported['registered']) >= {'openai', 'anthropic', 'google.ai.generativelanguage'}
+    assert not set(imported['registered']) & set(imported['loaded'])
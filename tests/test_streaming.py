@@ -0,0 +1,111 @@
+import json
+
+import pytest
+
+from streamlit_app import AsyncProviderLayer, Completion, ParseReport, PresentationGenerator, ProviderClientRegistry
+
+OUTLINE = {'title': 'Quarterly Review',
+           'slides': [{'title': f'Topic {i}', 'content': [f'Point {i}a', f'Point {i}b']} for i in range(1, 4)]}
+
+
+class FakeStream:
+    """Chunks of a streamed response, with the finish reason a ProviderStream reports."""
+
+    def __init__(self, text, truncated=False, size=16):
+        self.chunks = [text[i:i + size] for i in range(0, len(text), size)]
+        self.truncated = truncated
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+
+def slide_titles(prs):
+    return [slide.shapes.title.text for slide in prs.slides]
+
+
+def continue_with(structure):
+    def continue_truncated(partial):
+        partial['title'] = structure['title']
+        partial['slides'].extend(structure['slides'][len(partial['slides']):])
+        return partial
+    return continue_truncated
+
+
+def test_title_slide_leads_when_the_stream_is_cut_off_before_the_first_slide():
+    text = json.dumps(OUTLINE)
+    cut = text[:text.index('"Point 1b"')]  # Inside the first slide
+    generator = PresentationGenerator()
+    structure, prs = generator.create_presentation_streaming(
+        FakeStream(cut), continue_truncated=continue_with(OUTLINE))
+
+    assert slide_titles(prs) == ['Quarterly Review', 'Topic 1', 'Topic 2', 'Topic 3']
+    assert [slide['title'] for slide in structure['slides']] == ['Topic 1', 'Topic 2', 'Topic 3']
+
+
+def test_late_title_is_fixed_up_after_a_continuation():
+    text = json.dumps({'slides': OUTLINE['slides'], 'title': OUTLINE['title']})
+    cut = text[:text.index('"Topic 3"')]  # The title would have come last
+    generator = PresentationGenerator()
+    _, prs = generator.create_presentation_streaming(
+        FakeStream(cut), continue_truncated=continue_with(OUTLINE))
+
+    assert slide_titles(prs) == ['Quarterly Review', 'Topic 1', 'Topic 2', 'Topic 3']
+
+
+def test_finish_reason_marks_a_closed_outline_as_cut_off():
+    short = {'title': OUTLINE['title'], 'slides': OUTLINE['slides'][:2]}
+    requested = []
+
+    def continue_truncated(partial):
+        requested.append(len(partial['slides']))
+        return continue_with(OUTLINE)(partial)
+
+    generator = PresentationGenerator()
+    _, prs = generator.create_presentation_streaming(
+        FakeStream(json.dumps(short), truncated=True), continue_truncated=continue_truncated)
+
+    assert requested == [2]
+    assert slide_titles(prs) == ['Quarterly Review', 'Topic 1', 'Topic 2', 'Topic 3']
+
+
+def test_provider_stream_reports_the_finish_reason(openai_server, provider_layers):
+    pytest.importorskip('openai')
+    registry = ProviderClientRegistry(base_urls={'OpenAI': openai_server.url})
+    layer = AsyncProviderLayer(registry, max_retries=0)
+    provider_layers.append(layer)
+
+    stream = layer.iter_stream('OpenAI', 'test-key', 'prompt')
+    assert json.loads(''.join(stream))['title'] == 'Fake Deck'
+    assert (stream.finish_reason, stream.truncated) == ('stop', False)
+
+    openai_server.finish_reason = 'length'
+    stream = layer.iter_stream('OpenAI', 'test-key', 'prompt')
+    ''.join(stream)
+    assert (stream.finish_reason, stream.truncated) == ('length', True)
+
+
+class ContinuationLayer(AsyncProviderLayer):
+    """Provider layer that answers every continuation request with the same slides."""
+
+    def __init__(self, slides):
+        super().__init__(ProviderClientRegistry(), max_retries=0)
+        self.slides = slides
+
+    async def completion(self, provider, api_key, prompt):
+        return Completion(json.dumps({'slides': self.slides}), False, 'stop')
+
+
+def test_continuations_skip_variants_of_slides_already_received(provider_layers):
+    layer = ContinuationLayer([{'title': 'TOPIC 2!', 'content': ['again']},
+                               {'title': 'topic-3', 'content': ['again']},
+                               {'title': 'Topic 4', 'content': ['new']},
+                               {'title': 'Topic 4.', 'content': ['repeated']}])
+    provider_layers.append(layer)
+    structure = {'title': 'Quarterly Review', 'slides': [dict(slide) for slide in OUTLINE['slides']]}
+    report = ParseReport()
+
+    layer.run(PresentationGenerator().continue_outline_async(
+        layer, 'OpenAI', 'key', 'text', '', structure, report, True))
+
+    assert [slide['title'] for slide in structure['slides']] == ['Topic 1', 'Topic 2', 'Topic 3', 'Topic 4']
+    assert report.continuations == 1 and not report.truncated
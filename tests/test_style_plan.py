@@ -0,0 +1,107 @@
+import io
+import pickle
+
+import pytest
+
+pytest.importorskip('pptx')
+
+from lxml import etree  # noqa: E402
+from pptx import Presentation  # noqa: E402
+from pptx.dml.color import RGBColor  # noqa: E402
+from pptx.util import Pt  # noqa: E402
+
+from streamlit_app import PresentationGenerator, StylePlan, compile_style_plan  # noqa: E402
+
+
+def styled_template():
+    """A template whose title and body placeholders carry explicit fonts on some layouts."""
+    prs = Presentation()
+    fonts = {'Title Slide': ('Georgia', 40, True, None, '1F3864'),
+             'Title and Content': ('Verdana', 20, None, True, 'C00000')}
+    for layout in prs.slide_layouts:
+        if layout.name not in fonts:
+            continue
+        name, size, bold, italic, color = fonts[layout.name]
+        for placeholder in layout.placeholders:
+            placeholder.text_frame.text = 'Sample'
+            font = placeholder.text_frame.paragraphs[0].runs[0].font
+            font.name, font.size, font.bold, font.italic = name, Pt(size), bold, italic
+            font.color.rgb = RGBColor.from_string(color)
+    buffer = io.BytesIO()
+    prs.save(buffer)
+    return Presentation(io.BytesIO(buffer.getvalue()))
+
+
+def legacy_font_info(template_styles, layout_name, placeholder_type):
+    """The per-paragraph lookup the style plan replaced."""
+    font_info = None
+    if layout_name and placeholder_type:
+        font_info = template_styles.get('placeholder_styles', {}).get((layout_name, placeholder_type))
+    if not font_info:
+        for layout in template_styles.get('layouts', []):
+            for placeholder in layout.get('placeholders', []):
+                if placeholder.get('font_info') and any(placeholder['font_info'].values()):
+                    font_info = placeholder['font_info']
+                    break
+            if font_info:
+                break
+    return font_info
+
+
+def apply_legacy(font, font_info):
+    if font_info.get('name'):
+        font.name = font_info['name']
+    if font_info.get('size'):
+        font.size = font_info['size']
+    if font_info.get('bold') is not None:
+        font.bold = font_info['bold']
+    if font_info.get('italic') is not None:
+        font.italic = font_info['italic']
+    if font_info.get('color'):
+        color = font_info['color'].replace('RGBColor(0x', '').replace(')', '')
+        if len(color) == 6:
+            font.color.rgb = RGBColor(int(color[0:2], 16), int(color[2:4], 16), int(color[4:6], 16))
+
+
+def run_xml(style_run):
+    text_frame = Presentation().slides.add_slide(Presentation().slide_layouts[6]).shapes.add_textbox(
+        0, 0, 100, 100).text_frame
+    run = text_frame.paragraphs[0].add_run()
+    style_run(run.font)
+    return etree.tostring(run._r)
+
+
+@pytest.fixture(scope='module')
+def styles():
+    return PresentationGenerator().extract_template_styles(styled_template())
+
+
+def test_plan_styles_runs_like_the_per_slide_lookup(styles):
+    plan = styles['style_plan']
+    keys = [(layout['name'], placeholder['type']) for layout in styles['layouts']
+            for placeholder in layout['placeholders']]
+    keys += [('Missing Layout', 'BODY (2)'), (None, None), ('Title and Content', None)]
+    assert len(styles['placeholder_styles']) >= 4
+
+    for layout_name, placeholder_type in keys:
+        font_info = legacy_font_info(styles, layout_name, placeholder_type)
+        style = plan.resolve(layout_name, placeholder_type)
+        expected = run_xml(lambda font: apply_legacy(font, font_info) if font_info else None)
+        actual = run_xml(lambda font: style.apply(font) if style else None)
+        assert actual == expected, (layout_name, placeholder_type)
+
+
+def test_plan_survives_pickling_and_json(styles):
+    plan = styles['style_plan']
+
+    for copy in (pickle.loads(pickle.dumps(plan)), StylePlan.from_json(plan.to_json())):
+        assert copy.fingerprint == plan.fingerprint
+        assert copy.resolve('Title and Content', 'BODY (2)') == plan.resolve('Title and Content', 'BODY (2)')
+
+
+def test_compiling_is_deterministic_and_the_plan_immutable(styles):
+    plan = compile_style_plan(styles)
+
+    assert plan.fingerprint == styles['style_plan'].fingerprint
+    with pytest.raises(AttributeError):
+        plan.fallback = None
@@ -0,0 +1,50 @@
+import hashlib
+import io
+
+import pytest
+
+pptx = pytest.importorskip('pptx')
+
+from streamlit_app import TemplateCache  # noqa: E402
+
+
+def template_bytes(title):
+    prs = pptx.Presentation()
+    prs.core_properties.title = title
+    buffer = io.BytesIO()
+    prs.save(buffer)
+    return buffer.getvalue()
+
+
+def test_identical_uploads_are_parsed_once():
+    cache = TemplateCache()
+    data = template_bytes('Brand')
+
+    assert cache.get_or_load(data) is cache.get_or_load(bytes(data))
+
+
+def test_least_recently_used_templates_are_evicted_to_stay_within_budget():
+    templates = [template_bytes(f'Brand {i}') for i in range(4)]
+    probe = TemplateCache().get_or_load(templates[0])
+    cache = TemplateCache(max_bytes=int(probe.size * 2.5))
+
+    first = cache.get_or_load(templates[0])
+    cache.get_or_load(templates[1])
+    cache.get_or_load(templates[0])  # Now more recently used than templates[1]
+    cache.get_or_load(templates[2])
+
+    digests = [hashlib.sha256(data).hexdigest() for data in templates]
+    assert list(cache._entries) == [digests[0], digests[2]]
+    assert cache._total_bytes == sum(entry.size for entry in cache._entries.values()) <= cache.max_bytes
+    assert cache.get_or_load(templates[0]) is first
+
+
+def test_templates_larger_than_the_budget_are_returned_but_not_cached():
+    cache = TemplateCache(max_bytes=1000)
+    data = template_bytes('Huge')
+
+    entry = cache.get_or_load(data)
+
+    assert entry.styles['layouts']
+    assert not cache._entries and cache._total_bytes == 0
+    assert cache.get_or_load(data) is not entry
@@ -0,0 +1,42 @@
+import io
+
+import pytest
+
+pptx = pytest.importorskip('pptx')
+
+from streamlit_app import TemplateRegistry  # noqa: E402
+
+
+def template_bytes(title='Brand'):
+    prs = pptx.Presentation()
+    prs.core_properties.title = title
+    buffer = io.BytesIO()
+    prs.save(buffer)
+    return buffer.getvalue()
+
+
+def test_compiled_templates_load_by_id(tmp_path):
+    registry = TemplateRegistry(str(tmp_path))
+    manifest = registry.compile('brand', template_bytes())
+
+    assert registry.load('brand').digest == manifest['digest']
+    assert [m['id'] for m in registry.list()] == ['brand']
+
+
+def test_compile_without_overwrite_keeps_an_existing_template(tmp_path):
+    registry = TemplateRegistry(str(tmp_path))
+    original = registry.compile('brand', template_bytes('Original'))
+
+    with pytest.raises(FileExistsError):
+        registry.compile('brand', template_bytes('Replacement'), overwrite=False)
+
+    assert registry.load('brand').digest == original['digest']
+    assert [p.name for p in tmp_path.iterdir()] == ['brand.tpl']
+
+
+def test_compile_overwrites_by_default(tmp_path):
+    registry = TemplateRegistry(str(tmp_path))
+    registry.compile('brand', template_bytes('Original'))
+    replacement = registry.compile('brand', template_bytes('Replacement'))
+
+    assert registry.load('brand').digest == replacement['digest']
@@ -0,0 +1,83 @@
+import pytest
+
+pytest.importorskip('pptx')
+
+from pptx.util import Pt  # noqa: E402
+
+from streamlit_app import (CONTINUATION_SUFFIX, FIT_FONT_STEP, FIT_MIN_FONT_SCALE, TextFitter,  # noqa: E402
+                           default_template_styles)
+
+BULLET = "A bullet of a typical length that wraps onto a second line in the body placeholder"
+
+
+@pytest.fixture(scope='module')
+def fitter():
+    return TextFitter(default_template_styles())
+
+
+def template_size(fitter):
+    return fitter._specs['bullets'].size
+
+
+def slide(count, **fields):
+    return {'title': 'B', 'content': [f"{i}. {BULLET}" for i in range(count)], 'notes': 'Say this', **fields}
+
+
+def test_slides_that_fit_come_back_unchanged(fitter):
+    short = slide(2)
+    assert fitter.fit_slide(short) == [short]
+    assert fitter.fit_slide(short)[0] is short
+
+
+def test_overflowing_slide_shrinks_to_the_largest_size_that_fits(fitter):
+    size = template_size(fitter)
+    count = next(n for n in range(1, 30) if not fitter.fits('bullets', slide(n)['content'], size))
+    points = slide(count)['content']
+
+    [fitted] = fitter.fit_slide(slide(count))
+
+    shrunk = int(Pt(fitted['font_size']))
+    assert size * FIT_MIN_FONT_SCALE <= shrunk < size
+    assert fitter.fits('bullets', points, shrunk)
+    assert not fitter.fits('bullets', points, shrunk + FIT_FONT_STEP)
+
+
+def test_slides_too_long_to_shrink_are_split_where_the_next_bullet_overflows(fitter):
+    size = template_size(fitter)
+    original = slide(30)
+
+    slides = fitter.fit_slide(original)
+
+    assert len(slides) > 1
+    assert [s['title'] for s in slides] == ['B'] + ['B' + CONTINUATION_SUFFIX] * (len(slides) - 1)
+    assert [point for s in slides for point in s['content']] == original['content']
+    assert [s.get('notes') for s in slides] == ['Say this'] + [None] * (len(slides) - 1)
+    for current, following in zip(slides, slides[1:]):
+        assert 'font_size' not in current
+        assert fitter.fits('bullets', current['content'], size)
+        assert not fitter.fits('bullets', current['content'] + following['content'][:1], size)
+    # Shrinking alone could not have fitted the slide
+    assert not fitter.fits('bullets', original['content'], int(size * FIT_MIN_FONT_SCALE))
+
+
+def test_a_bullet_too_long_for_any_slide_gets_the_smallest_size(fitter):
+    [fitted] = fitter.fit_slide({'title': 'Long', 'content': [BULLET * 40]})
+
+    assert int(Pt(fitted['font_size'])) <= int(template_size(fitter) * FIT_MIN_FONT_SCALE)
+
+
+def test_a_font_size_the_caller_set_is_kept(fitter):
+    small = slide(3, font_size=12)
+    assert fitter.fit_slide(small) == [small]
+
+    # Overflowing slides shrink from the caller's size, not the template's
+    count = next(n for n in range(1, 40) if not fitter.fits('bullets', slide(n)['content'], Pt(12)))
+    for fitted in fitter.fit_slide(slide(count, font_size=12)):
+        assert fitted['font_size'] <= 12
+
+
+def test_fitting_twice_changes_nothing(fitter):
+    structure = {'title': 'Deck', 'slides': [slide(2), slide(30), slide(8, layout='two_column')]}
+    fitted = fitter.fit_structure(structure)
+
+    assert fitter.fit_structure(fitted) == fitted